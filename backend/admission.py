@@ -0,0 +1,265 @@
+"""
+Admission control for bursts (checkout rush at the stall).
+
+Every admitted request belongs to a class with its own concurrency limit
+and a bounded wait queue; all classes also share ADMISSION_MAX_ACTIVE
+slots. When a slot frees up, the waiting request with the best priority
+gets it (reads before returns/exchanges before checkout), so a queue of
+PDF-rendering checkouts never starves /get-sizes.
+
+A request is shed straight away with 503 + Retry-After when its class
+queue is full, or when the expected wait (queue position x recent service
+time) already exceeds the class timeout. Otherwise it is shed when its
+deadline passes in the queue. Shedding happens before any DB work, so the
+client can simply retry.
+
+Limits are per process (per gunicorn worker, or the one hypercorn
+process): keep workers x ADMISSION_MAX_ACTIVE within the database's
+connection limit. Queued requests hold a thread, so gunicorn needs more
+threads than ADMISSION_MAX_ACTIVE (gunicorn.conf.py). ADMISSION_CONTROL=0
+turns it off.
+
+    ADMISSION_<CLASS>=limit,queue,timeout_ms     e.g. ADMISSION_CHECKOUT=2,8,5000
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+from backend import metrics, tracing
+
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+# one admitted request per pooled connection by default
+ADMISSION_MAX_ACTIVE = int(os.environ.get("ADMISSION_MAX_ACTIVE", os.environ.get("DB_POOL_SIZE", "4")))
+
+# class -> (priority (lower first), limit, queue, timeout_ms)
+DEFAULT_CLASSES = {
+    "read": (0, 4, 32, 1000),
+    "write": (1, 2, 16, 3000),
+    "checkout": (2, 2, 8, 5000),
+}
+
+# view function name -> class (the same names on the Flask blueprint and the async tier)
+ROUTE_CLASSES = {
+    "home": "read",
+    "get_sizes": "read",
+    "catalog_search": "read",
+    "api_scan": "read",
+    "return_exchange_page": "read",
+    "api_get_invoice": "read",
+    "api_reorder": "read",
+    "api_events": "read",
+    "api_process_return": "write",
+    "api_process_exchange": "write",
+    "api_transfer_stock": "write",
+    "update_stall_location": "read",
+    "checkout": "checkout",
+}
+
+
+def _class_settings(name, priority, limit, queue, timeout_ms):
+    raw = os.environ.get(f"ADMISSION_{name.upper()}")
+    if raw:
+        limit, queue, timeout_ms = (int(v) for v in raw.split(","))
+    return priority, limit, queue, timeout_ms
+
+
+class Shed(Exception):
+    """Request turned away; retry_after_ms is the client's hint."""
+
+    def __init__(self, cls, reason, retry_after_ms):
+        super().__init__(f"{cls}: {reason}")
+        self.cls = cls
+        self.reason = reason
+        self.retry_after_ms = retry_after_ms
+
+
+class _Class:
+    def __init__(self, name, priority, limit, queue, timeout_ms):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout_ms / 1000
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.05  # EWMA seconds, refined as requests finish
+
+
+class _Waiter:
+    def __init__(self, cls):
+        self.cls = cls
+        self.granted = False
+        self.cancelled = False
+
+    def grant(self):
+        self.granted = True
+
+
+class _ThreadWaiter(_Waiter):
+    def __init__(self, cls):
+        super().__init__(cls)
+        self.event = threading.Event()
+
+    def grant(self):
+        super().grant()
+        self.event.set()
+
+
+class _AsyncWaiter(_Waiter):
+    def __init__(self, cls):
+        super().__init__(cls)
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def grant(self):
+        super().grant()
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+class AdmissionController:
+    def __init__(self, classes=None, max_active=ADMISSION_MAX_ACTIVE):
+        classes = classes or {
+            name: _class_settings(name, *settings) for name, settings in DEFAULT_CLASSES.items()
+        }
+        self.classes = {name: _Class(name, *settings) for name, settings in classes.items()}
+        self.max_active = max_active
+        self.active = 0
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+
+    # -------- bookkeeping (call with the lock held) --------
+    def _fits(self, cls):
+        return self.active < self.max_active and cls.active < cls.limit
+
+    def _take(self, cls):
+        self.active += 1
+        cls.active += 1
+        metrics.ADMISSION_ACTIVE.set(cls.active, admission_class=cls.name)
+
+    def _expected_wait(self, cls):
+        """Seconds until a new arrival of this class would likely start."""
+        ahead = sum(c.waiting for c in self.classes.values() if c.priority <= cls.priority)
+        return (ahead + 1) * cls.service_time / max(1, min(cls.limit, self.max_active))
+
+    def _retry_after_ms(self, cls):
+        return int(min(10000, max(100, math.ceil(self._expected_wait(cls) * 1000))))
+
+    def _set_waiting(self, cls, delta):
+        cls.waiting += delta
+        metrics.ADMISSION_QUEUE.set(cls.waiting, admission_class=cls.name)
+
+    def _dispatch(self):
+        """Hand free slots to waiters: best priority first, FIFO within a priority."""
+        skipped = []
+        while self._heap and self.active < self.max_active:
+            entry = heapq.heappop(self._heap)
+            waiter = entry[2]
+            if waiter.cancelled:
+                continue
+            if self._fits(waiter.cls):
+                self._set_waiting(waiter.cls, -1)
+                self._take(waiter.cls)
+                waiter.grant()
+            else:
+                skipped.append(entry)  # its class is at its own limit
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+    def _enqueue(self, cls_name, waiter_type):
+        """Admit now (returns None), shed (raises Shed) or queue (returns the waiter)."""
+        cls = self.classes[cls_name]
+        with self._lock:
+            # release() dispatches under this lock, so anyone still queued is
+            # blocked by a full class or full house - not ahead of a request that fits
+            if self._fits(cls):
+                self._take(cls)
+                return None
+            if cls.waiting >= cls.queue:
+                self._shed(cls, "queue_full")
+            if self._expected_wait(cls) > cls.timeout:
+                self._shed(cls, "deadline")
+            waiter = waiter_type(cls)
+            heapq.heappush(self._heap, (cls.priority, next(self._seq), waiter))
+            self._set_waiting(cls, 1)
+            return waiter
+
+    def _shed(self, cls, reason):
+        metrics.ADMISSION_SHED.inc(admission_class=cls.name, reason=reason)
+        raise Shed(cls.name, reason, self._retry_after_ms(cls))
+
+    def _timed_out(self, waiter):
+        """Deadline passed while queued. Returns True if the slot arrived just in time."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.cancelled = True
+            self._set_waiting(waiter.cls, -1)
+            self._shed(waiter.cls, "timeout")
+
+    # -------- public API --------
+    def acquire(self, cls_name):
+        """Block until admitted; returns a token for release(). Raises Shed."""
+        start = time.perf_counter()
+        waiter = self._enqueue(cls_name, _ThreadWaiter)
+        if waiter is not None and not waiter.event.wait(waiter.cls.timeout):
+            self._timed_out(waiter)
+        waited = time.perf_counter() - start
+        metrics.ADMISSION_WAIT.observe(waited, admission_class=cls_name)
+        tracing.record_span("admission_wait", start, waited, admission_class=cls_name)
+        return (cls_name, time.perf_counter())
+
+    async def acquire_async(self, cls_name):
+        """acquire() for the event loop: queues without blocking other coroutines."""
+        start = time.perf_counter()
+        waiter = self._enqueue(cls_name, _AsyncWaiter)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.event.wait(), waiter.cls.timeout)
+            except asyncio.TimeoutError:
+                self._timed_out(waiter)
+            except asyncio.CancelledError:
+                # client went away while queued: give back a slot granted meanwhile
+                with self._lock:
+                    waiter.cancelled = True
+                    if not waiter.granted:
+                        self._set_waiting(waiter.cls, -1)
+                if waiter.granted:
+                    self.release((cls_name, time.perf_counter()))
+                raise
+        waited = time.perf_counter() - start
+        metrics.ADMISSION_WAIT.observe(waited, admission_class=cls_name)
+        tracing.record_span("admission_wait", start, waited, admission_class=cls_name)
+        return (cls_name, time.perf_counter())
+
+    def release(self, token):
+        cls_name, started = token
+        cls = self.classes[cls_name]
+        with self._lock:
+            cls.service_time = 0.8 * cls.service_time + 0.2 * (time.perf_counter() - started)
+            self.active -= 1
+            cls.active -= 1
+            metrics.ADMISSION_ACTIVE.set(cls.active, admission_class=cls.name)
+            self._dispatch()
+
+
+CONTROLLER = AdmissionController()
+
+
+def route_class(endpoint):
+    """Admission class for a Flask/Quart endpoint, or None to bypass (health, metrics, login, static)."""
+    if not ADMISSION_CONTROL or not endpoint:
+        return None
+    return ROUTE_CLASSES.get(endpoint.rsplit(".", 1)[-1])
+
+
+def busy_body(shed):
+    return {"error": "busy", "retry_after_ms": shed.retry_after_ms}
+
+
+def retry_after_header(shed):
+    return str(max(1, math.ceil(shed.retry_after_ms / 1000)))
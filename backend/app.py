@@ -1,49 +1,137 @@
 # =====================================================
 # IMPORTS
 # =====================================================
-from flask import Flask, render_template, request, session, jsonify, send_from_directory, redirect, url_for, flash
+from flask import Blueprint, Flask, current_app, render_template, request, session, jsonify, send_from_directory, redirect, url_for, flash, g, Response, before_render_template, template_rendered
 from datetime import date
-from decimal import Decimal
-import time, os, uuid
+import hmac, time, os, uuid
 from backend.db import get_connection
 #from db import get_connection
-from psycopg2.extras import RealDictCursor
+from backend import admission, assets, catalog, http_cache, invoice_export, metrics, outbox, partitions, pricing, sku, slow_queries, stalls, statements, stock_ledger, till, tracing, velocity
+from backend.returns import handle_exchange, handle_return, load_returnable_items
 from functools import wraps
 
-# ReportLab – Enhanced Professional Invoice
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, PageBreak
-from reportlab.lib.pagesizes import A4
-from reportlab.lib. styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.enums import TA_RIGHT, TA_CENTER, TA_LEFT
-from reportlab.lib import colors
-from reportlab.lib. units import mm
-from reportlab.pdfgen import canvas
+# ReportLab lives in backend/invoice_pdf.py and is imported on first checkout
 
 # =====================================================
 # PATH SETUP
 # =====================================================
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 GENERATED_BILLS_DIR = os.path.join(BASE_DIR, "generated_bills")
-os.makedirs(GENERATED_BILLS_DIR, exist_ok=True)
+SECRET_KEY = os.environ.get("SECRET_KEY", "slaydrip_secret_key")
 
 # =====================================================
-# APP SETUP
+# BLUEPRINT (the app itself is built by create_app below)
 # =====================================================
-app = Flask(
-    __name__,
-    template_folder="../frontend/templates",
-    static_folder="../frontend/static",
-    static_url_path="/static"
-)
-app.secret_key = "slaydrip_secret_key"
+bp = Blueprint("pos", __name__)
 
 
-@app.route("/health")
+@bp.route("/health")
 def health():
     return "OK", 200
 
 
-ALLOWED_PAYMENT_MODES = {"Cash", "UPI", "Card"}
+# =====================================================
+# METRICS & TRACING (see backend/tracing.py)
+# =====================================================
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    tracing.start_trace(request.method, route)
+    if tracing.claim_profile(route):
+        g.profiler = tracing.start_profile()
+
+
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    profiler = g.pop("profiler", None)
+    profile = tracing.save_profile(profiler, route, tracing.current_trace()) if profiler else None
+    tracing.finish_trace(response.status_code, profile)
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            route=route,
+            method=request.method,
+            status=str(response.status_code)
+        )
+        if response.status_code >= 500:
+            metrics.ERRORS.inc(route=route)
+    return response
+
+
+def _template_render_started(sender, template, context, **extra):
+    g.template_render_start = time.perf_counter()
+
+
+def _template_render_finished(sender, template, context, **extra):
+    start = g.pop("template_render_start", None)
+    if start is not None:
+        metrics.observe_stage("template_render", start, time.perf_counter() - start)
+
+# =====================================================
+# CONDITIONAL JSON (see backend/http_cache.py)
+# =====================================================
+def conditional_json(response):
+    if (request.endpoint not in http_cache.CONDITIONAL_ENDPOINTS
+            or response.status_code != 200 or not response.is_json):
+        return response
+    status, body, headers = http_cache.finalize(
+        response.get_data(),
+        request.headers,
+        bool(request.accept_encodings["gzip"]),
+        g.pop("etag_version", None)
+    )
+    response.set_data(body)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+@bp.route("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus scrape target. It carries sales and refund totals, so it needs
+    the METRICS_TOKEN bearer token or an admin session; METRICS_PUBLIC=1
+    opens it to anyone (e.g. a scraper on a private network).
+    """
+    if os.environ.get("METRICS_PUBLIC") != "1" and not has_bearer("METRICS_TOKEN") and not is_admin():
+        return "Unauthorized", 401
+    return Response(metrics.render_latest(), mimetype=metrics.CONTENT_TYPE)
+
+
+# =====================================================
+# ADMISSION CONTROL (see backend/admission.py)
+# =====================================================
+def busy_response(shed):
+    """503 with a retry hint; pages get a self-refreshing note, everything else JSON."""
+    retry_after = admission.retry_after_header(shed)
+    if request.method == "GET" and request.accept_mimetypes.accept_html and not request.path.startswith("/api/"):
+        body = (f'<meta http-equiv="refresh" content="{retry_after}">'
+                f"<p>Billing is busy - retrying in {shed.retry_after_ms} ms.</p>")
+        response = Response(body, status=503, mimetype="text/html")
+    else:
+        response = jsonify(admission.busy_body(shed))
+        response.status_code = 503
+    response.headers["Retry-After"] = retry_after
+    return response
+
+
+def admit_request():
+    cls = admission.route_class(request.endpoint)
+    if cls is None:
+        return None
+    try:
+        g.admission_token = admission.CONTROLLER.acquire(cls)
+    except admission.Shed as shed:
+        return busy_response(shed)
+    return None
+
+
+def release_admission(exc=None):
+    token = g.pop("admission_token", None)
+    if token is not None:
+        admission.CONTROLLER.release(token)
+
 
 # =====================================================
 # LOGIN REQUIRED DECORATOR
@@ -53,115 +141,66 @@ def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'staff_id' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('pos.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 
-def generate_ref(prefix: str) -> str:
-    """Generate a short reference for returns/exchanges."""
-    return f"{prefix}-{int(time.time())}-{uuid.uuid4().hex[:5].upper()}"
+def is_admin():
+    """Session username is listed in ADMIN_USERS (comma separated)."""
+    admins = {u.strip() for u in os.environ.get("ADMIN_USERS", "admin").split(",") if u.strip()}
+    return "staff_id" in session and session.get("username") in admins
 
 
-def load_returnable_items(cursor, invoice_no: str):
-    """Fetch sold items with how many units are still returnable."""
-    cursor.execute(
-        """
-        SELECT
-            si.design_id,
-            si.size,
-            si.quantity AS sold_qty,
-            si.price AS unit_price,
-            d.design_code,
-            d.product_name,
-            d.color,
-            COALESCE(r.total_returned, 0) AS already_returned
-        FROM sale_items si
-        JOIN designs d ON d.design_id = si.design_id
-        LEFT JOIN (
-            SELECT invoice_no, design_id, size, SUM(quantity) AS total_returned
-            FROM returns
-            WHERE invoice_no = %s
-            GROUP BY invoice_no, design_id, size
-        ) r
-        ON r.invoice_no = si.invoice_no AND r.design_id = si.design_id AND r.size = si.size
-        WHERE si.invoice_no = %s
-        """,
-        (invoice_no, invoice_no)
-    )
+def has_bearer(env_var):
+    """The request carries the bearer token set in env_var (never true while it is unset)."""
+    token = os.environ.get(env_var)
+    if not token:
+        return False
+    # bytes: compare_digest refuses non-ASCII str, and the header is client input
+    header = request.headers.get("Authorization", "").encode("utf-8", "surrogateescape")
+    return hmac.compare_digest(header, f"Bearer {token}".encode("utf-8"))
+
+
+def admin_required(f):
+    """Like login_required, but only for usernames listed in ADMIN_USERS (comma separated)."""
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        if not is_admin():
+            return "Forbidden", 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def session_stall_id():
+    """The stall this session sells from (bound at login; sessions from before stalls get the default one)."""
+    return session.get("stall_id") or stalls.DEFAULT_STALL_ID
 
-    items = {}
-    for row in cursor.fetchall():
-        returnable = max(0, row["sold_qty"] - row["already_returned"])
-        items[(row["design_id"], row["size"])] = {
-            "design_id": row["design_id"],
-            "size": row["size"],
-            "sold_qty": row["sold_qty"],
-            "unit_price": float(row["unit_price"]),
-            "design_code": row["design_code"],
-            "product_name": row["product_name"],
-            "color": row["color"],
-            "already_returned": row["already_returned"],
-            "returnable": returnable
-        }
-    return items
 
 # =====================================================
-# CUSTOM PAGE TEMPLATE WITH WATERMARK
+# READ ROUTING (replica for lookups, read-your-writes)
 # =====================================================
-class InvoiceCanvas(canvas.Canvas):
-    """Custom canvas to add watermark and footer"""
-    def __init__(self, *args, **kwargs):
-        canvas.Canvas.__init__(self, *args, **kwargs)
-        self.pages = []
-
-    def showPage(self):
-        self.pages.append(dict(self.__dict__))
-        self._startPage()
-
-    def save(self):
-        page_count = len(self.pages)
-        for page_num, page in enumerate(self.pages, 1):
-            self.__dict__. update(page)
-            self.draw_watermark()
-            self.draw_footer(page_num, page_count)
-            canvas.Canvas.showPage(self)
-        canvas.Canvas.save(self)
-
-    def draw_watermark(self):
-        """Add subtle watermark"""
-        self.saveState()
-        self.setFont("Helvetica-Bold", 60)
-        self.setFillColor(colors.Color(0.9, 0.9, 0.9, alpha=0.3))
-        self.translate(A4[0]/2, A4[1]/2)
-        self.rotate(45)
-        self.drawCentredString(0, 0, "SLAYDRIP")
-        self.restoreState()
-
-    def draw_footer(self, page_num, page_count):
-        """Add professional footer"""
-        self.saveState()
-        self.setFont("Helvetica", 8)
-        self.setFillColor(colors.grey)
-        
-        # Footer line
-        self.setStrokeColor(colors.Color(0.8, 0.8, 0.8))
-        self.setLineWidth(0.5)
-        self.line(20*mm, 15*mm, A4[0]-20*mm, 15*mm)
-        
-        # Footer text
-        footer_text = "SLAYDRIP | Premium Fashion Wear | Contact(ig): salydrip.in| www.slaydrip.com"
-        self.drawCentredString(A4[0]/2, 11*mm, footer_text)
-        
-        # Page number
-        self.drawRightString(A4[0]-20*mm, 11*mm, f"Page {page_num} of {page_count}")
-        
-        self.restoreState()
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", "30"))
+
+
+def mark_write():
+    """Remember that this session just wrote, so its next reads go to the primary."""
+    session["last_write_at"] = time.time()
+
+
+def wrote_recently():
+    return time.time() - session.get("last_write_at", 0) < READ_YOUR_WRITES_SECONDS
+
+
+def get_read_connection():
+    """Replica connection for lookups, unless this session wrote within READ_YOUR_WRITES_SECONDS."""
+    return get_connection(readonly=not wrote_recently())
 
 # =====================================================
 # LOGIN
 # =====================================================
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
@@ -171,12 +210,14 @@ def login():
             return render_template("login.html", error="Please enter both username and password")
         
         conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT staff_id, username, password, full_name, is_active
-            FROM staff
-            WHERE username=%s
+            SELECT st.staff_id, st.username, st.password, st.full_name, st.is_active,
+                   st.stall_id, s.name AS stall_name
+            FROM staff st
+            JOIN stalls s ON s.stall_id = st.stall_id
+            WHERE st.username=%s
         """, (username,))
         
         staff = cursor.fetchone()
@@ -189,104 +230,189 @@ def login():
                 session["staff_id"] = staff["staff_id"]
                 session["staff_name"] = staff["full_name"]
                 session["username"] = staff["username"]
-                return redirect(url_for("home"))
+                session["stall_id"] = staff["stall_id"]
+                session["stall_name"] = staff["stall_name"]
+                return redirect(url_for("pos.home"))
         
         return render_template("login.html", error="Invalid username or password")
     
     # If already logged in, redirect to home
     if 'staff_id' in session:
-        return redirect(url_for('home'))
+        return redirect(url_for('pos.home'))
     
     return render_template("login.html")
 
 # =====================================================
 # LOGOUT
 # =====================================================
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     session.clear()
-    return redirect(url_for("login"))
+    return redirect(url_for("pos.login"))
 
 # =====================================================
-# UPDATE STALL LOCATION
+# SWITCH STALL (this session only, see backend/stalls.py)
 # =====================================================
-@app.route("/update-stall-location", methods=["POST"])
+@bp.route("/update-stall-location", methods=["POST"])
 @login_required
 def update_stall_location():
     stall_location = request.form.get("stall_location", "").strip()
     
     if not stall_location:
-        return redirect(url_for("home"))
+        return redirect(url_for("pos.home"))
     
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE store_settings
-        SET current_stall_location=%s
-        WHERE id=1
-    """, (stall_location,))
-    
-    conn.commit()
+    stall = stalls.by_name(cursor, stall_location)
     cursor.close()
     conn.close()
+
+    if stall and stall["is_active"]:
+        session["stall_id"] = stall["stall_id"]
+        session["stall_name"] = stall["name"]
+        session.pop("cart", None)  # its stock was checked against the old stall
     
-    return redirect(url_for("home"))
+    return redirect(url_for("pos.home"))
 
 # =====================================================
 # HOME
 # =====================================================
-@app.route("/")
+@bp.route("/")
 @login_required
 def home():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute("""
-        SELECT design_id, design_code, product_name, gender, color, price
-        FROM designs
-    """)
-    designs = cursor. fetchall()
+    # the design picker loads from /api/catalog/search, not from this page
+    conn = get_read_connection()
+    cursor = conn.cursor()
 
-    cursor.execute("SELECT discount_percent, current_stall_location FROM store_settings WHERE id=1")
-    settings = cursor.fetchone()
-    discount_percent = settings["discount_percent"]
-    current_stall_location = settings.get("current_stall_location", "Main Store")
+    stall = stalls.get(cursor, session_stall_id())
+    stall_options = stalls.list_active(cursor)
 
     cursor.close()
     conn.close()
 
     return render_template(
         "pos.html", 
-        designs=designs, 
-        discount_percent=discount_percent,
-        current_stall_location=current_stall_location,
+        discount_percent=stall["discount_percent"],
+        current_stall_location=stall["name"],
+        stalls=stall_options,
         staff_name=session.get("staff_name", "Unknown")
     )
 
 # =====================================================
 # GET SIZES
 # =====================================================
-@app.route("/get-sizes/<int:design_id>")
+@bp.route("/get-sizes/<int:design_id>")
 @login_required
 def get_sizes(design_id):
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    conn = get_read_connection()
+    cursor = conn.cursor()
 
     cursor.execute("""
-        SELECT size, stock FROM design_stock
-        WHERE design_id=%s
-    """, (design_id,))
+        SELECT size, stock FROM stock_levels
+        WHERE stall_id=%s AND design_id=%s
+    """, (session_stall_id(), design_id))
 
     sizes = cursor.fetchall()
     cursor.close()
     conn.close()
     return jsonify(sizes)
 
+# =====================================================
+# CATALOG SEARCH (in-memory index, see backend/catalog.py)
+# =====================================================
+@bp.route("/api/catalog/search")
+@login_required
+def catalog_search():
+    return jsonify(catalog.get_index().search(
+        request.args.get("q", ""),
+        gender=request.args.get("gender") or None,
+        offset=request.args.get("offset", 0, type=int),
+        limit=request.args.get("limit", 20, type=int)
+    ))
+
+# =====================================================
+# SKU SCAN (in-memory index, see backend/sku.py)
+# =====================================================
+def parse_cart(items):
+    """A cart sent by the page -> clean lines; ValueError naming the first bad one."""
+    if not isinstance(items, list):
+        raise ValueError("Cart must be a list")
+    cart = []
+    for n, item in enumerate(items, 1):
+        try:
+            line = dict(
+                item,
+                design_id=int(item["design_id"]),
+                size=str(item["size"]).strip(),
+                quantity=int(item["quantity"]),
+                price=float(item["price"])
+            )
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Invalid cart line {n}")
+        if not line["size"] or line["quantity"] <= 0 or line["price"] < 0:
+            raise ValueError(f"Invalid cart line {n}")
+        cart.append(line)
+    return cart
+
+
+@bp.route("/api/scan/<sku_code>", methods=["POST"])
+@login_required
+def api_scan(sku_code):
+    """
+    Resolve a scanned tag and add it to the session cart in one call.
+
+    The body may carry the page's current cart ({"cart": [...], "quantity": n});
+    it replaces the session cart first, so items picked by hand are kept.
+    """
+    entry = sku.lookup(sku_code, session_stall_id())
+    if entry is None:
+        return jsonify({"error": f"Unknown SKU {sku_code}"}), 404
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        quantity = max(1, int(payload.get("quantity") or 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid quantity"}), 400
+    try:
+        cart = parse_cart(payload["cart"] if payload.get("cart") is not None else session.get("cart", []))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    line = next((i for i in cart if i["design_id"] == entry["design_id"] and i["size"] == entry["size"]), None)
+    wanted = quantity + (line["quantity"] if line else 0)
+    if entry["stock"] < wanted:
+        return jsonify({
+            "error": f"Only {entry['stock']} left of {entry['sku']}",
+            "sku": entry["sku"],
+            "stock": entry["stock"]
+        }), 409
+
+    if line:
+        line["quantity"] = wanted
+    else:
+        cart.append({
+            "design_id": entry["design_id"],
+            "design_text": f"{entry['design_code']} | {entry['product_name']} | {entry['color']} | {entry['gender']}",
+            "size": entry["size"],
+            "quantity": quantity,
+            "price": entry["price"]
+        })
+    session["cart"] = cart
+    session.modified = True
+
+    return jsonify({
+        "sku": entry["sku"],
+        "design": {k: entry[k] for k in ("design_id", "design_code", "product_name", "color", "gender")},
+        "size": entry["size"],
+        "price": entry["price"],
+        "stock": entry["stock"],
+        "cart": cart
+    })
+
 # =====================================================
 # SAVE CART
 # =====================================================
-@app.route("/save-cart", methods=["POST"])
+@bp.route("/save-cart", methods=["POST"])
 @login_required
 def save_cart():
     session["cart"] = request.json. get("cart", [])
@@ -296,7 +422,7 @@ def save_cart():
 # =====================================================
 # CHECKOUT
 # =====================================================
-@app.route("/checkout", methods=["POST"])
+@bp.route("/checkout", methods=["POST"])
 @login_required
 def checkout():
     cart = session.get("cart", [])
@@ -311,54 +437,31 @@ def checkout():
 
     # -------- DB --------
     conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
 
-    cursor.execute("SELECT gst_percent, current_stall_location FROM store_settings WHERE id=1")
-    settings = cursor.fetchone()
-    default_gst_percent = float(settings["gst_percent"])
-    stall_location = settings.get("current_stall_location", "Main Store")
-    
     # Get staff info from session
     staff_id = session.get("staff_id")
     staff_name = session.get("staff_name", "Unknown")
 
-    cursor.execute("SELECT last_number FROM invoice_counter WHERE id=1")
-    last_no = cursor.fetchone()["last_number"] + 1
-    cursor.execute("UPDATE invoice_counter SET last_number=%s WHERE id=1", (last_no,))
-
-    invoice_no = f"INV-{last_no:05d}"
+    # atomic bump of this stall's counter: the row lock serializes the
+    # stall's concurrent checkouts until commit, so two can never read the
+    # same last_number; other stalls have their own row
+    invoice_no, stall = stalls.next_invoice(cursor, session_stall_id())
+    stall_id = stall["stall_id"]
+    stall_location = stall["name"]
+    default_gst_percent = float(stall["gst_percent"])
     bill_no = f"BILL-{int(time.time())}"
     bill_date = date.today()
 
     # =====================================================
-    # 💰 NEW CALCULATION LOGIC (GST INCLUSIVE)
+    # 💰 PRICING (GST INCLUSIVE, see backend/pricing.py)
     # =====================================================
-    
-    # Step 1: Calculate subtotal from GST-inclusive prices
-    subtotal_inclusive = sum(i["price"] * i["quantity"] for i in cart)
-    
-    # Step 2: Extract base price (remove GST from entered price) - using default GST for initial calculation
-    gst_multiplier = 1 + (default_gst_percent / 100)
-    base_price_total = subtotal_inclusive / gst_multiplier
-    
-    # Step 3: Calculate GST amount that was included in the price
-    gst_in_original = subtotal_inclusive - base_price_total
-    
-    # Step 4: Apply discount on base price
-    discount_amount = base_price_total * discount_percent / 100
-    discounted_base_price = base_price_total - discount_amount
-    
-    # Step 5: Determine GST percentage based on discounted base price
-    if discounted_base_price < 1500:
-        gst_percent = 5
-    else:
-        gst_percent = 12
-    
-    # Step 6: Calculate GST on discounted base price
-    gst_amount = discounted_base_price * gst_percent / 100
-    
-    # Step 7: Final Grand Total (discounted base + GST)
-    grand_total = discounted_base_price + gst_amount
+    with metrics.timed("pricing"):
+        totals = pricing.price_cart(cart, discount_percent, default_gst_percent)
+    base_price_total = totals["base_price_total"]
+    discount_amount = totals["discount_amount"]
+    gst_amount = totals["gst_amount"]
+    grand_total = totals["grand_total"]
 
     # =====================================================
     # 🎨 PROFESSIONAL PDF GENERATION
@@ -366,297 +469,21 @@ def checkout():
     pdf_filename = f"SLAYDRIP_{uuid.uuid4().hex[:6]}.pdf"
     pdf_path = os.path.join(GENERATED_BILLS_DIR, pdf_filename)
 
-    doc = SimpleDocTemplate(
-        pdf_path,
-        pagesize=A4,
-        leftMargin=20*mm,
-        rightMargin=20*mm,
-        topMargin=20*mm,
-        bottomMargin=25*mm
-    )
-
-    # =====================================================
-    # 🎨 CUSTOM STYLES
-    # =====================================================
-    styles = getSampleStyleSheet()
-    
-    # Brand Header Style
-    styles.add(ParagraphStyle(
-        name="BrandHeader",
-        fontSize=28,
-        fontName="Helvetica-Bold",
-        textColor=colors.Color(0.1, 0.1, 0.1),
-        spaceAfter=2,
-        leading=32
-    ))
-    
-    # Tagline Style
-    styles. add(ParagraphStyle(
-        name="Tagline",
-        fontSize=10,
-        fontName="Helvetica-Oblique",
-        textColor=colors.Color(0.4, 0.4, 0.4),
-        spaceAfter=12
-    ))
-    
-    # Invoice Title
-    styles.add(ParagraphStyle(
-        name="InvoiceTitle",
-        fontSize=20,
-        fontName="Helvetica-Bold",
-        textColor=colors.Color(0.2, 0.2, 0.2),
-        alignment=TA_RIGHT,
-        spaceAfter=6
-    ))
-    
-    # Meta Info
-    styles.add(ParagraphStyle(
-        name="MetaInfo",
-        fontSize=9,
-        fontName="Helvetica",
-        alignment=TA_RIGHT,
-        textColor=colors.Color(0.3, 0.3, 0.3),
-        leading=13
-    ))
-    
-    # Section Header
-    styles. add(ParagraphStyle(
-        name="SectionHeader",
-        fontSize=11,
-        fontName="Helvetica-Bold",
-        textColor=colors.Color(0.1, 0.1, 0.1),
-        spaceAfter=8,
-        spaceBefore=12,
-        borderWidth=0,
-        borderColor=colors.Color(0.2, 0.2, 0.2),
-        borderPadding=4,
-        backColor=colors.Color(0.95, 0.95, 0.95)
-    ))
-    
-    # Table Header
-    styles.add(ParagraphStyle(
-        name="TableHeader",
-        fontSize=9,
-        fontName="Helvetica-Bold",
-        textColor=colors.white,
-        alignment=TA_CENTER
-    ))
-    
-    # Footer Style
-    styles.add(ParagraphStyle(
-        name="FooterNote",
-        fontSize=9,
-        fontName="Helvetica-Oblique",
-        textColor=colors.grey,
-        alignment=TA_CENTER,
-        spaceAfter=6
-    ))
-
-    elements = []
-
-    # =====================================================
-    # 📋 HEADER SECTION
-    # =====================================================
-    header_data = [
-        [
-            Paragraph("<b>SLAYDRIP</b><br/><font size=10><i>Premium Fashion Wear</i></font>", styles["BrandHeader"]),
-            Paragraph(
-                f"<b><font size=14>INVOICE</font></b><br/>"
-                f"<b>Invoice No:</b> {invoice_no}<br/>"
-                f"<b>Date:</b> {bill_date.strftime('%d.%m.%Y')}<br/>"
-                f"<b>Bill No:</b> {bill_no}<br/>"
-                f"<b>Staff:</b> {staff_name}<br/>"
-                f"<b>Location:</b> {stall_location}<br/>"
-                f"<b>Payment Mode:</b> {payment_mode.upper()}",
-                styles["MetaInfo"]
-            )
-        ]
-    ]
-    
-    header_table = Table(header_data, colWidths=[100*mm, 70*mm])
-    header_table.setStyle(TableStyle([
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("ALIGN", (0,0), (0,0), "LEFT"),
-        ("ALIGN", (1,0), (1,0), "RIGHT"),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 12),
-    ]))
-    
-    elements.append(header_table)
-    
-    # Decorative line
-    elements.append(Spacer(1, 4))
-    line_table = Table([["", ""]], colWidths=[170*mm])
-    line_table.setStyle(TableStyle([
-        ("LINEBELOW", (0,0), (-1,0), 2, colors.Color(0.2, 0.2, 0.2)),
-    ]))
-    elements.append(line_table)
-    elements.append(Spacer(1, 16))
-
-    # =====================================================
-    # 👤 CUSTOMER DETAILS
-    # =====================================================
-    elements. append(Paragraph("BILL TO", styles["SectionHeader"]))
-    
-    customer_data = [
-        ["Customer Name:", Paragraph(f"<b>{customer_name}</b>", styles["Normal"])],
-        ["Phone Number:", Paragraph(f"<b>{phone}</b>", styles["Normal"])]
-    ]
-    
-    customer_table = Table(customer_data, colWidths=[35*mm, 135*mm])
-    customer_table.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (0,-1), colors.Color(0.95, 0.95, 0.95)),
-        ("TEXTCOLOR", (0,0), (0,-1), colors.Color(0.3, 0.3, 0.3)),
-        ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,-1), 9),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-        ("LEFTPADDING", (0,0), (-1,-1), 8),
-        ("RIGHTPADDING", (0,0), (-1,-1), 8),
-        ("TOPPADDING", (0,0), (-1,-1), 6),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 6),
-        ("GRID", (0,0), (-1,-1), 0.5, colors.Color(0.8, 0.8, 0.8)),
-    ]))
-    
-    elements.append(customer_table)
-    elements.append(Spacer(1, 18))
-
-    # =====================================================
-    # 🛍️ ITEMS TABLE
-    # =====================================================
-    elements.append(Paragraph("ITEM DETAILS", styles["SectionHeader"]))
-    
-    # Table Header
-    item_data = [[
-        Paragraph("<b>PRODUCT</b>", styles["TableHeader"]),
-        Paragraph("<b>SIZE</b>", styles["TableHeader"]),
-        Paragraph("<b>QTY</b>", styles["TableHeader"]),
-        Paragraph("<b>RATE (Rs.)</b>", styles["TableHeader"]),
-        Paragraph("<b>AMOUNT (Rs. )</b>", styles["TableHeader"])
-    ]]
-    
-    # Table Rows
-    for idx, item in enumerate(cart):
-        bg_color = colors.Color(0.98, 0.98, 0.98) if idx % 2 == 0 else colors.white
-        item_data.append([
-            Paragraph(item["design_text"], styles["Normal"]),
-            Paragraph(f"<b>{item['size']}</b>", styles["Normal"]),
-            Paragraph(f"<b>{item['quantity']}</b>", styles["Normal"]),
-            Paragraph(f"Rs. {item['price']:.2f}", styles["Normal"]),
-            Paragraph(f"<b>Rs. {item['price'] * item['quantity']:.2f}</b>", styles["Normal"])
-        ])
-    
-    item_table = Table(item_data, colWidths=[78*mm, 18*mm, 15*mm, 28*mm, 31*mm])
-    item_table.setStyle(TableStyle([
-        # Header styling
-        ("BACKGROUND", (0,0), (-1,0), colors.Color(0.2, 0.2, 0.2)),
-        ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,0), 9),
-        ("ALIGN", (0,0), (-1,0), "CENTER"),
-        ("VALIGN", (0,0), (-1,0), "MIDDLE"),
-        ("TOPPADDING", (0,0), (-1,0), 8),
-        ("BOTTOMPADDING", (0,0), (-1,0), 8),
-        
-        # Body styling
-        ("FONTSIZE", (0,1), (-1,-1), 9),
-        ("ALIGN", (1,1), (-1,-1), "CENTER"),
-        ("ALIGN", (3,1), (4,-1), "RIGHT"),
-        ("VALIGN", (0,1), (-1,-1), "MIDDLE"),
-        ("TOPPADDING", (0,1), (-1,-1), 7),
-        ("BOTTOMPADDING", (0,1), (-1,-1), 7),
-        ("LEFTPADDING", (0,0), (-1,-1), 6),
-        ("RIGHTPADDING", (0,0), (-1,-1), 6),
-        
-        # Alternating row colors
-        *[("BACKGROUND", (0,i), (-1,i), colors.Color(0.98, 0.98, 0.98)) 
-          for i in range(1, len(item_data), 2)],
-        
-        # Grid
-        ("GRID", (0,0), (-1,-1), 0.5, colors.Color(0.7, 0.7, 0.7)),
-        ("LINEBELOW", (0,0), (-1,0), 1.5, colors.white),
-    ]))
-    
-    elements.append(item_table)
-    elements.append(Spacer(1, 20))
-
-    # =====================================================
-    # 💰 FINANCIAL SUMMARY (NEW LOGIC)
-    # =====================================================
-    summary_data = [
-        ["Subtotal (Incl. GST)", f"Rs. {subtotal_inclusive:.2f}"],
-        ["Base Price (Excl. GST)", f"Rs. {base_price_total:.2f}"],
-        [f"Discount ({discount_percent}%)", f"- Rs. {discount_amount:.2f}"],
-        ["Discounted Base Price", f"Rs. {discounted_base_price:.2f}"],
-        [f"GST ({gst_percent}%)", f"+ Rs. {gst_amount:.2f}"],
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[50*mm, 35*mm], hAlign="RIGHT")
-    summary_table.setStyle(TableStyle([
-        ("FONTSIZE", (0,0), (-1,-1), 9),
-        ("ALIGN", (0,0), (0,-1), "LEFT"),
-        ("ALIGN", (1,0), (1,-1), "RIGHT"),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-        ("TOPPADDING", (0,0), (-1,-1), 5),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 5),
-        ("TEXTCOLOR", (0,0), (-1,-1), colors.Color(0.2, 0.2, 0.2)),
-        ("LINEBELOW", (0,-1), (-1,-1), 1, colors.Color(0.7, 0.7, 0.7)),
-    ]))
-    
-    elements.append(summary_table)
-    elements.append(Spacer(1, 4))
-    
-    # Grand Total
-    grand_total_data = [[
-        Paragraph("<b><font color='white'>GRAND TOTAL</font></b>", styles["Normal"]),
-        Paragraph(f"<b><font color='white'>Rs. {grand_total:,.2f}</font></b>", styles["Normal"])
-    ]]
-    
-    grand_total_table = Table(grand_total_data, colWidths=[50*mm, 35*mm], hAlign="RIGHT")
-    grand_total_table.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,-1), colors.Color(0.2, 0.2, 0.2)),
-        ("TEXTCOLOR", (0,0), (-1,-1), colors.white),
-        ("FONTNAME", (0,0), (-1,-1), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,-1), 11),
-        ("ALIGN", (0,0), (0,0), "LEFT"),
-        ("ALIGN", (1,0), (1,0), "RIGHT"),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-        ("TOPPADDING", (0,0), (-1,-1), 8),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 8),
-        ("LEFTPADDING", (0,0), (-1,-1), 8),
-        ("RIGHTPADDING", (0,0), (-1,-1), 8),
-    ]))
-    
-    elements.append(grand_total_table)
-    elements.append(Spacer(1, 30))
-
-    # =====================================================
-    # 📝 FOOTER NOTES
-    # =====================================================
-    elements.append(Paragraph(
-        "<b>Terms & Conditions: </b>",
-        styles["SectionHeader"]
-    ))
-    
-    terms = [
-        "• All sales are final.  No refunds or exchanges.",
-        "• Products sold are subject to our standard warranty terms.",
-        "• Please retain this invoice for future reference.",
-        "• All prices are inclusive of GST."
-    ]
-    
-    for term in terms:
-        elements.append(Paragraph(term, styles["FooterNote"]))
-    
-    elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph(
-        "Thank you for shopping with <b>SLAYDRIP</b> – Your style, our passion!",
-        styles["FooterNote"]
-    ))
-
-    # =====================================================
-    # 🎨 BUILD PDF WITH CUSTOM CANVAS
-    # =====================================================
-    doc.build(elements, canvasmaker=InvoiceCanvas)
+    with metrics.timed("pdf_build"):
+        from backend.invoice_pdf import build_invoice_pdf
+        build_invoice_pdf(
+            pdf_path,
+            invoice_no=invoice_no,
+            bill_no=bill_no,
+            bill_date=bill_date,
+            staff_name=staff_name,
+            stall_location=stall_location,
+            payment_mode=payment_mode,
+            customer_name=customer_name,
+            phone=phone,
+            cart=cart,
+            **totals
+        )
 
     # -------- SAVE SALE --------
     cursor.execute("""
@@ -675,11 +502,7 @@ def checkout():
 
     # -------- SAVE SALE ITEMS --------
     for item in cart:
-        cursor.execute("""
-            INSERT INTO sale_items
-            (invoice_no, design_id, size, quantity, price)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (
+        statements.execute(cursor, "insert_sale_item", (
             invoice_no,
             item['design_id'],
             item['size'],
@@ -687,17 +510,36 @@ def checkout():
             item['price']
         ))
         
-        # Update stock
-        cursor.execute("""
-            UPDATE design_stock
-            SET stock = stock - %s
-            WHERE design_id = %s AND size = %s
-        """, (item['quantity'], item['design_id'], item['size']))
+        # Update stock (ledger insert, no row lock on design_stock)
+        stock_ledger.record(cursor, stall_id, item['design_id'], item['size'], -item['quantity'], "SALE", invoice_no, staff_id)
+
+    # same transaction: the event exists exactly when the sale does (sales
+    # velocity is folded from it later, backend/velocity.py)
+    outbox.emit(cursor, "sale.created", invoice_no, {
+        "invoice_no": invoice_no,
+        "bill_no": bill_no,
+        "bill_date": bill_date.isoformat(),
+        "stall_id": stall_id,
+        "staff_id": staff_id,
+        "payment_mode": payment_mode,
+        "subtotal": round(base_price_total, 2),
+        "discount_percent": discount_percent,
+        "discount_amount": round(discount_amount, 2),
+        "gst_amount": round(gst_amount, 2),
+        "total_amount": round(grand_total, 2),
+        "items": [
+            {"design_id": i["design_id"], "size": i["size"], "quantity": i["quantity"], "price": float(i["price"])}
+            for i in cart
+        ],
+    }, stall_location)
 
     conn.commit()
     cursor.close()
     conn.close()
     session.pop("cart", None)
+    mark_write()
+    metrics.SALES.inc()
+    metrics.SALES_AMOUNT.inc(grand_total)
 
     return render_template(
         "bill_template.html",
@@ -709,12 +551,12 @@ def checkout():
         bill_no=bill_no,
         bill_date=bill_date.strftime("%d.%m.%Y"),
         payment_mode=payment_mode,
-        subtotal=subtotal_inclusive,
+        subtotal=totals["subtotal_inclusive"],
         base_price=base_price_total,
         discount_percent=discount_percent,
         discount_amount=discount_amount,
-        discounted_subtotal=discounted_base_price,
-        gst_percent=gst_percent,
+        discounted_subtotal=totals["discounted_base_price"],
+        gst_percent=totals["gst_percent"],
         gst_amount=gst_amount,
         grand_total=grand_total
     )
@@ -723,11 +565,11 @@ def checkout():
 # =====================================================
 # RETURNS & EXCHANGES
 # =====================================================
-@app.route("/return-exchange")
+@bp.route("/return-exchange")
 @login_required
 def return_exchange_page():
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    conn = get_read_connection()
+    cursor = conn.cursor()
     cursor.execute(
         """
         SELECT design_id, design_code, product_name, color, gender, price
@@ -746,25 +588,36 @@ def return_exchange_page():
     )
 
 
-@app.route("/api/invoice/<invoice_no>")
+@bp.route("/api/invoice/<invoice_no>")
 @login_required
 def api_get_invoice(invoice_no):
     invoice_no = invoice_no.strip()
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    conn = get_read_connection()
+    cursor = conn.cursor()
 
-    cursor.execute(
-        """
-        SELECT invoice_no, customer_name, phone, bill_date, payment_mode, total_amount
-        FROM sales
-        WHERE invoice_no=%s
-        """,
-        (invoice_no,)
-    )
+    statements.execute(cursor, "sale_by_invoice", (invoice_no,))
     sale = cursor.fetchone()
+    if not sale and os.environ.get("DATABASE_REPLICA_URL"):
+        # replica may lag a sale made from another session - ask the primary
+        cursor.close()
+        conn.close()
+        conn = get_connection()
+        cursor = conn.cursor()
+        statements.execute(cursor, "sale_by_invoice", (invoice_no,))
+        sale = cursor.fetchone()
+    if sale:
+        g.etag_version = sale.pop("row_version")
+        if http_cache.is_fresh(request.headers, g.etag_version):
+            cursor.close()
+            conn.close()
+            return http_cache.not_modified(g.etag_version)
     if not sale:
+        # older than the return window: rebuilt from the archive files
+        archived = partitions.lookup_archived(invoice_no, cursor)
         cursor.close()
         conn.close()
+        if archived:
+            return jsonify(archived)
         return jsonify({"error": "Invoice not found"}), 404
 
     items = load_returnable_items(cursor, invoice_no)
@@ -778,274 +631,227 @@ def api_get_invoice(invoice_no):
     })
 
 
-@app.route("/api/returns", methods=["POST"])
+@bp.route("/api/returns", methods=["POST"])
 @login_required
 def api_process_return():
-    payload = request.get_json(force=True) or {}
-    invoice_no = (payload.get("invoice_no") or "").strip()
-    payment_mode = (payload.get("payment_mode") or "").strip()
-    items = payload.get("items") or []
-
-    if not invoice_no:
-        return jsonify({"error": "Invoice number is required"}), 400
-    if payment_mode not in ALLOWED_PAYMENT_MODES:
-        return jsonify({"error": "Invalid payment mode"}), 400
-    if not items:
-        return jsonify({"error": "No items selected"}), 400
+    body, status = handle_return(request.get_json(force=True) or {}, session.get("staff_id"), session_stall_id())
+    if status == 200:
+        mark_write()
+    return jsonify(body), status
 
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    def fail(message, status=400):
-        conn.rollback()
-        cursor.close(); conn.close()
-        return jsonify({"error": message}), status
 
-    try:
-        cursor.execute("SELECT 1 FROM sales WHERE invoice_no=%s", (invoice_no,))
-        if not cursor.fetchone():
-            return fail("Invoice not found", 404)
-
-        sold_items = load_returnable_items(cursor, invoice_no)
-        if not sold_items:
-            return fail("No items found for invoice")
-
-        ref = generate_ref("RET")
-        total_refund = Decimal("0.00")
-        processed = []
-
-        for item in items:
-            try:
-                design_id = int(item.get("design_id"))
-                size = (item.get("size") or "").strip()
-                qty = int(item.get("quantity"))
-            except Exception:
-                return fail("Invalid item payload")
-
-            key = (design_id, size)
-            if key not in sold_items:
-                return fail(f"Item {design_id}-{size} not in invoice")
-
-            allowed = sold_items[key]["returnable"]
-            if qty <= 0 or qty > allowed:
-                return fail(f"Invalid qty for {design_id}-{size}. Max {allowed}")
-
-            unit_price = Decimal(str(sold_items[key]["unit_price"]))
-            line_refund = unit_price * qty
-            total_refund += line_refund
-
-            cursor.execute(
-                """
-                UPDATE design_stock
-                SET stock = stock + %s
-                WHERE design_id=%s AND size=%s
-                """,
-                (qty, design_id, size)
-            )
-            if cursor.rowcount == 0:
-                raise RuntimeError(f"Stock row missing for design {design_id} size {size}")
-
-            cursor.execute(
-                """
-                INSERT INTO returns
-                (return_ref, invoice_no, design_id, size, quantity, refund_amount, return_type, payment_mode)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                """,
-                (ref, invoice_no, design_id, size, qty, line_refund, "RETURN", payment_mode)
-            )
+@bp.route("/api/exchanges", methods=["POST"])
+@login_required
+def api_process_exchange():
+    body, status = handle_exchange(request.get_json(force=True) or {}, session.get("staff_id"), session_stall_id())
+    if status == 200:
+        mark_write()
+    return jsonify(body), status
 
-            processed.append({
-                "design_id": design_id,
-                "size": size,
-                "quantity": qty,
-                "refund_amount": float(line_refund)
-            })
 
-        conn.commit()
-        cursor.close(); conn.close()
+@bp.route("/api/transfers", methods=["POST"])
+@login_required
+def api_transfer_stock():
+    """Send stock from this session's stall to another: {"to_stall": name, "items": [...]}."""
+    body, status = stalls.handle_transfer(request.get_json(force=True) or {}, session_stall_id(), session.get("staff_id"))
+    if status == 200:
+        mark_write()
+    return jsonify(body), status
 
-        return jsonify({
-            "return_ref": ref,
-            "total_refund": float(total_refund),
-            "items": processed
-        })
 
-    except Exception as exc:
-        conn.rollback()
-        cursor.close(); conn.close()
-        return jsonify({"error": str(exc)}), 500
+# =====================================================
+# REORDER RANKING (see backend/velocity.py)
+# =====================================================
+@bp.route("/api/reorder")
+@login_required
+def api_reorder():
+    stall = request.args.get("stall") or velocity.ALL_STALLS
+    limit = min(request.args.get("limit", 50, type=int), 500)
+    return jsonify(velocity.ranking(stall, limit))
 
 
-@app.route("/api/exchanges", methods=["POST"])
-@login_required
-def api_process_exchange():
-    payload = request.get_json(force=True) or {}
-    invoice_no = (payload.get("invoice_no") or "").strip()
-    payment_mode = (payload.get("payment_mode") or "").strip()
-    return_items = payload.get("return_items") or []
-    new_items = payload.get("new_items") or []
-    # Optional discount percent applied to new exchange items
+# =====================================================
+# CHANGE FEED (see backend/outbox.py)
+# =====================================================
+@bp.route("/api/events")
+def api_events():
+    """Sales events after ?after=<cursor>. EVENT_FEED_TOKEN bearer for consumers, or an admin session."""
+    if not has_bearer("EVENT_FEED_TOKEN") and not is_admin():
+        return jsonify({"error": "Unauthorized"}), 401
+    limit = max(1, min(request.args.get("limit", 500, type=int), outbox.MAX_BATCH))
     try:
-        discount_percent = float(payload.get("discount_percent") or 0)
-        if discount_percent < 0:
-            discount_percent = 0.0
-    except Exception:
-        discount_percent = 0.0
-
-    if not invoice_no:
-        return jsonify({"error": "Invoice number is required"}), 400
-    if payment_mode not in ALLOWED_PAYMENT_MODES:
-        return jsonify({"error": "Invalid payment mode"}), 400
-    if not return_items:
-        return jsonify({"error": "At least one item must be returned"}), 400
+        return jsonify(outbox.feed(request.args.get("after") or outbox.START, limit))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except outbox.FeedGap as gap:
+        return jsonify({"error": str(gap), "resume_from": gap.resume_from}), 410
 
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    def fail(message, status=400):
-        conn.rollback()
-        cursor.close(); conn.close()
-        return jsonify({"error": message}), status
 
+# =====================================================
+# ADMIN: END-OF-DAY TILL (see backend/till.py)
+# =====================================================
+@bp.route("/admin/till")
+@admin_required
+def admin_till():
     try:
-        cursor.execute("SELECT 1 FROM sales WHERE invoice_no=%s", (invoice_no,))
-        if not cursor.fetchone():
-            return fail("Invoice not found", 404)
-
-        sold_items = load_returnable_items(cursor, invoice_no)
-        if not sold_items:
-            return fail("No items found for invoice")
-
-        # Map design price for new items
-        cursor.execute("SELECT design_id, price FROM designs")
-        design_price_map = {row["design_id"]: Decimal(str(row["price"])) for row in cursor.fetchall()}
-
-        exc_ref = generate_ref("EXC")
-        returned_total = Decimal("0.00")
-        new_total = Decimal("0.00")
-
-        # Handle returned items first (stock + refund credit)
-        for item in return_items:
-            design_id = int(item.get("design_id"))
-            size = (item.get("size") or "").strip()
-            qty = int(item.get("quantity"))
-
-            key = (design_id, size)
-            if key not in sold_items:
-                return fail(f"Item {design_id}-{size} not in invoice")
-
-            allowed = sold_items[key]["returnable"]
-            if qty <= 0 or qty > allowed:
-                return fail(f"Invalid qty for {design_id}-{size}. Max {allowed}")
-
-            unit_price = Decimal(str(sold_items[key]["unit_price"]))
-            line_refund = unit_price * qty
-            returned_total += line_refund
-
-            cursor.execute(
-                """
-                UPDATE design_stock
-                SET stock = stock + %s
-                WHERE design_id=%s AND size=%s
-                """,
-                (qty, design_id, size)
-            )
-            if cursor.rowcount == 0:
-                raise RuntimeError(f"Stock row missing for design {design_id} size {size}")
-
-            cursor.execute(
-                """
-                INSERT INTO returns
-                (return_ref, invoice_no, design_id, size, quantity, refund_amount, return_type, payment_mode)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                """,
-                (exc_ref, invoice_no, design_id, size, qty, line_refund, "EXCHANGE", payment_mode)
-            )
+        day = date.fromisoformat(request.args["date"]) if request.args.get("date") else date.today()
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    return render_template(
+        "admin_till.html",
+        # after a close this session reads the primary, not a lagging replica
+        report=till.get_report(day, readonly=not wrote_recently()),
+        can_close=day < date.today(),
+        can_close_early=day == date.today(),
+        staff_name=session.get("staff_name", "Unknown")
+    )
 
-        # Handle new items (stock - and record in exchange_details)
-        for item in new_items:
-            design_id = int(item.get("design_id"))
-            size = (item.get("size") or "").strip()
-            qty = int(item.get("quantity"))
 
-            if qty <= 0:
-                return fail("Quantity must be positive for new items")
+@bp.route("/admin/till/close", methods=["POST"])
+@admin_required
+def admin_till_close():
+    try:
+        day = date.fromisoformat(request.form.get("date", ""))
+        till.close_day(day, session.get("staff_id"), early=request.form.get("early") == "1")
+        mark_write()
+    except ValueError as exc:
+        flash(str(exc))
+        return redirect(url_for("pos.admin_till"))
+    return redirect(url_for("pos.admin_till", date=day.isoformat()))
 
-            if design_id not in design_price_map:
-                return fail(f"Design {design_id} not found")
 
-            unit_price = design_price_map[design_id]
+# =====================================================
+# ADMIN: SLOW QUERIES & PROFILES
+# =====================================================
+@bp.route("/admin/slow-queries")
+@admin_required
+def admin_slow_queries():
+    limit = request.args.get("limit", 20, type=int)
+    return render_template(
+        "admin_slow_queries.html",
+        offenders=slow_queries.top_offenders(limit),
+        threshold_ms=slow_queries.SLOW_QUERY_MS,
+        staff_name=session.get("staff_name", "Unknown")
+    )
 
-            cursor.execute(
-                "SELECT stock FROM design_stock WHERE design_id=%s AND size=%s",
-                (design_id, size)
-            )
-            row = cursor.fetchone()
-            if not row:
-                return fail(f"No stock row for {design_id}-{size}")
-            if row["stock"] < qty:
-                return fail(f"Insufficient stock for {design_id}-{size}")
-
-            cursor.execute(
-                """
-                UPDATE design_stock
-                SET stock = stock - %s
-                WHERE design_id=%s AND size=%s
-                """,
-                (qty, design_id, size)
-            )
 
-            line_total = unit_price * qty
-            new_total += line_total
+@bp.route("/admin/profiles", methods=["GET", "POST"])
+@admin_required
+def admin_profiles():
+    """Arm cProfile for the next N requests on a route; list and download the captures."""
+    if request.method == "POST":
+        if request.form.get("action") == "disarm":
+            tracing.disarm_profile()
+        else:
+            route = request.form.get("route", "").strip()
+            count = request.form.get("count", 5, type=int)
+            if route and 0 < count <= 100:
+                tracing.arm_profile(route, count)
+        return redirect(url_for("pos.admin_profiles"))
 
-            cursor.execute(
-                """
-                INSERT INTO exchange_details
-                (exchange_ref, invoice_no, design_id, size, quantity, unit_price, line_total)
-                VALUES (%s,%s,%s,%s,%s,%s,%s)
-                """,
-                (exc_ref, invoice_no, design_id, size, qty, unit_price, line_total)
-            )
+    routes = sorted({rule.rule for rule in current_app.url_map.iter_rules() if rule.endpoint != "static"})
+    return render_template(
+        "admin_profiles.html",
+        armed=tracing.armed(),
+        routes=routes,
+        profiles=tracing.list_profiles(),
+        trace_log=tracing.TRACE_LOG,
+        staff_name=session.get("staff_name", "Unknown")
+    )
 
-        # Apply discount on new items total for settlement purpose
-        discount_amount = (new_total * Decimal(str(discount_percent))) / Decimal("100")
-        new_total_after_discount = new_total - discount_amount
 
-        diff = returned_total - new_total_after_discount
-        if diff > 0:
-            settlement = {"type": "REFUND", "amount": float(diff)}
-        elif diff < 0:
-            settlement = {"type": "COLLECT", "amount": float(abs(diff))}
-        else:
-            settlement = {"type": "EVEN", "amount": 0.0}
+@bp.route("/admin/profiles/<filename>")
+@admin_required
+def admin_profile_download(filename):
+    return send_from_directory(tracing.PROFILE_DIR, filename, as_attachment=True)
 
-        conn.commit()
-        cursor.close(); conn.close()
 
-        return jsonify({
-            "exchange_ref": exc_ref,
-            "returned_total": float(returned_total),
-            "new_total": float(new_total),
-            "discount_percent": discount_percent,
-            "discount_amount": float(discount_amount),
-            "settlement": settlement,
-            "payment_mode": payment_mode
-        })
+@bp.route("/admin/statements")
+@admin_required
+def admin_statements():
+    """Prepared-statement registry stats plus one pooled connection's plan-cache view."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        return jsonify(statements.stats(cursor))
+    finally:
+        cursor.close()
+        conn.close()
 
-    except Exception as exc:
-        conn.rollback()
-        cursor.close(); conn.close()
-        return jsonify({"error": str(exc)}), 500
 
+# =====================================================
+# STATIC ASSETS (hashed + precompressed, see backend/assets.py)
+# =====================================================
+@bp.route("/assets/<filename>")
+def asset(filename):
+    return assets.send_asset(filename)
 
 # =====================================================
 # DOWNLOAD PDF
 # =====================================================
-@app.route("/download/<filename>")
+@bp.route("/download/<filename>")
 @login_required
 def download_pdf(filename):
     return send_from_directory(GENERATED_BILLS_DIR, filename, as_attachment=False)
 
+
+@bp.route("/admin/invoices/export.zip")
+@admin_required
+def admin_invoice_export():
+    """Every bill matching ?since=&until=&stall= as one streamed ZIP (see backend/invoice_export.py)."""
+    try:
+        since = date.fromisoformat(request.args["since"]) if request.args.get("since") else None
+        until = date.fromisoformat(request.args["until"]) if request.args.get("until") else None
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    stall = request.args.get("stall", "").strip() or None
+
+    filters, params = invoice_export.build_filters(since, until, stall)
+    name = "-".join(["slaydrip-invoices", *(str(d) for d in (since, until) if d)])
+    return Response(
+        invoice_export.stream_zip(filters, params),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{name}.zip"'}
+    )
+
+# =====================================================
+# APP FACTORY
+# =====================================================
+def create_app():
+    """
+    Build the Flask app.
+
+    Deliberately cheap: no ReportLab, no DB connection and no filesystem
+    writes, so `gunicorn --preload` can fork workers from a small, warm
+    master and /health answers straight after a cold start.
+    """
+    app = Flask(
+        __name__,
+        template_folder="../frontend/templates",
+        static_folder="../frontend/static",
+        static_url_path="/static"
+    )
+    app.secret_key = SECRET_KEY
+    app.jinja_env.globals["asset_url"] = assets.asset_url
+
+    app.before_request(start_request_timer)
+    # first request in each worker (after the fork): SKU index and catalog
+    # invalidation listener; a pid check after that
+    app.before_request(sku.ensure_listener)
+    app.before_request(admit_request)
+    app.after_request(record_request_metrics)
+    app.after_request(conditional_json)  # runs first: metrics see the final status
+    app.teardown_request(release_admission)
+    before_render_template.connect(_template_render_started, app)
+    template_rendered.connect(_template_render_finished, app)
+
+    app.register_blueprint(bp)
+    return app
+
+
+# `gunicorn backend.app:app` keeps working; `backend.app:create_app()` too
+app = create_app()
+
 # =====================================================
 # RUN
 # =====================================================
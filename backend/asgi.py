@@ -0,0 +1,18 @@
+"""
+ASGI entry point: JSON lookups on the async tier, everything else on Flask.
+
+    hypercorn backend.asgi:app --bind 0.0.0.0:$PORT
+"""
+from hypercorn.middleware import AsyncioWSGIMiddleware
+
+from backend.app import app as flask_app
+from backend.async_api import ASYNC_PATH_PREFIXES, app as async_app
+
+_flask = AsyncioWSGIMiddleware(flask_app)
+
+
+async def app(scope, receive, send):
+    # lifespan goes to Quart so the async pool opens and closes with the server
+    if scope["type"] == "lifespan" or scope.get("path", "").startswith(ASYNC_PATH_PREFIXES):
+        return await async_app(scope, receive, send)
+    return await _flask(scope, receive, send)
@@ -0,0 +1,184 @@
+"""
+Fingerprinted, precompressed static assets.
+
+    python -m backend.assets build      # in the deploy's build step, or after editing frontend/static
+
+Every .js/.css in frontend/static is copied to frontend/static/dist/ as
+<name>.<content hash>.<ext>, next to a .gz and a .br variant (Brotli when
+the package is installed), and dist/manifest.json maps the plain name to
+the hashed one. The build prints raw vs compressed bytes per file.
+
+Templates call asset_url("pos.js"). With a manifest that is
+/assets/pos.<hash>.js, served with the best encoding the browser accepts
+and `Cache-Control: immutable` - a new build means a new name, so a
+cached copy never needs revalidating. Without a manifest (fresh checkout,
+local dev) it falls back to the plain /static/ file.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import abort, request, send_file, url_for
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STATIC_DIR = os.path.join(BASE_DIR, "frontend", "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+ASSET_EXTENSIONS = (".js", ".css")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# (Accept-Encoding token, file suffix), best first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+HASH_LENGTH = 10
+# what build() writes: <stem>.<hash>.<ext>
+_HASHED_RE = re.compile(rf"^[\w.-]+\.[0-9a-f]{{{HASH_LENGTH}}}\.(?:js|css)$")
+
+_manifest = None
+
+# =====================================================
+# MANIFEST / TEMPLATES
+# =====================================================
+def load_manifest():
+    """{plain name: hashed name}; {} when no build has been run."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH, encoding="utf-8") as fh:
+                _manifest = json.load(fh)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(filename):
+    """Jinja global: hashed /assets/ URL when built, plain /static/ URL otherwise."""
+    hashed = load_manifest().get(filename)
+    if hashed:
+        return url_for("pos.asset", filename=hashed)
+    return url_for("static", filename=filename)
+
+# =====================================================
+# SERVING
+# =====================================================
+def send_asset(filename):
+    """
+    Serve a hashed asset, precompressed when the client accepts it. Any
+    hashed file still in dist/ is served, not only the current manifest's:
+    pages rendered before a deploy point at the previous build.
+    """
+    path = os.path.join(DIST_DIR, filename)
+    if not _HASHED_RE.match(filename) or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    encoding = None
+    for token, suffix in ENCODINGS:
+        if request.accept_encodings[token] and os.path.exists(path + suffix):
+            encoding, path = token, path + suffix
+            break
+
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return response
+
+# =====================================================
+# BUILD
+# =====================================================
+def _write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR, log=print):
+    """Hash and precompress every asset; returns [(name, raw, gzip, br or None)]."""
+    global _manifest
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest_path = os.path.join(dist_dir, "manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as fh:
+            previous = json.load(fh)
+    except (OSError, ValueError):
+        previous = {}
+
+    brotli = _brotli()
+    if brotli is None:
+        log("Brotli not installed - writing gzip variants only (pip install Brotli)")
+
+    manifest, rows = {}, []
+    for name in sorted(os.listdir(static_dir)):
+        source = os.path.join(static_dir, name)
+        stem, ext = os.path.splitext(name)
+        if ext not in ASSET_EXTENSIONS or not os.path.isfile(source):
+            continue
+        with open(source, "rb") as fh:
+            data = fh.read()
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        target = os.path.join(dist_dir, hashed)
+
+        _write(target, data)
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        _write(target + ".gz", gz)
+        br = None
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            _write(target + ".br", br)
+
+        manifest[name] = hashed
+        rows.append((name, len(data), len(gz), len(br) if br is not None else None))
+
+    _write(manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # keep the previous build too: pages rendered before a deploy still point at it
+    keep = set(manifest.values()) | set(previous.values())
+    for name in os.listdir(dist_dir):
+        base = name[:-3] if name.endswith((".gz", ".br")) else name
+        if name != "manifest.json" and base not in keep:
+            os.remove(os.path.join(dist_dir, name))
+
+    if dist_dir == DIST_DIR:
+        _manifest = manifest
+    return rows
+
+
+def report(rows, log=print):
+    """Bytes on the wire per asset: uncompressed before, best variant after."""
+    log(f"{'asset':<22} {'raw':>9} {'gzip':>9} {'brotli':>9}")
+    for name, raw, gz, br in rows:
+        log(f"{name:<22} {raw:>9} {gz:>9} {br if br is not None else '-':>9}")
+    raw_total = sum(r[1] for r in rows)
+    best_total = sum(r[3] if r[3] is not None else r[2] for r in rows)
+    if raw_total:
+        log(f"First visit: {raw_total} -> {best_total} bytes ({100 - 100 * best_total / raw_total:.0f}% less); "
+            f"repeat visits: 0 bytes (immutable, served from cache)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        rows = build()
+        report(rows)
+        print(f"Manifest: {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
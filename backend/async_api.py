@@ -0,0 +1,283 @@
+"""
+Async serving tier for the JSON lookup/return APIs.
+
+/api/invoice/<invoice_no> and /get-sizes/<design_id> are pure waits on a
+remote database, so here they run as coroutines on an async connection
+pool: one process keeps hundreds of lookups in flight instead of holding a
+sync gunicorn worker per request. psycopg 3 would prepare statements it
+sees repeatedly on each pooled connection by itself; that is switched off
+(prepare_threshold=None) unless DB_PREPARED_STATEMENTS=1, the same opt-in
+as backend/statements.py, because server-side prepared statements break
+behind a transaction-mode pooler (PgBouncer, Neon's -pooler endpoint).
+/api/returns and /api/exchanges reuse the
+exact rules in backend/returns.py on a small thread pool, so there is one
+implementation of the stock and refund logic.
+
+Served together with the Flask app by backend/asgi.py:
+
+    hypercorn backend.asgi:app --bind 0.0.0.0:$PORT
+
+Sessions are the same signed cookie as Flask (same SECRET_KEY), so a
+login on either tier is valid on both.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from quart import Quart, g, jsonify, redirect, request, session
+
+from backend import admission, http_cache, metrics, partitions, stalls, statements, tracing
+from backend.app import READ_YOUR_WRITES_SECONDS, SECRET_KEY
+from backend.db import statement_label
+from backend.returns import handle_exchange, handle_return, shape_returnable_items
+from backend.statements import INVOICE_SUMMARY_SQL, RETURNABLE_ITEMS_SQL
+
+ASYNC_POOL_MIN = int(os.environ.get("ASYNC_POOL_MIN", "2"))
+ASYNC_POOL_MAX = int(os.environ.get("ASYNC_POOL_MAX", "20"))
+WRITE_THREADS = int(os.environ.get("ASYNC_WRITE_THREADS", "8"))
+
+# paths backend/asgi.py routes here instead of to Flask
+ASYNC_PATH_PREFIXES = ("/api/invoice/", "/get-sizes/", "/api/returns", "/api/exchanges")
+
+app = Quart(__name__)
+app.secret_key = SECRET_KEY
+
+_pool = None
+_replica_pool = None
+_write_executor = ThreadPoolExecutor(max_workers=WRITE_THREADS, thread_name_prefix="async-write")
+
+
+# =====================================================
+# POOL LIFECYCLE
+# =====================================================
+def _make_pool(conninfo, **extra):
+    return AsyncConnectionPool(
+        conninfo,
+        min_size=ASYNC_POOL_MIN,
+        max_size=ASYNC_POOL_MAX,
+        kwargs={
+            "row_factory": dict_row,
+            "sslmode": os.environ.get("DATABASE_SSLMODE", "require"),
+            "autocommit": True,
+            # None: never prepare server-side; psycopg's default (5) only with the opt-in
+            **({} if statements.PREPARED_STATEMENTS else {"prepare_threshold": None}),
+            **extra,
+        },
+        open=False,
+    )
+
+
+@app.before_serving
+async def open_pool():
+    global _pool, _replica_pool
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL environment variable is not set")
+    _pool = _make_pool(database_url)
+    await _pool.open()
+
+    replica_url = os.environ.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        _replica_pool = _make_pool(replica_url, options="-c default_transaction_read_only=on")
+        await _replica_pool.open(wait=False)
+
+
+@app.after_serving
+async def close_pool():
+    for pool in (_pool, _replica_pool):
+        if pool is not None:
+            await pool.close()
+    _write_executor.shutdown(wait=False)
+
+
+async def _fetch_from(pool, query, params, one):
+    acquire_start = time.perf_counter()
+    async with pool.connection() as conn:
+        metrics.observe_stage("db_acquire", acquire_start, time.perf_counter() - acquire_start)
+        start = time.perf_counter()
+        cursor = await conn.execute(query, params)
+        rows = await (cursor.fetchone() if one else cursor.fetchall())
+        duration = time.perf_counter() - start
+        label = statement_label(query)
+        metrics.SQL_LATENCY.observe(duration, statement=label)
+        tracing.record_span("sql", start, duration, statement=label)
+        return rows
+
+
+async def run_sync(fn, *args):
+    """Run sync code on the write thread pool, carrying the request's trace along."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _write_executor, contextvars.copy_context().run, fn, *args
+    )
+
+
+async def fetch(query, params, one=False, primary=False):
+    """
+    Run one read-only statement on a pooled connection, timed like TimedCursor.
+
+    Goes to the replica pool when there is one, unless primary=True or this
+    session wrote within READ_YOUR_WRITES_SECONDS (same rule as the Flask tier).
+    """
+    recent_write = time.time() - session.get("last_write_at", 0) < READ_YOUR_WRITES_SECONDS
+    if _replica_pool is not None and not primary and not recent_write:
+        try:
+            rows = await _fetch_from(_replica_pool, query, params, one)
+            metrics.DB_READS.inc(target="replica")
+            return rows
+        except (PoolTimeout, psycopg.OperationalError):
+            metrics.DB_READS.inc(target="replica_unavailable")
+    metrics.DB_READS.inc(target="primary")
+    return await _fetch_from(_pool, query, params, one)
+
+
+# =====================================================
+# METRICS / TRACING / AUTH
+# =====================================================
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+    tracing.start_trace(request.method, request.url_rule.rule if request.url_rule else "unmatched")
+
+
+@app.before_request
+async def admit_request():
+    cls = admission.route_class(request.endpoint)
+    if cls is None:
+        return None
+    try:
+        g.admission_token = await admission.CONTROLLER.acquire_async(cls)
+    except admission.Shed as shed:
+        response = jsonify(admission.busy_body(shed))
+        response.status_code = 503
+        response.headers["Retry-After"] = admission.retry_after_header(shed)
+        return response
+    return None
+
+
+@app.teardown_request
+async def release_admission(exc=None):
+    token = g.pop("admission_token", None)
+    if token is not None:
+        admission.CONTROLLER.release(token)
+
+
+@app.after_request
+async def record_request_metrics(response):
+    tracing.finish_trace(response.status_code)
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            route=route,
+            method=request.method,
+            status=str(response.status_code)
+        )
+        if response.status_code >= 500:
+            metrics.ERRORS.inc(route=route)
+    return response
+
+
+@app.after_request
+async def conditional_json(response):
+    """Same as backend.app.conditional_json; registered last so it runs first."""
+    if (request.endpoint not in http_cache.CONDITIONAL_ENDPOINTS
+            or response.status_code != 200 or response.mimetype != "application/json"):
+        return response
+    status, body, headers = http_cache.finalize(
+        await response.get_data(),
+        request.headers,
+        bool(request.accept_encodings["gzip"]),
+        g.pop("etag_version", None)
+    )
+    response.set_data(body)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+def login_required(f):
+    """Same contract as backend.app.login_required: no staff_id -> /login."""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if 'staff_id' not in session:
+            return redirect("/login")
+        return await f(*args, **kwargs)
+    return decorated_function
+
+
+# =====================================================
+# LOOKUPS (native async)
+# =====================================================
+@app.route("/get-sizes/<int:design_id>")
+@login_required
+async def get_sizes(design_id):
+    sizes = await fetch("""
+        SELECT size, stock FROM stock_levels
+        WHERE stall_id=%s AND design_id=%s
+    """, (session.get("stall_id") or stalls.DEFAULT_STALL_ID, design_id))
+    return jsonify(sizes)
+
+
+@app.route("/api/invoice/<invoice_no>")
+@login_required
+async def api_get_invoice(invoice_no):
+    invoice_no = invoice_no.strip()
+    if request.headers.get("If-None-Match"):
+        # revalidation: the summary row carries the version, items only on a miss
+        sale = await fetch(INVOICE_SUMMARY_SQL, (invoice_no,), one=True)
+        if sale and http_cache.is_fresh(request.headers, sale["row_version"]):
+            return http_cache.not_modified(sale["row_version"])
+        rows = await fetch(RETURNABLE_ITEMS_SQL, (invoice_no, invoice_no)) if sale else []
+    else:
+        sale, rows = await asyncio.gather(
+            fetch(INVOICE_SUMMARY_SQL, (invoice_no,), one=True),
+            fetch(RETURNABLE_ITEMS_SQL, (invoice_no, invoice_no)),
+        )
+    if not sale and _replica_pool is not None:
+        # replica may lag a sale made from another session - ask the primary
+        sale, rows = await asyncio.gather(
+            fetch(INVOICE_SUMMARY_SQL, (invoice_no,), one=True, primary=True),
+            fetch(RETURNABLE_ITEMS_SQL, (invoice_no, invoice_no), primary=True),
+        )
+    if not sale:
+        # archived invoices are rare; read the archive files off the event loop
+        archived = await run_sync(partitions.lookup_archived, invoice_no)
+        if archived:
+            return jsonify(archived)
+        return jsonify({"error": "Invoice not found"}), 404
+
+    g.etag_version = sale.pop("row_version")
+    return jsonify({
+        "sale": sale,
+        "items": list(shape_returnable_items(rows).values())
+    })
+
+
+# =====================================================
+# RETURNS / EXCHANGES (shared sync rules, off the event loop)
+# =====================================================
+@app.route("/api/returns", methods=["POST"])
+@login_required
+async def api_process_return():
+    payload = await request.get_json(force=True) or {}
+    body, status = await run_sync(handle_return, payload, session.get("staff_id"), session.get("stall_id"))
+    if status == 200:
+        session["last_write_at"] = time.time()
+    return jsonify(body), status
+
+
+@app.route("/api/exchanges", methods=["POST"])
+@login_required
+async def api_process_exchange():
+    payload = await request.get_json(force=True) or {}
+    body, status = await run_sync(handle_exchange, payload, session.get("staff_id"), session.get("stall_id"))
+    if status == 200:
+        session["last_write_at"] = time.time()
+    return jsonify(body), status
@@ -0,0 +1,280 @@
+"""
+Invoice integrity audit.
+
+Scans sales in id-ordered chunks on a small thread pool. Every chunk is
+three set-based queries, whatever its size:
+
+    no_items           sale with no sale_items rows
+    totals_mismatch    stored subtotal / GST / total differ from the line
+                       items priced with backend/pricing.py (GST slab rules)
+    over_returned      more units returned for an invoice line than were sold
+    orphan_exchange    exchange_details ref with no EXCHANGE rows in returns
+    missing_pdf        pdf_file not set, or not in generated_bills/
+
+    python -m backend.audit_invoices                              # everything
+    python -m backend.audit_invoices --from INV-00100 --to INV-00200
+    python -m backend.audit_invoices --since 2026-09-01 --until 2026-09-30
+    python -m backend.audit_invoices --workers 8 --out findings.jsonl
+
+Prints a summary and writes one JSON finding per line to --out (default
+logs/audit-<timestamp>.jsonl). Exits 1 when anything was found. Reads go
+to the replica when DATABASE_REPLICA_URL is set. Archived months
+(backend/partitions.py) are no longer in sales and are not audited.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from backend import pricing, stalls
+from backend.db import get_connection
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+GENERATED_BILLS_DIR = os.path.join(BASE_DIR, "generated_bills")
+CHECKS = ("no_items", "totals_mismatch", "over_returned", "orphan_exchange", "missing_pdf")
+# stored amounts are NUMERIC(12,2); allow for rounding of each one
+TOLERANCE = 0.011
+
+# invoice number -> integer, so INV-99999 < INV-100000
+_INVOICE_NUMBER_SQL = r"NULLIF(regexp_replace(s.invoice_no, '\D', '', 'g'), '')::bigint"
+
+# =====================================================
+# QUERIES (one chunk of sales ids each)
+# =====================================================
+CHUNK_SQL = """
+    WITH chunk AS (
+        SELECT s.invoice_no, s.discount_percent, s.subtotal, s.discount_amount,
+               s.gst_amount, s.total_amount, s.pdf_file, s.stall_location
+        FROM sales s
+        WHERE s.id BETWEEN %(lo)s AND %(hi)s {filters}
+    )
+    SELECT c.*, i.line_count, i.line_total, sa.gst_percent AS stall_gst_percent
+    FROM chunk c
+    LEFT JOIN stalls sa ON sa.name = c.stall_location
+    LEFT JOIN (
+        SELECT invoice_no, COUNT(*) AS line_count, SUM(price * quantity) AS line_total
+        FROM sale_items
+        WHERE invoice_no IN (SELECT invoice_no FROM chunk)
+        GROUP BY invoice_no
+    ) i ON i.invoice_no = c.invoice_no
+"""
+
+OVER_RETURNED_SQL = """
+    WITH chunk AS (
+        SELECT s.invoice_no FROM sales s
+        WHERE s.id BETWEEN %(lo)s AND %(hi)s {filters}
+    ),
+    sold AS (
+        SELECT invoice_no, design_id, size, SUM(quantity) AS qty
+        FROM sale_items
+        WHERE invoice_no IN (SELECT invoice_no FROM chunk)
+        GROUP BY invoice_no, design_id, size
+    ),
+    returned AS (
+        SELECT invoice_no, design_id, size, SUM(quantity) AS qty
+        FROM returns
+        WHERE invoice_no IN (SELECT invoice_no FROM chunk)
+        GROUP BY invoice_no, design_id, size
+    )
+    SELECT r.invoice_no, r.design_id, r.size, r.qty AS returned, COALESCE(s.qty, 0) AS sold
+    FROM returned r
+    LEFT JOIN sold s USING (invoice_no, design_id, size)
+    WHERE r.qty > COALESCE(s.qty, 0)
+"""
+
+ORPHAN_EXCHANGE_SQL = """
+    WITH chunk AS (
+        SELECT s.invoice_no FROM sales s
+        WHERE s.id BETWEEN %(lo)s AND %(hi)s {filters}
+    )
+    SELECT e.invoice_no, e.exchange_ref, COUNT(*) AS lines
+    FROM exchange_details e
+    WHERE e.invoice_no IN (SELECT invoice_no FROM chunk)
+      AND NOT EXISTS (
+          SELECT 1 FROM returns r
+          WHERE r.return_ref = e.exchange_ref AND r.return_type = 'EXCHANGE'
+      )
+    GROUP BY e.invoice_no, e.exchange_ref
+"""
+
+
+def invoice_number(value):
+    """'INV-00042' or '42' -> 42."""
+    digits = re.sub(r"\D", "", str(value))
+    if not digits:
+        raise argparse.ArgumentTypeError(f"not an invoice number: {value!r}")
+    return int(digits)
+
+
+def build_filters(args):
+    """Extra WHERE clauses (on sales s) and their params from the CLI range options."""
+    clauses, params = [], {}
+    if args.from_invoice is not None:
+        clauses.append(f"{_INVOICE_NUMBER_SQL} >= %(from_invoice)s")
+        params["from_invoice"] = args.from_invoice
+    if args.to_invoice is not None:
+        clauses.append(f"{_INVOICE_NUMBER_SQL} <= %(to_invoice)s")
+        params["to_invoice"] = args.to_invoice
+    if args.since:
+        clauses.append("s.bill_date >= %(since)s")
+        params["since"] = args.since
+    if args.until:
+        clauses.append("s.bill_date <= %(until)s")
+        params["until"] = args.until
+    return "".join(f" AND {c}" for c in clauses), params
+
+# =====================================================
+# CHECKS
+# =====================================================
+def check_totals(row, default_gst_percent):
+    """Differences between the stored amounts and the line items re-priced, or None."""
+    if row.get("stall_gst_percent") is not None:
+        default_gst_percent = float(row["stall_gst_percent"])
+    expected = pricing.price_cart(
+        [{"price": float(row["line_total"]), "quantity": 1}],
+        float(row["discount_percent"] or 0),
+        default_gst_percent,
+    )
+    stored = {
+        "base_price_total": row["subtotal"],
+        "discount_amount": row["discount_amount"],
+        "gst_amount": row["gst_amount"],
+        "grand_total": row["total_amount"],
+    }
+    diffs = {
+        key: {"stored": float(value or 0), "expected": round(expected[key], 2)}
+        for key, value in stored.items()
+        if abs(float(value or 0) - expected[key]) > TOLERANCE
+    }
+    if diffs:
+        diffs["gst_percent"] = expected["gst_percent"]
+    return diffs or None
+
+
+def audit_chunk(lo, hi, filters, params, default_gst_percent, pdf_files):
+    """Run every check for sales ids lo..hi. Returns (invoices scanned, findings)."""
+    params = dict(params, lo=lo, hi=hi)
+    findings = []
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CHUNK_SQL.format(filters=filters), params)
+        sales = cursor.fetchall()
+        for row in sales:
+            invoice_no = row["invoice_no"]
+            if not row["line_count"]:
+                findings.append({"check": "no_items", "invoice_no": invoice_no})
+            else:
+                diffs = check_totals(row, default_gst_percent)
+                if diffs:
+                    findings.append({"check": "totals_mismatch", "invoice_no": invoice_no, "diffs": diffs})
+            if not row["pdf_file"] or row["pdf_file"] not in pdf_files:
+                findings.append({"check": "missing_pdf", "invoice_no": invoice_no, "pdf_file": row["pdf_file"]})
+
+        cursor.execute(OVER_RETURNED_SQL.format(filters=filters), params)
+        for row in cursor.fetchall():
+            findings.append({
+                "check": "over_returned",
+                "invoice_no": row["invoice_no"],
+                "design_id": row["design_id"],
+                "size": row["size"],
+                "returned": row["returned"],
+                "sold": row["sold"],
+            })
+
+        cursor.execute(ORPHAN_EXCHANGE_SQL.format(filters=filters), params)
+        for row in cursor.fetchall():
+            findings.append({
+                "check": "orphan_exchange",
+                "invoice_no": row["invoice_no"],
+                "exchange_ref": row["exchange_ref"],
+                "lines": row["lines"],
+            })
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return len(sales), findings
+
+
+def run_audit(filters, params, workers=4, chunk_size=5000, default_gst_percent=None, out=None):
+    """Audit every sale matching filters; findings go to the open file `out`. Returns (scanned, counts)."""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT MIN(s.id) AS lo, MAX(s.id) AS hi FROM sales s WHERE TRUE {filters}", params)
+        bounds = cursor.fetchone()
+        if default_gst_percent is None:
+            cursor.execute("SELECT gst_percent FROM stalls WHERE stall_id=%s", (stalls.DEFAULT_STALL_ID,))
+            default_gst_percent = float(cursor.fetchone()["gst_percent"])
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+    counts = dict.fromkeys(CHECKS, 0)
+    if bounds["lo"] is None:
+        return 0, counts
+
+    # one directory listing instead of a stat() per invoice
+    pdf_files = set(os.listdir(GENERATED_BILLS_DIR)) if os.path.isdir(GENERATED_BILLS_DIR) else set()
+    chunks = [(lo, min(lo + chunk_size - 1, bounds["hi"])) for lo in range(bounds["lo"], bounds["hi"] + 1, chunk_size)]
+    scanned = 0
+
+    def work(chunk):
+        return audit_chunk(chunk[0], chunk[1], filters, params, default_gst_percent, pdf_files)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audit") as pool:
+        for n, findings in pool.map(work, chunks):
+            scanned += n
+            for finding in findings:
+                counts[finding["check"]] += 1
+                if out is not None:
+                    out.write(json.dumps(finding, default=str) + "\n")
+    return scanned, counts
+
+# =====================================================
+# CLI
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="from_invoice", type=invoice_number, help="first invoice, e.g. INV-00100")
+    parser.add_argument("--to", dest="to_invoice", type=invoice_number, help="last invoice")
+    parser.add_argument("--since", type=date.fromisoformat, help="first bill date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last bill date")
+    parser.add_argument("--workers", type=int, default=4, help="parallel chunks (one DB connection each)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="sales ids per chunk")
+    parser.add_argument("--gst", type=float, help="GST percent for sales whose stall is gone (default: the first stall's)")
+    parser.add_argument("--out", help="findings file (JSON lines)")
+    args = parser.parse_args()
+
+    out_path = args.out or os.path.join(BASE_DIR, "logs", f"audit-{datetime.now():%Y%m%dT%H%M%S}.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    filters, params = build_filters(args)
+
+    start = time.perf_counter()
+    with open(out_path, "w", encoding="utf-8") as out:
+        scanned, counts = run_audit(
+            filters, params,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            default_gst_percent=args.gst,
+            out=out,
+        )
+    elapsed = time.perf_counter() - start
+
+    print(f"Audited {scanned} invoices in {elapsed:.2f}s ({scanned / elapsed if elapsed else 0:.0f}/s)")
+    for check in CHECKS:
+        print(f"  {check:<16} {counts[check]}")
+    total = sum(counts.values())
+    print(f"{total} findings -> {out_path}")
+    if total:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
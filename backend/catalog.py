@@ -0,0 +1,204 @@
+"""
+In-memory catalog index for the POS design picker.
+
+Each process keeps the whole designs table in memory (a few hundred bytes
+per design, so thousands of designs are nothing) with:
+
+    code prefix   sorted design codes, bisect -> "SD01" finds SD0100..SD0199
+    tokens        sorted words of product_name / color, prefix match
+    trigrams      trigram -> design ids, so "hodie" still finds "Hoodie"
+    facets        gender -> design ids ("Unknown" when NULL)
+
+search() ranks candidates (exact code > code prefix > word > word prefix >
+fuzzy), pages them and counts gender facets over the full match.
+
+The index is rebuilt from one SELECT when it is older than
+CATALOG_TTL_SECONDS, or straight away after invalidate(); requests keep
+using the old index while the new one is built.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+
+from backend.db import get_connection
+
+CATALOG_TTL_SECONDS = float(os.environ.get("CATALOG_TTL_SECONDS", "300"))
+MAX_PAGE_SIZE = 100
+FUZZY_MIN_SIMILARITY = 0.4
+UNKNOWN_GENDER = "Unknown"  # facet for designs with no gender (the column is nullable)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+CATALOG_SQL = """
+    SELECT design_id, design_code, product_name, gender, color, price
+    FROM designs
+"""
+
+
+def _words(text):
+    return _WORD_RE.findall((text or "").lower())
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# =====================================================
+# INDEX
+# =====================================================
+class CatalogIndex:
+    def __init__(self, rows):
+        self.designs = {}
+        self._codes = []          # sorted (lower code, design_id)
+        self._tokens = []         # sorted (token, design_id)
+        self._grams = {}          # trigram -> {design_id}
+        self.facets = {}          # gender -> {design_id}
+
+        for row in rows:
+            design_id = row["design_id"]
+            self.designs[design_id] = {
+                "design_id": design_id,
+                "design_code": row["design_code"],
+                "product_name": row["product_name"],
+                "gender": row["gender"],
+                "color": row["color"],
+                "price": float(row["price"]),
+            }
+            self._codes.append(((row["design_code"] or "").lower(), design_id))
+            tokens = set(_words(row["product_name"])) | set(_words(row["color"]))
+            grams = set()
+            for token in tokens:
+                grams |= _trigrams(token)
+                self._tokens.append((token, design_id))
+            for gram in grams:
+                self._grams.setdefault(gram, set()).add(design_id)
+            self.facets.setdefault(row["gender"] or UNKNOWN_GENDER, set()).add(design_id)
+
+        self._codes.sort()
+        self._tokens.sort()
+        self._by_code = [design_id for _, design_id in self._codes]
+        self._code_of = {design_id: code for code, design_id in self._codes}
+
+    def __len__(self):
+        return len(self.designs)
+
+    @staticmethod
+    def _prefix(sorted_pairs, prefix):
+        start = bisect.bisect_left(sorted_pairs, (prefix,))
+        end = bisect.bisect_left(sorted_pairs, (prefix + "\uffff",))
+        return sorted_pairs[start:end]
+
+    def _term_scores(self, term):
+        """design_id -> best score of one query term."""
+        scores = {}
+
+        def offer(design_id, score):
+            if score > scores.get(design_id, 0):
+                scores[design_id] = score
+
+        for code, design_id in self._prefix(self._codes, term):
+            offer(design_id, 100 if code == term else 60)
+        for token, design_id in self._prefix(self._tokens, term):
+            offer(design_id, 30 if token == term else 20)
+
+        if len(term) >= 3:
+            grams = _trigrams(term)
+            shared = {}
+            for gram in grams:
+                for design_id in self._grams.get(gram, ()):
+                    shared[design_id] = shared.get(design_id, 0) + 1
+            for design_id, count in shared.items():
+                similarity = count / len(grams)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    offer(design_id, 10 * similarity)
+        return scores
+
+    def search(self, query="", gender=None, offset=0, limit=20):
+        """Ranked page of designs matching every word of query; facets over all matches."""
+        terms = _words(query)
+        if terms:
+            ranked = None
+            for term in terms:
+                scores = self._term_scores(term)
+                if ranked is None:
+                    ranked = scores
+                else:
+                    ranked = {d: ranked[d] + s for d, s in scores.items() if d in ranked}
+                if not ranked:
+                    break
+            ranked = ranked or {}
+            matches = sorted(ranked, key=lambda d: (-ranked[d], self._code_of[d]))
+        else:
+            matches = self._by_code
+
+        facets = {
+            value: sum(1 for d in matches if d in ids) if terms else len(ids)
+            for value, ids in self.facets.items()
+        }
+        if gender:
+            ids = self.facets.get(gender, set())
+            matches = [d for d in matches if d in ids]
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        page = matches[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(matches) else None
+        return {
+            "results": [self.designs[d] for d in page],
+            "total": len(matches),
+            "next_offset": next_offset,
+            "facets": {"gender": facets},
+        }
+
+# =====================================================
+# PER-PROCESS INSTANCE
+# =====================================================
+_index = None
+_built_at = 0.0
+_stale = False
+_build_lock = threading.Lock()
+
+
+def load():
+    """Build a fresh index from the designs table."""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CATALOG_SQL)
+        return CatalogIndex(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def invalidate():
+    """Rebuild on the next get_index() (designs were added or edited)."""
+    global _stale
+    _stale = True
+
+
+def get_index():
+    """The process's index; rebuilt when stale. Only one thread rebuilds, the rest keep the old one."""
+    global _index, _built_at, _stale
+    fresh = not _stale and time.monotonic() - _built_at < CATALOG_TTL_SECONDS
+    if _index is not None and fresh:
+        return _index
+    if not _build_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _index is None or _stale or time.monotonic() - _built_at >= CATALOG_TTL_SECONDS:
+            _stale = False
+            try:
+                _index = load()
+            except Exception:
+                if _index is None:
+                    raise
+                # keep serving the old catalog; try again after another TTL
+                logging.getLogger(__name__).exception("catalog rebuild failed")
+            _built_at = time.monotonic()
+    finally:
+        _build_lock.release()
+    return _index
@@ -1,20 +1,196 @@
 import os
+import re
+import threading
+import time
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 
+from backend import metrics, slow_queries, tracing
 
-def get_connection():
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+
+_EXECUTE_RE = re.compile(r"^\s*EXECUTE\s+(?P<name>\w+)", re.IGNORECASE)
+_VERB_TABLE_RE = re.compile(
+    r"^\s*(?P<verb>\w+).*?\b(?:FROM|INTO|UPDATE)\s+(?P<table>[\w.]+)",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def statement_label(query) -> str:
+    """Short, low-cardinality name for a statement, e.g. 'UPDATE design_stock'."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    query = str(query)
+    match = _EXECUTE_RE.match(query)
+    if match:
+        return f"EXECUTE {match.group('name')}"
+    match = _VERB_TABLE_RE.match(query)
+    if match:
+        return f"{match.group('verb').upper()} {match.group('table').lower()}"
+    words = query.split()
+    return words[0].upper() if words else "EMPTY"
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that records every statement's latency (metric + trace span) and captures slow ones."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            duration = time.perf_counter() - start
+            label = statement_label(query)
+            metrics.SQL_LATENCY.observe(duration, statement=label)
+            tracing.record_span("sql", start, duration, statement=label)
+            slow_queries.record_if_slow(self, query, vars, duration)
+
+
+# =====================================================
+# CONNECTION POOL
+# =====================================================
+class PooledConnection(extensions.connection):
+    """
+    psycopg2 connection whose close() hands it back to its pool.
+
+    Callers keep the usual `conn.close()`; `prepared` tracks the server-side
+    prepared statements that live as long as the physical connection
+    (see backend/statements.py).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.prepared = set()
+
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        self.pool.put(self)
+
+    def disconnect(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Small LIFO pool of idle connections for one DSN, owned by one process."""
+
+    def __init__(self, connect, size):
+        self._connect = connect
+        self.size = size
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if not conn.closed:
+                    metrics.DB_POOL.inc(outcome="hit")
+                    return conn
+        metrics.DB_POOL.inc(outcome="miss")
+        conn = self._connect()
+        conn.pool = self
+        return conn
+
+    def put(self, conn):
+        if conn.closed or os.getpid() != self.pid:
+            conn.disconnect()
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            conn.disconnect()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.disconnect()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _connect(database_url, **options):
+    with metrics.timed("db_connect"):
+        return psycopg2.connect(
+            database_url,
+            connection_factory=PooledConnection,
+            cursor_factory=TimedCursor,
+            sslmode=os.environ.get("DATABASE_SSLMODE", "require"),
+            **options
+        )
+
+
+def _pooled_connect(database_url, **options):
+    """Connection from this process's pool for (url, options); DB_POOL_SIZE=0 disables pooling."""
+    if DB_POOL_SIZE <= 0:
+        return _connect(database_url, **options)
+    key = (database_url, tuple(sorted(options.items())))
+    pool = _pools.get(key)
+    if pool is None or pool.pid != os.getpid():
+        # first use in this process (or a forked worker inheriting the master's pool)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[key] = ConnectionPool(lambda: _connect(database_url, **options), DB_POOL_SIZE)
+    with metrics.timed("db_acquire"):
+        return pool.get()
+
+
+def get_connection(readonly=False):
     """
     Creates and returns a PostgreSQL database connection
     using DATABASE_URL from environment variables (Render / Neon).
+    DATABASE_SSLMODE overrides sslmode (e.g. "disable" for a local Postgres).
+
+    Connections come from a per-process pool (DB_POOL_SIZE idle
+    connections, default 4); close() returns them to it.
+
+    readonly=True routes to DATABASE_REPLICA_URL when it is set. The
+    session is read-only, and if the replica can't be reached we fall
+    back to the primary rather than failing the request.
     """
     database_url = os.environ.get("DATABASE_URL")
 
     if not database_url:
         raise RuntimeError("DATABASE_URL environment variable is not set")
 
-    return psycopg2.connect(
-        database_url,
-        cursor_factory=RealDictCursor,
-        sslmode="require"
-    )
+    replica_url = os.environ.get("DATABASE_REPLICA_URL")
+    if readonly and replica_url:
+        try:
+            conn = _pooled_connect(
+                replica_url,
+                options="-c default_transaction_read_only=on",
+                connect_timeout=int(os.environ.get("DATABASE_REPLICA_CONNECT_TIMEOUT", "3"))
+            )
+            metrics.DB_READS.inc(target="replica")
+            return conn
+        except psycopg2.OperationalError:
+            metrics.DB_READS.inc(target="replica_unavailable")
+
+    if readonly:
+        metrics.DB_READS.inc(target="primary")
+    return _pooled_connect(database_url)
+
+
+def get_listen_connection():
+    """
+    Dedicated autocommit connection to the primary for LISTEN (standbys
+    can't LISTEN). Not pooled: it stays open for the life of the listener.
+    """
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL environment variable is not set")
+    conn = _connect(database_url)
+    conn.autocommit = True
+    return conn
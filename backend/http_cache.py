@@ -0,0 +1,87 @@
+"""
+Conditional, compressed JSON for the lookup APIs.
+
+/api/invoice/<invoice_no> and /get-sizes/<design_id> are fetched several
+times in one return-then-exchange flow. Both tiers (backend/app.py and
+backend/async_api.py) run their responses through finalize():
+
+- ETag: from the row version the view put in g.etag_version (see
+  INVOICE_SUMMARY_SQL), or the body digest when there is none. A view that
+  knows its version early answers a matching If-None-Match with
+  not_modified() before running the rest of its queries.
+- If-None-Match -> 304 with no body.
+- gzip above JSON_GZIP_MIN_BYTES when the client accepts it.
+- Cache-Control: private, max-age=JSON_MAX_AGE_SECONDS - short, so a
+  browser reuses the copy within one flow; pos.js revalidates (no-cache)
+  after its own writes.
+"""
+import gzip
+import hashlib
+import os
+import time
+
+from backend import metrics
+
+JSON_GZIP_MIN_BYTES = int(os.environ.get("JSON_GZIP_MIN_BYTES", "512"))
+JSON_MAX_AGE_SECONDS = int(os.environ.get("JSON_MAX_AGE_SECONDS", "10"))
+GZIP_LEVEL = 6
+
+# Flask ("pos."-prefixed) and Quart endpoint names
+CONDITIONAL_ENDPOINTS = frozenset({
+    "pos.get_sizes", "pos.api_get_invoice", "get_sizes", "api_get_invoice",
+})
+
+
+def make_etag(version):
+    # weak: the gzip and identity bodies share it
+    data = version if isinstance(version, bytes) else str(version).encode()
+    return 'W/"%s"' % hashlib.sha1(data).hexdigest()[:20]
+
+
+def etag_matches(if_none_match, etag):
+    """RFC 9110 weak comparison against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def _cache_headers(etag):
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={JSON_MAX_AGE_SECONDS}",
+        "Vary": "Accept-Encoding",
+    }
+
+
+def is_fresh(request_headers, version):
+    return etag_matches(request_headers.get("If-None-Match"), make_etag(version))
+
+
+def not_modified(version):
+    """A (body, status, headers) 304 for a view to return early."""
+    return "", 304, _cache_headers(make_etag(version))
+
+
+def finalize(body, request_headers, accepts_gzip, version=None):
+    """
+    Conditional + compressed version of a 200 JSON body.
+
+    Returns (status, body, headers); the caller copies them onto its
+    framework's response object.
+    """
+    etag = make_etag(version if version is not None else body)
+    headers = _cache_headers(etag)
+    if etag_matches(request_headers.get("If-None-Match"), etag):
+        return 304, b"", headers
+
+    if accepts_gzip and len(body) >= JSON_GZIP_MIN_BYTES:
+        start = time.perf_counter()
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        metrics.observe_stage("json_gzip", start, time.perf_counter() - start)
+        headers["Content-Encoding"] = "gzip"
+    return 200, body, headers
@@ -0,0 +1,341 @@
+"""
+Bulk download of invoice PDFs as one ZIP, streamed while it is built.
+
+    python -m backend.invoice_export --since 2026-09-01 --until 2026-09-30 --out sept.zip
+    python -m backend.invoice_export --stall "Phoenix Mall" --out - > phoenix.zip
+
+The same stream is served to admins at
+/admin/invoices/export.zip?since=YYYY-MM-DD&until=YYYY-MM-DD&stall=...
+
+Sales are read in id order a page at a time (the first page is small, so
+the first bytes go out straight away) and every PDF is written into the
+archive as soon as it is available; nothing but the current page and the
+in-flight renders is held in memory. A pdf_file that is missing from
+generated_bills/ is re-rendered from sales/sale_items on a process pool
+(EXPORT_RENDER_WORKERS) using the stored amounts, written back to
+generated_bills/ so /download works again, and added to the archive when
+it finishes - so the archive is not strictly in invoice order.
+
+manifest.csv, last in the archive, lists every invoice with where its PDF
+came from (stored / rerendered / failed).
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+from backend import pricing, stalls
+from backend.db import get_connection
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+GENERATED_BILLS_DIR = os.path.join(BASE_DIR, "generated_bills")
+RENDER_WORKERS = int(os.environ.get("EXPORT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+FIRST_PAGE_SIZE = 50
+PAGE_SIZE = 500
+MANIFEST_FIELDS = ("invoice_no", "bill_date", "stall_location", "customer_name", "total_amount", "pdf_file", "source")
+
+SALES_PAGE_SQL = """
+    SELECT s.id, s.invoice_no, s.bill_no, s.bill_date, s.customer_name, s.phone, s.payment_mode,
+           s.subtotal, s.discount_percent, s.discount_amount, s.gst_amount, s.total_amount,
+           s.pdf_file, s.stall_location, st.full_name AS staff_name, sa.gst_percent AS stall_gst_percent
+    FROM sales s
+    LEFT JOIN staff st ON st.staff_id = s.staff_id
+    LEFT JOIN stalls sa ON sa.name = s.stall_location
+    WHERE s.id > %(after)s {filters}
+    ORDER BY s.id
+    LIMIT %(limit)s
+"""
+
+SALE_ITEMS_SQL = """
+    SELECT si.invoice_no, si.size, si.quantity, si.price,
+           d.design_code, d.product_name, d.color, d.gender
+    FROM sale_items si
+    JOIN designs d ON d.design_id = si.design_id
+    WHERE si.invoice_no = ANY(%s)
+    ORDER BY si.id
+"""
+
+
+def build_filters(since=None, until=None, stall=None):
+    """Extra WHERE clauses (on sales s) and their params."""
+    clauses, params = [], {}
+    if since:
+        clauses.append("s.bill_date >= %(since)s")
+        params["since"] = since
+    if until:
+        clauses.append("s.bill_date <= %(until)s")
+        params["until"] = until
+    if stall:
+        clauses.append("s.stall_location = %(stall)s")
+        params["stall"] = stall
+    return "".join(f" AND {c}" for c in clauses), params
+
+# =====================================================
+# RE-RENDERING (process pool: ReportLab is CPU bound)
+# =====================================================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """One pool per process, started on the first missing PDF (spawn: safe from threaded workers)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _render(fields):
+    from backend.invoice_pdf import render_invoice_pdf
+    return render_invoice_pdf(**fields)
+
+
+def render_fields(sale, items, default_gst_percent):
+    """build_invoice_pdf fields for a stored sale: its line items, with the amounts as billed."""
+    cart = [
+        {
+            "design_text": f"{i['design_code']} | {i['product_name']} | {i['color']} | {i['gender']}",
+            "size": i["size"],
+            "quantity": i["quantity"],
+            "price": float(i["price"]),
+        }
+        for i in items
+    ]
+    if sale.get("stall_gst_percent") is not None:
+        default_gst_percent = float(sale["stall_gst_percent"])
+    totals = pricing.price_cart(cart, float(sale["discount_percent"] or 0), default_gst_percent)
+    # the bill as it was issued, not as today's pricing would compute it
+    for key, column in (("base_price_total", "subtotal"), ("discount_amount", "discount_amount"),
+                        ("gst_amount", "gst_amount"), ("grand_total", "total_amount")):
+        if sale[column] is not None:
+            totals[key] = float(sale[column])
+    totals["discounted_base_price"] = totals["base_price_total"] - totals["discount_amount"]
+    return {
+        "invoice_no": sale["invoice_no"],
+        "bill_no": sale["bill_no"] or "",
+        "bill_date": sale["bill_date"],
+        "staff_name": sale["staff_name"] or "Unknown",
+        "stall_location": sale["stall_location"] or "",
+        "payment_mode": sale["payment_mode"] or "",
+        "customer_name": sale["customer_name"] or "",
+        "phone": sale["phone"] or "",
+        "cart": cart,
+        **totals,
+    }
+
+
+def _restore(pdf_file, data):
+    """Put a re-rendered PDF back where /download/<filename> looks for it."""
+    path = os.path.join(GENERATED_BILLS_DIR, pdf_file)
+    os.makedirs(GENERATED_BILLS_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+# =====================================================
+# ZIP STREAM
+# =====================================================
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable: zipfile then emits data descriptors and never seeks back."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _pdf_path(sale):
+    # basename: pdf_file comes from the database, never let it leave generated_bills/
+    return os.path.join(GENERATED_BILLS_DIR, os.path.basename(sale["pdf_file"])) if sale["pdf_file"] else None
+
+
+def _fetch_page(after, limit, filters, params):
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SALES_PAGE_SQL.format(filters=filters), dict(params, after=after, limit=limit))
+        sales = cursor.fetchall()
+        missing = [s["invoice_no"] for s in sales if not os.path.isfile(_pdf_path(s) or "")]
+        items = {}
+        if missing:
+            cursor.execute(SALE_ITEMS_SQL, (missing,))
+            for row in cursor.fetchall():
+                items.setdefault(row["invoice_no"], []).append(row)
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return sales, missing, items
+
+
+def _first_id(filters, params):
+    """Where the id walk starts: MIN(id) via the filter's index, not a scan up from id 0."""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT MIN(s.id) AS lo FROM sales s WHERE TRUE {filters}", params)
+        lo = cursor.fetchone()["lo"]
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return lo
+
+
+def _default_gst_percent():
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT gst_percent FROM stalls WHERE stall_id=%s", (stalls.DEFAULT_STALL_ID,))
+        row = cursor.fetchone()
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return float(row["gst_percent"]) if row else 5.0
+
+
+def stream_zip(filters, params, workers=RENDER_WORKERS, stats=None):
+    """
+    Yield the archive as byte chunks. `stats` (a dict, optional) is filled in
+    as it goes: invoices, stored, rerendered, failed, bytes.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(invoices=0, stored=0, rerendered=0, failed=0, bytes=0)
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", allowZip64=True)
+    manifest_file = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode="w+", newline="", encoding="utf-8")
+    manifest = csv.writer(manifest_file)
+    manifest.writerow(MANIFEST_FIELDS)
+    pending = {}  # future -> sale
+    max_pending = max(1, workers) * 4
+    default_gst_percent = None
+
+    def add(sale, data, source):
+        name = f"{sale['bill_date']:%Y-%m-%d}/{sale['invoice_no']}.pdf"
+        info = zipfile.ZipInfo(name, date_time=(*sale["bill_date"].timetuple()[:3], 0, 0, 0))
+        info.compress_type = zipfile.ZIP_STORED  # PDFs are already deflated
+        if data is not None:
+            archive.writestr(info, data)
+        stats["invoices"] += 1
+        stats[source] += 1
+        manifest.writerow([sale["invoice_no"], sale["bill_date"], sale["stall_location"],
+                           sale["customer_name"], sale["total_amount"], sale["pdf_file"], source])
+        chunk = sink.drain()
+        stats["bytes"] += len(chunk)
+        return chunk
+
+    def finish(futures):
+        for future in futures:
+            sale = pending.pop(future)
+            try:
+                data = future.result()
+            except Exception:
+                yield add(sale, None, "failed")
+                continue
+            if sale["pdf_file"]:
+                _restore(os.path.basename(sale["pdf_file"]), data)
+            yield add(sale, data, "rerendered")
+
+    try:
+        lo = _first_id(filters, params)
+        after, limit = (lo - 1 if lo is not None else None), FIRST_PAGE_SIZE
+        while after is not None:
+            sales, missing, items = _fetch_page(after, limit, filters, params)
+            if not sales:
+                break
+            after, limit = sales[-1]["id"], PAGE_SIZE
+            missing = set(missing)
+            for sale in sales:
+                if sale["invoice_no"] not in missing:
+                    with open(_pdf_path(sale), "rb") as fh:
+                        yield add(sale, fh.read(), "stored")
+                elif not items.get(sale["invoice_no"]):
+                    yield add(sale, None, "failed")  # no line items to rebuild it from
+                else:
+                    if default_gst_percent is None:
+                        default_gst_percent = _default_gst_percent()
+                    fields = render_fields(sale, items[sale["invoice_no"]], default_gst_percent)
+                    pending[_get_executor(workers).submit(_render, fields)] = sale
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from finish(done)
+                # renders that finished meanwhile go out between stored files
+                yield from finish([f for f in list(pending) if f.done()])
+        yield from finish(list(pending))
+
+        manifest_file.seek(0)
+        info = zipfile.ZipInfo("manifest.csv", date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w") as entry:
+            for line in manifest_file:
+                entry.write(line.encode("utf-8"))
+        archive.close()
+        chunk = sink.drain()
+        stats["bytes"] += len(chunk)
+        yield chunk
+    finally:
+        for future in pending:
+            future.cancel()
+        manifest_file.close()
+
+# =====================================================
+# CLI
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, help="first bill date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last bill date")
+    parser.add_argument("--stall", help="stall_location, exactly as stored")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="processes re-rendering missing PDFs")
+    parser.add_argument("--out", required=True, help="ZIP file, or - for stdout")
+    args = parser.parse_args()
+
+    filters, params = build_filters(args.since, args.until, args.stall)
+    stats = {}
+    start = time.perf_counter()
+    first_byte = None
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        for chunk in stream_zip(filters, params, workers=args.workers, stats=stats):
+            if chunk and first_byte is None:
+                first_byte = time.perf_counter() - start
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{stats['invoices']} invoices ({stats['stored']} stored, {stats['rerendered']} re-rendered, "
+        f"{stats['failed']} failed), {stats['bytes'] / 1e6:.1f} MB in {elapsed:.2f}s; "
+        f"first byte after {(first_byte or 0) * 1000:.0f} ms",
+        file=sys.stderr
+    )
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
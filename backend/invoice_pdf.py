@@ -0,0 +1,386 @@
+"""
+ReportLab invoice rendering.
+
+Kept out of backend/app.py so ReportLab (a few hundred ms to import) is
+only loaded by the first checkout, not by /health, login or the JSON APIs.
+"""
+import io
+import os
+
+from backend import metrics
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, PageBreak
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.enums import TA_RIGHT, TA_CENTER, TA_LEFT
+from reportlab.lib import colors
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+# =====================================================
+# CUSTOM PAGE TEMPLATE WITH WATERMARK
+# =====================================================
+class InvoiceCanvas(canvas.Canvas):
+    """Custom canvas to add watermark and footer"""
+    def __init__(self, *args, **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self.pages = []
+
+    def showPage(self):
+        self.pages.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        page_count = len(self.pages)
+        for page_num, page in enumerate(self.pages, 1):
+            self.__dict__. update(page)
+            self.draw_watermark()
+            self.draw_footer(page_num, page_count)
+            canvas.Canvas.showPage(self)
+        canvas.Canvas.save(self)
+
+    def draw_watermark(self):
+        """Add subtle watermark"""
+        self.saveState()
+        self.setFont("Helvetica-Bold", 60)
+        self.setFillColor(colors.Color(0.9, 0.9, 0.9, alpha=0.3))
+        self.translate(A4[0]/2, A4[1]/2)
+        self.rotate(45)
+        self.drawCentredString(0, 0, "SLAYDRIP")
+        self.restoreState()
+
+    def draw_footer(self, page_num, page_count):
+        """Add professional footer"""
+        self.saveState()
+        self.setFont("Helvetica", 8)
+        self.setFillColor(colors.grey)
+        
+        # Footer line
+        self.setStrokeColor(colors.Color(0.8, 0.8, 0.8))
+        self.setLineWidth(0.5)
+        self.line(20*mm, 15*mm, A4[0]-20*mm, 15*mm)
+        
+        # Footer text
+        footer_text = "SLAYDRIP | Premium Fashion Wear | Contact(ig): salydrip.in| www.slaydrip.com"
+        self.drawCentredString(A4[0]/2, 11*mm, footer_text)
+        
+        # Page number
+        self.drawRightString(A4[0]-20*mm, 11*mm, f"Page {page_num} of {page_count}")
+        
+        self.restoreState()
+
+
+# =====================================================
+# INVOICE PDF
+# =====================================================
+def build_invoice_pdf(pdf_path, **fields):
+    """
+    Render the customer invoice to pdf_path (its directory is created if needed).
+
+    Rendering happens in memory and the file is written in one go, so the
+    disk write shows up as its own file_write stage next to pdf_build.
+    """
+    data = render_invoice_pdf(**fields)
+    with metrics.timed("file_write"):
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        with open(pdf_path, "wb") as fh:
+            fh.write(data)
+
+
+def render_invoice_pdf(*, invoice_no, bill_no, bill_date, staff_name, stall_location,
+                       payment_mode, customer_name, phone, cart,
+                       subtotal_inclusive, base_price_total, discount_percent, discount_amount,
+                       discounted_base_price, gst_percent, gst_amount, grand_total):
+    """The customer invoice as PDF bytes (see build_invoice_pdf for the fields)."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=20*mm,
+        rightMargin=20*mm,
+        topMargin=20*mm,
+        bottomMargin=25*mm
+    )
+
+    # =====================================================
+    # 🎨 CUSTOM STYLES
+    # =====================================================
+    styles = getSampleStyleSheet()
+    
+    # Brand Header Style
+    styles.add(ParagraphStyle(
+        name="BrandHeader",
+        fontSize=28,
+        fontName="Helvetica-Bold",
+        textColor=colors.Color(0.1, 0.1, 0.1),
+        spaceAfter=2,
+        leading=32
+    ))
+    
+    # Tagline Style
+    styles. add(ParagraphStyle(
+        name="Tagline",
+        fontSize=10,
+        fontName="Helvetica-Oblique",
+        textColor=colors.Color(0.4, 0.4, 0.4),
+        spaceAfter=12
+    ))
+    
+    # Invoice Title
+    styles.add(ParagraphStyle(
+        name="InvoiceTitle",
+        fontSize=20,
+        fontName="Helvetica-Bold",
+        textColor=colors.Color(0.2, 0.2, 0.2),
+        alignment=TA_RIGHT,
+        spaceAfter=6
+    ))
+    
+    # Meta Info
+    styles.add(ParagraphStyle(
+        name="MetaInfo",
+        fontSize=9,
+        fontName="Helvetica",
+        alignment=TA_RIGHT,
+        textColor=colors.Color(0.3, 0.3, 0.3),
+        leading=13
+    ))
+    
+    # Section Header
+    styles. add(ParagraphStyle(
+        name="SectionHeader",
+        fontSize=11,
+        fontName="Helvetica-Bold",
+        textColor=colors.Color(0.1, 0.1, 0.1),
+        spaceAfter=8,
+        spaceBefore=12,
+        borderWidth=0,
+        borderColor=colors.Color(0.2, 0.2, 0.2),
+        borderPadding=4,
+        backColor=colors.Color(0.95, 0.95, 0.95)
+    ))
+    
+    # Table Header
+    styles.add(ParagraphStyle(
+        name="TableHeader",
+        fontSize=9,
+        fontName="Helvetica-Bold",
+        textColor=colors.white,
+        alignment=TA_CENTER
+    ))
+    
+    # Footer Style
+    styles.add(ParagraphStyle(
+        name="FooterNote",
+        fontSize=9,
+        fontName="Helvetica-Oblique",
+        textColor=colors.grey,
+        alignment=TA_CENTER,
+        spaceAfter=6
+    ))
+
+    elements = []
+
+    # =====================================================
+    # 📋 HEADER SECTION
+    # =====================================================
+    header_data = [
+        [
+            Paragraph("<b>SLAYDRIP</b><br/><font size=10><i>Premium Fashion Wear</i></font>", styles["BrandHeader"]),
+            Paragraph(
+                f"<b><font size=14>INVOICE</font></b><br/>"
+                f"<b>Invoice No:</b> {invoice_no}<br/>"
+                f"<b>Date:</b> {bill_date.strftime('%d.%m.%Y')}<br/>"
+                f"<b>Bill No:</b> {bill_no}<br/>"
+                f"<b>Staff:</b> {staff_name}<br/>"
+                f"<b>Location:</b> {stall_location}<br/>"
+                f"<b>Payment Mode:</b> {payment_mode.upper()}",
+                styles["MetaInfo"]
+            )
+        ]
+    ]
+    
+    header_table = Table(header_data, colWidths=[100*mm, 70*mm])
+    header_table.setStyle(TableStyle([
+        ("VALIGN", (0,0), (-1,-1), "TOP"),
+        ("ALIGN", (0,0), (0,0), "LEFT"),
+        ("ALIGN", (1,0), (1,0), "RIGHT"),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 12),
+    ]))
+    
+    elements.append(header_table)
+    
+    # Decorative line
+    elements.append(Spacer(1, 4))
+    line_table = Table([["", ""]], colWidths=[170*mm])
+    line_table.setStyle(TableStyle([
+        ("LINEBELOW", (0,0), (-1,0), 2, colors.Color(0.2, 0.2, 0.2)),
+    ]))
+    elements.append(line_table)
+    elements.append(Spacer(1, 16))
+
+    # =====================================================
+    # 👤 CUSTOMER DETAILS
+    # =====================================================
+    elements. append(Paragraph("BILL TO", styles["SectionHeader"]))
+    
+    customer_data = [
+        ["Customer Name:", Paragraph(f"<b>{customer_name}</b>", styles["Normal"])],
+        ["Phone Number:", Paragraph(f"<b>{phone}</b>", styles["Normal"])]
+    ]
+    
+    customer_table = Table(customer_data, colWidths=[35*mm, 135*mm])
+    customer_table.setStyle(TableStyle([
+        ("BACKGROUND", (0,0), (0,-1), colors.Color(0.95, 0.95, 0.95)),
+        ("TEXTCOLOR", (0,0), (0,-1), colors.Color(0.3, 0.3, 0.3)),
+        ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
+        ("FONTSIZE", (0,0), (-1,-1), 9),
+        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+        ("LEFTPADDING", (0,0), (-1,-1), 8),
+        ("RIGHTPADDING", (0,0), (-1,-1), 8),
+        ("TOPPADDING", (0,0), (-1,-1), 6),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 6),
+        ("GRID", (0,0), (-1,-1), 0.5, colors.Color(0.8, 0.8, 0.8)),
+    ]))
+    
+    elements.append(customer_table)
+    elements.append(Spacer(1, 18))
+
+    # =====================================================
+    # 🛍️ ITEMS TABLE
+    # =====================================================
+    elements.append(Paragraph("ITEM DETAILS", styles["SectionHeader"]))
+    
+    # Table Header
+    item_data = [[
+        Paragraph("<b>PRODUCT</b>", styles["TableHeader"]),
+        Paragraph("<b>SIZE</b>", styles["TableHeader"]),
+        Paragraph("<b>QTY</b>", styles["TableHeader"]),
+        Paragraph("<b>RATE (Rs.)</b>", styles["TableHeader"]),
+        Paragraph("<b>AMOUNT (Rs. )</b>", styles["TableHeader"])
+    ]]
+    
+    # Table Rows
+    for idx, item in enumerate(cart):
+        bg_color = colors.Color(0.98, 0.98, 0.98) if idx % 2 == 0 else colors.white
+        item_data.append([
+            Paragraph(item["design_text"], styles["Normal"]),
+            Paragraph(f"<b>{item['size']}</b>", styles["Normal"]),
+            Paragraph(f"<b>{item['quantity']}</b>", styles["Normal"]),
+            Paragraph(f"Rs. {item['price']:.2f}", styles["Normal"]),
+            Paragraph(f"<b>Rs. {item['price'] * item['quantity']:.2f}</b>", styles["Normal"])
+        ])
+    
+    item_table = Table(item_data, colWidths=[78*mm, 18*mm, 15*mm, 28*mm, 31*mm])
+    item_table.setStyle(TableStyle([
+        # Header styling
+        ("BACKGROUND", (0,0), (-1,0), colors.Color(0.2, 0.2, 0.2)),
+        ("TEXTCOLOR", (0,0), (-1,0), colors.white),
+        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+        ("FONTSIZE", (0,0), (-1,0), 9),
+        ("ALIGN", (0,0), (-1,0), "CENTER"),
+        ("VALIGN", (0,0), (-1,0), "MIDDLE"),
+        ("TOPPADDING", (0,0), (-1,0), 8),
+        ("BOTTOMPADDING", (0,0), (-1,0), 8),
+        
+        # Body styling
+        ("FONTSIZE", (0,1), (-1,-1), 9),
+        ("ALIGN", (1,1), (-1,-1), "CENTER"),
+        ("ALIGN", (3,1), (4,-1), "RIGHT"),
+        ("VALIGN", (0,1), (-1,-1), "MIDDLE"),
+        ("TOPPADDING", (0,1), (-1,-1), 7),
+        ("BOTTOMPADDING", (0,1), (-1,-1), 7),
+        ("LEFTPADDING", (0,0), (-1,-1), 6),
+        ("RIGHTPADDING", (0,0), (-1,-1), 6),
+        
+        # Alternating row colors
+        *[("BACKGROUND", (0,i), (-1,i), colors.Color(0.98, 0.98, 0.98)) 
+          for i in range(1, len(item_data), 2)],
+        
+        # Grid
+        ("GRID", (0,0), (-1,-1), 0.5, colors.Color(0.7, 0.7, 0.7)),
+        ("LINEBELOW", (0,0), (-1,0), 1.5, colors.white),
+    ]))
+    
+    elements.append(item_table)
+    elements.append(Spacer(1, 20))
+
+    # =====================================================
+    # 💰 FINANCIAL SUMMARY (NEW LOGIC)
+    # =====================================================
+    summary_data = [
+        ["Subtotal (Incl. GST)", f"Rs. {subtotal_inclusive:.2f}"],
+        ["Base Price (Excl. GST)", f"Rs. {base_price_total:.2f}"],
+        [f"Discount ({discount_percent}%)", f"- Rs. {discount_amount:.2f}"],
+        ["Discounted Base Price", f"Rs. {discounted_base_price:.2f}"],
+        [f"GST ({gst_percent}%)", f"+ Rs. {gst_amount:.2f}"],
+    ]
+    
+    summary_table = Table(summary_data, colWidths=[50*mm, 35*mm], hAlign="RIGHT")
+    summary_table.setStyle(TableStyle([
+        ("FONTSIZE", (0,0), (-1,-1), 9),
+        ("ALIGN", (0,0), (0,-1), "LEFT"),
+        ("ALIGN", (1,0), (1,-1), "RIGHT"),
+        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+        ("TOPPADDING", (0,0), (-1,-1), 5),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 5),
+        ("TEXTCOLOR", (0,0), (-1,-1), colors.Color(0.2, 0.2, 0.2)),
+        ("LINEBELOW", (0,-1), (-1,-1), 1, colors.Color(0.7, 0.7, 0.7)),
+    ]))
+    
+    elements.append(summary_table)
+    elements.append(Spacer(1, 4))
+    
+    # Grand Total
+    grand_total_data = [[
+        Paragraph("<b><font color='white'>GRAND TOTAL</font></b>", styles["Normal"]),
+        Paragraph(f"<b><font color='white'>Rs. {grand_total:,.2f}</font></b>", styles["Normal"])
+    ]]
+    
+    grand_total_table = Table(grand_total_data, colWidths=[50*mm, 35*mm], hAlign="RIGHT")
+    grand_total_table.setStyle(TableStyle([
+        ("BACKGROUND", (0,0), (-1,-1), colors.Color(0.2, 0.2, 0.2)),
+        ("TEXTCOLOR", (0,0), (-1,-1), colors.white),
+        ("FONTNAME", (0,0), (-1,-1), "Helvetica-Bold"),
+        ("FONTSIZE", (0,0), (-1,-1), 11),
+        ("ALIGN", (0,0), (0,0), "LEFT"),
+        ("ALIGN", (1,0), (1,0), "RIGHT"),
+        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+        ("TOPPADDING", (0,0), (-1,-1), 8),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 8),
+        ("LEFTPADDING", (0,0), (-1,-1), 8),
+        ("RIGHTPADDING", (0,0), (-1,-1), 8),
+    ]))
+    
+    elements.append(grand_total_table)
+    elements.append(Spacer(1, 30))
+
+    # =====================================================
+    # 📝 FOOTER NOTES
+    # =====================================================
+    elements.append(Paragraph(
+        "<b>Terms & Conditions: </b>",
+        styles["SectionHeader"]
+    ))
+    
+    terms = [
+        "• All sales are final.  No refunds or exchanges.",
+        "• Products sold are subject to our standard warranty terms.",
+        "• Please retain this invoice for future reference.",
+        "• All prices are inclusive of GST."
+    ]
+    
+    for term in terms:
+        elements.append(Paragraph(term, styles["FooterNote"]))
+    
+    elements.append(Spacer(1, 20))
+    
+    elements.append(Paragraph(
+        "Thank you for shopping with <b>SLAYDRIP</b> – Your style, our passion!",
+        styles["FooterNote"]
+    ))
+
+    # =====================================================
+    # 🎨 BUILD PDF WITH CUSTOM CANVAS
+    # =====================================================
+    doc.build(elements, canvasmaker=InvoiceCanvas)
+    return buffer.getvalue()
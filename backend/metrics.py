@@ -0,0 +1,277 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# =====================================================
+# IN-PROCESS METRICS (PROMETHEUS TEXT FORMAT)
+# =====================================================
+# Everything lives in this process - no push gateway or agent needed.
+# Each gunicorn worker keeps its own registry; scrape every worker (or
+# run a single worker) when you need the full picture.
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """Return (count, sum) for one label set - handy for benchmarks."""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render_latest():
+    return REGISTRY.render()
+
+# =====================================================
+# SLAYDRIP METRICS
+# =====================================================
+REQUEST_LATENCY = histogram(
+    "slaydrip_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status.",
+    ("route", "method", "status")
+)
+STAGE_LATENCY = histogram(
+    "slaydrip_stage_duration_seconds",
+    "Time spent in a named stage of request handling (db_connect, pdf_build, template_render, ...).",
+    ("stage",)
+)
+SQL_LATENCY = histogram(
+    "slaydrip_sql_duration_seconds",
+    "SQL statement latency by statement fingerprint (verb + table).",
+    ("statement",)
+)
+SALES = counter("slaydrip_sales_total", "Completed checkouts.")
+SALES_AMOUNT = counter("slaydrip_sales_amount_rupees_total", "Grand total of completed checkouts in rupees.")
+REFUNDS = counter("slaydrip_refunds_total", "Completed returns and exchanges.", ("type",))
+REFUND_AMOUNT = counter(
+    "slaydrip_refund_amount_rupees_total",
+    "Value credited back for returned items in rupees.",
+    ("type",)
+)
+DB_READS = counter(
+    "slaydrip_db_reads_total",
+    "Read-only connections by target (replica, primary, replica_unavailable).",
+    ("target",)
+)
+DB_POOL = counter(
+    "slaydrip_db_pool_checkouts_total",
+    "Connection pool checkouts by outcome (hit = reused idle connection, miss = new connection).",
+    ("outcome",)
+)
+PREPARED_EXECUTIONS = counter(
+    "slaydrip_statement_executions_total",
+    "Registry statement executions (backend/statements.py) by name and mode (prepared/plain).",
+    ("statement", "mode")
+)
+PREPARED_PREPARES = counter(
+    "slaydrip_statement_prepares_total",
+    "Server-side PREPAREs issued, i.e. registry statements parsed on a new connection.",
+    ("statement",)
+)
+STOCK_MOVEMENTS = counter(
+    "slaydrip_stock_movements_total",
+    "Stock ledger movements by reason (SALE, RETURN, EXCHANGE_IN/OUT, TRANSFER_IN/OUT, IMPORT, ADJUSTMENT).",
+    ("reason",)
+)
+OUTBOX_EVENTS = counter(
+    "slaydrip_outbox_events_total",
+    "Events written to the sales outbox by type (sale.created, return.created, exchange.created).",
+    ("type",)
+)
+ADMISSION_ACTIVE = gauge(
+    "slaydrip_admission_active",
+    "Requests currently admitted, by admission class (read, write, checkout).",
+    ("admission_class",)
+)
+ADMISSION_QUEUE = gauge(
+    "slaydrip_admission_queue_depth",
+    "Requests waiting for an admission slot, by admission class.",
+    ("admission_class",)
+)
+ADMISSION_SHED = counter(
+    "slaydrip_admission_shed_total",
+    "Requests turned away with 503 by admission class and reason (queue_full, deadline, timeout).",
+    ("admission_class", "reason")
+)
+ADMISSION_WAIT = histogram(
+    "slaydrip_admission_wait_seconds",
+    "Time admitted requests spent queued before running.",
+    ("admission_class",)
+)
+ERRORS = counter("slaydrip_errors_total", "Requests that ended with a 5xx status.", ("route",))
+
+
+# called as listener(stage, start, duration) for every stage observation
+# (backend/tracing.py turns them into spans)
+STAGE_LISTENERS = []
+
+
+def observe_stage(stage, start, duration):
+    STAGE_LATENCY.observe(duration, stage=stage)
+    for listener in STAGE_LISTENERS:
+        listener(stage, start, duration)
+
+
+@contextmanager
+def timed(stage):
+    """Time a block into slaydrip_stage_duration_seconds{stage=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, start, time.perf_counter() - start)
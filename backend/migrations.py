@@ -0,0 +1,413 @@
+"""
+Versioned schema migrations and a query-plan check.
+
+    python -m backend.migrations status
+    python -m backend.migrations apply
+    python -m backend.migrations verify --min-rows 1000
+
+Migrations are database/migrations/NNNN_name.sql, applied in order and
+recorded in schema_migrations (with a checksum, so an edited file shows
+up in `status`). A file whose first line is `-- no-transaction` runs one
+statement at a time in autocommit, which CREATE INDEX CONCURRENTLY needs.
+Those statements must be re-runnable (IF NOT EXISTS): an interrupted
+concurrent build leaves an INVALID index behind, which the next run drops
+and rebuilds. On a partitioned table the index is created ON ONLY the
+parent, built concurrently per partition and attached.
+
+`verify` EXPLAINs every query the app sends (backend/app.py and the
+modules its routes call) against the current database and fails when one
+filters a large table with a sequential scan. Run it on a seeded database.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+
+from backend import statements
+from backend.db import get_connection
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, "database", "migrations")
+VERIFY_MODULES = (
+    "backend/app.py", "backend/returns.py", "backend/async_api.py",
+    "backend/stalls.py", "backend/till.py", "backend/velocity.py", "backend/outbox.py",
+)
+
+_MIGRATION_RE = re.compile(r"^(?P<version>\d{4})_(?P<name>\w+)\.sql$")
+_CONCURRENT_INDEX_RE = re.compile(
+    r"^\s*CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"(?P<name>\w+)\s+ON\s+(?P<table>\w+)\s*(?P<definition>\(.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+_DOLLAR_TAG_RE = re.compile(r"\$\w*\$")
+# any constant works; keeps two deploys from migrating at once
+_MIGRATION_LOCK_KEY = 0x51A7D34
+
+# =====================================================
+# MIGRATION FILES
+# =====================================================
+def load_migrations(directory=MIGRATIONS_DIR):
+    """[(version, name, sql, checksum, transactional)] sorted by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _MIGRATION_RE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as fh:
+            sql = fh.read()
+        migrations.append((
+            int(match["version"]),
+            match["name"],
+            sql,
+            hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+            not sql.lstrip().lower().startswith("-- no-transaction"),
+        ))
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version in " + directory)
+    return migrations
+
+
+def split_statements(sql):
+    """Split on top-level semicolons; quotes, dollar quotes and comments are respected."""
+    parts, current, i = [], [], 0
+    while i < len(sql):
+        ch = sql[i]
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = len(sql) if end == -1 else end
+            i = end
+            continue
+        if ch == "'":
+            end = sql.find("'", i + 1)
+            while end != -1 and sql.startswith("''", end):
+                end = sql.find("'", end + 2)
+            end = len(sql) - 1 if end == -1 else end
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        tag = _DOLLAR_TAG_RE.match(sql, i)
+        if tag:
+            end = sql.find(tag.group(), tag.end())
+            end = len(sql) if end == -1 else end + len(tag.group())
+            current.append(sql[i:end])
+            i = end
+            continue
+        if ch == ";":
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+# =====================================================
+# APPLY
+# =====================================================
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def applied_migrations(cursor):
+    _ensure_table(cursor)
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row["version"]: row for row in cursor.fetchall()}
+
+
+def _index_is_valid(cursor, name):
+    """True/False for an existing index, None when there is none."""
+    cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cursor.fetchone()
+    return row["indisvalid"] if row else None
+
+
+def _build_concurrently(cursor, unique, name, table, definition):
+    if _index_is_valid(cursor, name) is False:
+        # left behind by an interrupted CONCURRENTLY build
+        cursor.execute(f"DROP INDEX CONCURRENTLY {name}")
+    cursor.execute(f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+
+
+def create_index_concurrently(cursor, statement):
+    """
+    Run a CREATE INDEX CONCURRENTLY statement, re-runnably. Partitioned
+    tables don't support CONCURRENTLY directly: the parent gets an ON ONLY
+    index, each partition is built concurrently and attached to it.
+    """
+    match = _CONCURRENT_INDEX_RE.match(statement)
+    unique = "UNIQUE " if match["unique"] else ""
+    name, table, definition = match["name"], match["table"], match["definition"].strip()
+
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    if not row or row["relkind"] != "p":
+        _build_concurrently(cursor, unique, name, table, definition)
+        return
+
+    cursor.execute(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}")
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+    """, (table,))
+    for child in [r["relname"] for r in cursor.fetchall()]:
+        cursor.execute("""
+            SELECT 1
+            FROM pg_inherits i
+            JOIN pg_index x ON x.indexrelid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s) AND x.indrelid = to_regclass(%s)
+        """, (name, child))
+        if cursor.fetchone():
+            continue  # partition created after the parent index already has its own
+        suffix = child[len(table) + 1:] if child.startswith(table + "_") else child
+        child_index = f"{name}_{suffix}"[:63]
+        _build_concurrently(cursor, unique, child_index, child, definition)
+        cursor.execute(f"ALTER INDEX {name} ATTACH PARTITION {child_index}")
+
+
+def apply_migration(conn, version, name, sql, checksum, transactional):
+    cursor = conn.cursor()
+    try:
+        if transactional:
+            conn.autocommit = False
+            cursor.execute(sql)
+        else:
+            conn.autocommit = True
+            for statement in split_statements(sql):
+                if _CONCURRENT_INDEX_RE.match(statement):
+                    create_index_concurrently(cursor, statement)
+                else:
+                    cursor.execute(statement)
+            conn.autocommit = False
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+            (version, name, checksum)
+        )
+        conn.commit()
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+        conn.autocommit = False
+        raise
+    finally:
+        cursor.close()
+
+
+def apply_pending(conn, migrations=None, log=print):
+    migrations = migrations if migrations is not None else load_migrations()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (_MIGRATION_LOCK_KEY,))
+    try:
+        done = applied_migrations(cursor)
+        conn.commit()
+        applied = []
+        for version, name, sql, checksum, transactional in migrations:
+            if version in done:
+                continue
+            log(f"Applying {version:04d}_{name}" + ("" if transactional else " (no transaction)"))
+            apply_migration(conn, version, name, sql, checksum, transactional)
+            applied.append(version)
+        return applied
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (_MIGRATION_LOCK_KEY,))
+        conn.commit()
+        cursor.close()
+
+# =====================================================
+# VERIFY (EXPLAIN every app query)
+# =====================================================
+def _string_value(node, constants=None):
+    """
+    A SQL literal, a module-level constant (of the file being read, else
+    from backend.statements), or an f-string built only from those.
+    """
+    constants = constants or {}
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in constants:
+            return constants[node.id]
+        if isinstance(getattr(statements, node.id, None), str):
+            return getattr(statements, node.id)
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and value.conversion == -1 and value.format_spec is None:
+                text = _string_value(value.value, constants)
+                if text is None:
+                    return None
+                parts.append(text)
+            else:
+                return None
+        return "".join(parts)
+    return None
+
+
+def _module_constants(tree):
+    """NAME = <string> assignments at module level, e.g. velocity.RANKING_SQL or stalls.STALL_COLUMNS."""
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            value = _string_value(node.value, constants)
+            if value is not None:
+                constants[node.targets[0].id] = value
+    return constants
+
+
+def collect_queries(modules=VERIFY_MODULES):
+    """[(location, sql)] for every static query passed to execute()/fetch() in modules, plus the statement registry."""
+    found = {}
+    for relpath in modules:
+        with open(os.path.join(BASE_DIR, relpath), encoding="utf-8") as fh:
+            tree = ast.parse(fh.read(), relpath)
+        constants = _module_constants(tree)
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            func = node.func
+            sql = None
+            if isinstance(func, ast.Attribute) and func.attr == "execute":
+                if isinstance(func.value, ast.Name) and func.value.id == "statements":
+                    name = _string_value(node.args[1]) if len(node.args) > 1 else None
+                    sql = statements.STATEMENTS.get(name)
+                else:
+                    sql = _string_value(node.args[0], constants)
+            # fetch() in the async tier; helpers handed a module constant (velocity._read(RANKING_SQL, ...))
+            elif isinstance(func, ast.Name) and (func.id == "fetch" or isinstance(node.args[0], ast.Name)):
+                sql = _string_value(node.args[0], constants)
+            if not sql or sql.split()[0].upper() not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+                continue
+            key = " ".join(sql.split())
+            found.setdefault(key, (f"{relpath}:{node.lineno}", sql))
+    # registry statements are also run from helpers (e.g. backend/stock_ledger.py)
+    for name, sql in statements.STATEMENTS.items():
+        found.setdefault(" ".join(sql.split()), (f"backend/statements.py:{name}", sql))
+    return list(found.values())
+
+
+def _walk_plan(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk_plan(child)
+
+
+def explain_query(cursor, sql, name="verify_query"):
+    """Generic plan (JSON) for a %s-parameterised query, without running it."""
+    server_sql, param_count = statements.to_server_sql(sql)
+    prepared = False
+    cursor.execute("SAVEPOINT verify_query")
+    try:
+        cursor.execute(f"PREPARE {name} AS {server_sql}")
+        prepared = True
+        args = f"({', '.join(['NULL'] * param_count)})" if param_count else ""
+        cursor.execute(f"EXPLAIN (FORMAT JSON) EXECUTE {name}{args}")
+        plan = cursor.fetchone()["QUERY PLAN"]
+        cursor.execute("RELEASE SAVEPOINT verify_query")
+    except Exception:
+        cursor.execute("ROLLBACK TO SAVEPOINT verify_query")
+        raise
+    finally:
+        # prepared statements ignore rollbacks; don't leave one on a pooled connection
+        if prepared:
+            cursor.execute(f"DEALLOCATE {name}")
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def verify(cursor, min_rows=1000, queries=None):
+    """
+    [(location, sql, problems, error)] for each query. A problem is a Seq
+    Scan with a Filter on a relation holding >= min_rows (pg_class
+    estimate) - a lookup that reads the whole table. Unfiltered scans
+    (full catalog loads) are fine.
+    """
+    cursor.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+    cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')")
+    sizes = {row["relname"]: row["reltuples"] for row in cursor.fetchall()}
+
+    results = []
+    for location, sql in (queries if queries is not None else collect_queries()):
+        try:
+            plan = explain_query(cursor, sql)
+        except Exception as exc:
+            results.append((location, sql, [], str(exc).strip()))
+            continue
+        problems = []
+        for node in _walk_plan(plan):
+            relation = node.get("Relation Name")
+            if node["Node Type"] == "Seq Scan" and "Filter" in node and sizes.get(relation, 0) >= min_rows:
+                problems.append(f"Seq Scan on {relation} (~{int(sizes[relation])} rows) filter {node['Filter']}")
+        results.append((location, sql, problems, None))
+    return results
+
+# =====================================================
+# CLI
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("status", "apply", "verify"))
+    parser.add_argument("--min-rows", type=int, default=1000, help="verify: tables at least this big must not be seq-scanned")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    conn.autocommit = False
+    cursor = conn.cursor()
+    try:
+        if args.command == "status":
+            done = applied_migrations(cursor)
+            conn.commit()
+            for version, name, _, checksum, _ in load_migrations():
+                row = done.get(version)
+                if row is None:
+                    state = "pending"
+                elif row["checksum"] != checksum:
+                    state = f"applied {row['applied_at']:%Y-%m-%d %H:%M} (file changed since)"
+                else:
+                    state = f"applied {row['applied_at']:%Y-%m-%d %H:%M}"
+                print(f"{version:04d}_{name:<40} {state}")
+
+        elif args.command == "apply":
+            applied = apply_pending(conn)
+            print(f"Applied {len(applied)} migrations" if applied else "Up to date")
+
+        elif args.command == "verify":
+            results = verify(cursor, args.min_rows)
+            conn.rollback()
+            failed = 0
+            for location, sql, problems, error in results:
+                label = " ".join(sql.split())[:90]
+                if error:
+                    print(f"SKIP {location}  {label}\n     {error}")
+                elif problems:
+                    failed += 1
+                    print(f"FAIL {location}  {label}")
+                    for problem in problems:
+                        print(f"     {problem}")
+                else:
+                    print(f"ok   {location}  {label}")
+            print(f"{len(results)} queries, {failed} with sequential scans on tables >= {args.min_rows} rows")
+            if failed:
+                sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
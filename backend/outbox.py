@@ -0,0 +1,242 @@
+"""
+Transactional outbox and change feed for sales events.
+
+Checkout, returns and exchanges call emit() inside their own transaction
+(outbox_events, database/migrations/0009_outbox.sql), so an event is
+committed exactly when the sale, return or exchange is:
+
+    sale.created        ref = invoice_no
+    return.created      ref = return_ref
+    exchange.created    ref = exchange_ref
+
+Consumers page through the feed with an opaque cursor (start at "0-0")
+and keep the last one they processed, so a poll costs the new events
+only, never a scan of sales or returns:
+
+    GET /api/events?after=<cursor>&limit=500     # EVENT_FEED_TOKEN bearer, or an admin session
+    python -m backend.outbox consume --cursor-file feed.cursor [--follow] >> events.ndjson
+    python -m backend.outbox compact [--days 30]  # cron: drop events past retention
+
+An event is served once every transaction older than it has finished, so
+a slow commit can't land behind a cursor that already moved on; a long
+running writer delays the feed, it never loses events. A cursor that
+falls behind compaction is refused (HTTP 410) with the oldest cursor
+still available.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from psycopg2.extras import Json
+
+from backend import metrics, statements
+from backend.db import get_connection
+
+RETENTION_DAYS = float(os.environ.get("OUTBOX_RETENTION_DAYS", "30"))
+MAX_BATCH = 1000
+COMPACT_CHUNK = 5000
+START = "0-0"
+
+FEED_SQL = """
+    SELECT id, txid::text AS txid, event_type, ref, stall_location, payload, created_at
+    FROM outbox_events
+    WHERE (txid, id) > (%(txid)s::xid8, %(id)s)
+      AND txid < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY txid, id
+    LIMIT %(limit)s
+"""
+
+# oldest finished events first, flagged when past retention
+COMPACT_HEAD_SQL = """
+    SELECT id, txid::text AS txid, created_at < NOW() - %s * INTERVAL '1 day' AS expired
+    FROM outbox_events
+    WHERE txid < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY txid, id
+    LIMIT %s
+"""
+
+STATE_SQL = "SELECT compacted_txid::text AS txid, compacted_id FROM outbox_state WHERE id=1"
+
+
+class FeedGap(Exception):
+    """The cursor points at events retention already deleted."""
+
+    def __init__(self, resume_from):
+        super().__init__(f"Events before {resume_from} were compacted away")
+        self.resume_from = resume_from
+
+
+def parse_cursor(value):
+    """'<txid>-<id>' -> (txid, id); ValueError if malformed."""
+    txid, sep, event_id = (value or "").partition("-")
+    if not sep or not txid.isdigit() or not event_id.isdigit():
+        raise ValueError(f"Invalid cursor {value!r}")
+    return int(txid), int(event_id)
+
+
+def format_cursor(txid, event_id):
+    return f"{txid}-{event_id}"
+
+# =====================================================
+# WRITE (inside checkout / return / exchange)
+# =====================================================
+def emit(cursor, event_type, ref, payload, stall_location=None):
+    """Append one event to the caller's transaction. `payload` must be JSON-ready."""
+    statements.execute(cursor, "outbox_event", (event_type, ref, stall_location, Json(payload)))
+    metrics.OUTBOX_EVENTS.inc(type=event_type)
+
+# =====================================================
+# READ
+# =====================================================
+def read(cursor, after=START, limit=500):
+    """Events after `after`, oldest first: {events, next_cursor, has_more}. Raises FeedGap."""
+    position = parse_cursor(after)
+    cursor.execute(FEED_SQL, {"txid": str(position[0]), "id": position[1], "limit": limit + 1})
+    rows = cursor.fetchall()
+    # checked after reading: under READ COMMITTED (the velocity fold) a
+    # compaction that cut into this page has committed by now
+    cursor.execute(STATE_SQL)
+    state = cursor.fetchone()
+    compacted = (int(state["txid"]), state["compacted_id"])
+    if position < compacted:
+        raise FeedGap(format_cursor(*compacted))
+
+    events = [
+        {
+            "cursor": format_cursor(row["txid"], row["id"]),
+            "id": row["id"],
+            "type": row["event_type"],
+            "ref": row["ref"],
+            "stall_location": row["stall_location"],
+            "created_at": row["created_at"].isoformat(),
+            "payload": row["payload"],
+        }
+        for row in rows[:limit]
+    ]
+    return {
+        "events": events,
+        "next_cursor": events[-1]["cursor"] if events else format_cursor(*position),
+        "has_more": len(rows) > limit,
+    }
+
+
+def feed(after=START, limit=500):
+    """read() on its own connection; one snapshot, so compaction can't cut between the checks."""
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        return read(cursor, after, limit)
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+# =====================================================
+# RETENTION
+# =====================================================
+def compact(days=RETENTION_DAYS, chunk=COMPACT_CHUNK):
+    """
+    Delete events older than `days`, in feed order and in chunks (one short
+    transaction each), stopping at the first event still retained. Returns
+    (deleted, cursor of the oldest event consumers can still start after).
+    """
+    deleted = 0
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute("SELECT id FROM outbox_state WHERE id=1 FOR UPDATE")  # one compactor at a time
+            cursor.execute(COMPACT_HEAD_SQL, (days, chunk))
+            head = cursor.fetchall()
+            doomed = []
+            for row in head:
+                if not row["expired"]:
+                    break
+                doomed.append(row)
+            if doomed:
+                cursor.execute("DELETE FROM outbox_events WHERE id = ANY(%s)", ([r["id"] for r in doomed],))
+                cursor.execute(
+                    "UPDATE outbox_state SET compacted_txid=%s::xid8, compacted_id=%s, compacted_at=NOW() WHERE id=1",
+                    (doomed[-1]["txid"], doomed[-1]["id"])
+                )
+                deleted += len(doomed)
+            conn.commit()
+            if len(doomed) < chunk:
+                break
+        cursor.execute(STATE_SQL)
+        state = cursor.fetchone()
+        conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return deleted, format_cursor(state["txid"], state["compacted_id"])
+
+# =====================================================
+# CLI
+# =====================================================
+def _save_cursor(path, value):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(value + "\n")
+    os.replace(tmp, path)
+
+
+def consume(after, batch, follow, interval, cursor_file=None, out=sys.stdout):
+    """Stream events as NDJSON from `after`; the cursor file moves only after a batch is written."""
+    while True:
+        page = feed(after, batch)
+        for event in page["events"]:
+            out.write(json.dumps(event, separators=(",", ":")) + "\n")
+        out.flush()
+        after = page["next_cursor"]
+        if cursor_file and page["events"]:
+            _save_cursor(cursor_file, after)
+        if page["has_more"]:
+            continue
+        if not follow:
+            return after
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    con = sub.add_parser("consume", help="print events as NDJSON")
+    con.add_argument("--from", dest="after", help=f"start after this cursor (default: cursor file, else {START})")
+    con.add_argument("--cursor-file", help="read the start cursor from here and store progress after each batch")
+    con.add_argument("--batch", type=int, default=500)
+    con.add_argument("--follow", action="store_true", help="keep polling for new events")
+    con.add_argument("--interval", type=float, default=2.0, help="seconds between polls with --follow")
+    com = sub.add_parser("compact", help="delete events past retention")
+    com.add_argument("--days", type=float, default=RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        deleted, oldest = compact(args.days)
+        print(f"Deleted {deleted} events; consumers can resume after {oldest}")
+        return
+
+    after = args.after
+    if after is None and args.cursor_file and os.path.exists(args.cursor_file):
+        with open(args.cursor_file, encoding="utf-8") as fh:
+            after = fh.read().strip()
+    try:
+        parse_cursor(after or START)
+        consume(after or START, max(1, min(args.batch, MAX_BATCH)), args.follow, args.interval, args.cursor_file)
+    except ValueError as exc:
+        sys.exit(str(exc))
+    except FeedGap as gap:
+        print(f"{gap}; restart with --from {gap.resume_from} (a gap, not a replay)", file=sys.stderr)
+        sys.exit(2)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Monthly partition maintenance and archival for sales, sale_items, returns
+and exchange_details (see database/partitioning.sql).
+
+    python -m backend.partitions maintain      # daily: create ahead + archive
+    python -m backend.partitions status
+
+`ensure` keeps PARTITION_MONTHS_AHEAD months of empty partitions ready so
+checkout never hits a missing range. `archive` exports every month that
+ended more than RETURN_WINDOW_DAYS ago to ARCHIVE_DIR/<table>/<partition>.csv.gz,
+checks the file, then detaches and drops the partitions in one transaction.
+archived_invoices remembers which month holds each invoice, and
+lookup_archived() reads it back for the invoice API.
+"""
+import argparse
+import csv
+import gzip
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from backend.db import get_connection
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+RETURN_WINDOW_DAYS = int(os.environ.get("RETURN_WINDOW_DAYS", "30"))
+PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "3"))
+
+PARTITIONED_TABLES = ("sales", "sale_items", "returns", "exchange_details")
+# any constant works; keeps two cron runs from archiving the same month
+_JOB_LOCK_KEY = 0x51A7D21
+_PARTITION_RE = re.compile(r"_p(?P<year>\d{4})(?P<month>\d{2})$")
+
+# =====================================================
+# MONTH HELPERS
+# =====================================================
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def archive_path(table, month):
+    return os.path.join(ARCHIVE_DIR, table, f"{partition_name(table, month)}.csv.gz")
+
+
+def archivable_before(today=None):
+    """First month that must stay live: every earlier month ended more than RETURN_WINDOW_DAYS ago."""
+    today = today or datetime.now(timezone.utc).date()
+    return month_start(today - timedelta(days=RETURN_WINDOW_DAYS))
+
+# =====================================================
+# PARTITION MAINTENANCE
+# =====================================================
+def is_partitioned(cursor, table="sales"):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row["relkind"] == "p"
+
+
+def list_partitions(cursor, table):
+    """{month: partition name} for the attached monthly partitions of table."""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+    months = {}
+    for row in cursor.fetchall():
+        match = _PARTITION_RE.search(row["relname"])
+        if match:
+            months[date(int(match["year"]), int(match["month"]), 1)] = row["relname"]
+    return months
+
+
+def ensure_partitions(cursor, ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """Create this month's and the next `ahead` months' partitions. Returns the names created."""
+    if not is_partitioned(cursor):
+        raise RuntimeError("sales is not partitioned - run database/partitioning.sql first")
+    first = month_start(today or datetime.now(timezone.utc).date())
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = list_partitions(cursor, table)
+        for offset in range(ahead + 1):
+            month = add_months(first, offset)
+            if month not in existing:
+                cursor.execute("SELECT slaydrip_create_month_partition(%s, %s) AS name", (table, month))
+                created.append(cursor.fetchone()["name"])
+    return created
+
+
+def _export(cursor, table, month):
+    """COPY one partition to a gzip CSV (written to a temp name, then renamed). Returns rows written."""
+    path = archive_path(table, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wb") as fh:
+        cursor.copy_expert(f"COPY {partition_name(table, month)} TO STDOUT WITH (FORMAT csv, HEADER)", fh)
+    with gzip.open(tmp_path, "rt", encoding="utf-8", newline="") as fh:
+        written = sum(1 for _ in csv.DictReader(fh))
+    os.replace(tmp_path, path)
+    return written
+
+
+def archive_partitions(conn, today=None, dry_run=False):
+    """
+    Export and drop every month that closed more than RETURN_WINDOW_DAYS ago.
+
+    Those months are immutable - no sale, return or exchange can land in
+    them - so the export is taken while they are still attached and the
+    detach + drop only happens after the file round-trips with the same
+    row count.
+    """
+    cursor = conn.cursor()
+    cutoff = archivable_before(today)
+    archived = []
+    try:
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (_JOB_LOCK_KEY,))
+        if not cursor.fetchone()["locked"]:
+            raise RuntimeError("another partition job is running")
+        conn.commit()
+
+        months = sorted(m for m in list_partitions(cursor, "sales") if m < cutoff)
+        for month in months:
+            if dry_run:
+                archived.append(month)
+                continue
+            for table in PARTITIONED_TABLES:
+                name = partition_name(table, month)
+                cursor.execute(f"SELECT COUNT(*) AS n FROM {name}")
+                expected = cursor.fetchone()["n"]
+                written = _export(cursor, table, month)
+                if written != expected:
+                    raise RuntimeError(f"{name}: exported {written} rows, expected {expected}")
+            conn.commit()
+
+            cursor.execute(f"""
+                INSERT INTO archived_invoices (invoice_no, partition_month)
+                SELECT DISTINCT invoice_no, %s FROM {partition_name('sales', month)}
+                ON CONFLICT (invoice_no) DO NOTHING
+            """, (month,))
+            for table in PARTITIONED_TABLES:
+                name = partition_name(table, month)
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                cursor.execute(f"DROP TABLE {name}")
+            conn.commit()
+            archived.append(month)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (_JOB_LOCK_KEY,))
+        conn.commit()
+        cursor.close()
+    return archived
+
+# =====================================================
+# ARCHIVED INVOICE LOOKUP
+# =====================================================
+def _archived_rows(table, month, invoice_no):
+    path = archive_path(table, month)
+    if not os.path.exists(path):
+        return []
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+        return [row for row in csv.DictReader(fh) if row["invoice_no"] == invoice_no]
+
+
+def archived_month(cursor, invoice_no):
+    """Month file holding invoice_no, or None (also when archival was never set up)."""
+    cursor.execute("SELECT to_regclass('archived_invoices') IS NOT NULL AS ready")
+    if not cursor.fetchone()["ready"]:
+        return None
+    cursor.execute("SELECT partition_month FROM archived_invoices WHERE invoice_no=%s", (invoice_no,))
+    row = cursor.fetchone()
+    return row["partition_month"] if row else None
+
+
+def lookup_archived(invoice_no, cursor=None):
+    """
+    Same shape as the live /api/invoice response, rebuilt from the archive
+    files, or None. Archived invoices are past the return window, so every
+    item comes back with returnable=0.
+    """
+    from backend.returns import shape_returnable_items
+
+    own_conn = None
+    if cursor is None:
+        own_conn = get_connection(readonly=True)
+        cursor = own_conn.cursor()
+    try:
+        month = archived_month(cursor, invoice_no)
+        if month is None:
+            return None
+        sales = _archived_rows("sales", month, invoice_no)
+        if not sales:
+            return None
+        sale = sales[0]
+
+        # returns land up to RETURN_WINDOW_DAYS after the sale, so maybe a later month
+        already_returned = {}
+        last_month = month_start(add_months(month, 1) + timedelta(days=RETURN_WINDOW_DAYS))
+        returns_month = month
+        while returns_month <= last_month:
+            for row in _archived_rows("returns", returns_month, invoice_no):
+                key = (int(row["design_id"]), row["size"])
+                already_returned[key] = already_returned.get(key, 0) + int(row["quantity"])
+            returns_month = add_months(returns_month, 1)
+        cursor.execute("""
+            SELECT design_id, size, SUM(quantity) AS quantity
+            FROM returns WHERE invoice_no=%s
+            GROUP BY design_id, size
+        """, (invoice_no,))
+        for row in cursor.fetchall():
+            key = (row["design_id"], row["size"])
+            already_returned[key] = already_returned.get(key, 0) + row["quantity"]
+
+        items = _archived_rows("sale_items", month, invoice_no)
+        design_ids = sorted({int(item["design_id"]) for item in items})
+        designs = {}
+        if design_ids:
+            cursor.execute(
+                "SELECT design_id, design_code, product_name, color FROM designs WHERE design_id = ANY(%s)",
+                (design_ids,)
+            )
+            designs = {row["design_id"]: row for row in cursor.fetchall()}
+    finally:
+        if own_conn is not None:
+            cursor.close()
+            own_conn.close()
+
+    rows = []
+    for item in items:
+        design_id = int(item["design_id"])
+        design = designs.get(design_id, {})
+        rows.append({
+            "design_id": design_id,
+            "size": item["size"],
+            "sold_qty": int(item["quantity"]),
+            "unit_price": Decimal(item["price"]),
+            "design_code": design.get("design_code"),
+            "product_name": design.get("product_name"),
+            "color": design.get("color"),
+            "already_returned": already_returned.get((design_id, item["size"]), 0),
+        })
+    shaped = list(shape_returnable_items(rows).values())
+    for item in shaped:
+        item["returnable"] = 0
+
+    return {
+        "sale": {
+            "invoice_no": sale["invoice_no"],
+            "customer_name": sale["customer_name"],
+            "phone": sale["phone"],
+            "bill_date": date.fromisoformat(sale["bill_date"]),
+            "payment_mode": sale["payment_mode"],
+            "total_amount": Decimal(sale["total_amount"]) if sale["total_amount"] else None,
+        },
+        "items": shaped,
+        "archived": True,
+        "archived_month": f"{month:%Y-%m}",
+    }
+
+# =====================================================
+# CLI
+# =====================================================
+def status(cursor):
+    out = {}
+    for table in PARTITIONED_TABLES:
+        rows = []
+        for month, name in sorted(list_partitions(cursor, table).items()):
+            cursor.execute("SELECT reltuples::bigint AS estimate FROM pg_class WHERE relname=%s", (name,))
+            rows.append((name, max(cursor.fetchone()["estimate"], 0)))
+        out[table] = rows
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("ensure", "archive", "maintain", "status"))
+    parser.add_argument("--ahead", type=int, default=PARTITION_MONTHS_AHEAD, help="months of future partitions")
+    parser.add_argument("--dry-run", action="store_true", help="archive: only list the months")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    conn.autocommit = False
+    cursor = conn.cursor()
+    try:
+        if args.command in ("ensure", "maintain"):
+            created = ensure_partitions(cursor, args.ahead)
+            conn.commit()
+            print(f"Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+        if args.command in ("archive", "maintain"):
+            months = archive_partitions(conn, dry_run=args.dry_run)
+            verb = "Would archive" if args.dry_run else "Archived"
+            print(f"{verb} {len(months)} months" + (f": {', '.join(f'{m:%Y-%m}' for m in months)}" if months else ""))
+        if args.command == "status":
+            for table, rows in status(cursor).items():
+                print(table)
+                for name, estimate in rows:
+                    print(f"  {name:<32} ~{estimate} rows")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
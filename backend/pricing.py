@@ -0,0 +1,42 @@
+# =====================================================
+# CHECKOUT PRICING (GST INCLUSIVE)
+# =====================================================
+# Shelf prices include GST. The discount applies to the base price, and the
+# GST slab is picked on the discounted base: 5% below 1500, otherwise 12%.
+
+
+def price_cart(cart, discount_percent, default_gst_percent):
+    """Totals for a cart of {"price", "quantity"} items; keys match the invoice fields."""
+    # Step 1: Calculate subtotal from GST-inclusive prices
+    subtotal_inclusive = sum(i["price"] * i["quantity"] for i in cart)
+
+    # Step 2: Extract base price (remove GST from entered price) - using default GST for initial calculation
+    gst_multiplier = 1 + (default_gst_percent / 100)
+    base_price_total = subtotal_inclusive / gst_multiplier
+
+    # Step 3: Apply discount on base price
+    discount_amount = base_price_total * discount_percent / 100
+    discounted_base_price = base_price_total - discount_amount
+
+    # Step 4: Determine GST percentage based on discounted base price
+    if discounted_base_price < 1500:
+        gst_percent = 5
+    else:
+        gst_percent = 12
+
+    # Step 5: Calculate GST on discounted base price
+    gst_amount = discounted_base_price * gst_percent / 100
+
+    # Step 6: Final Grand Total (discounted base + GST)
+    grand_total = discounted_base_price + gst_amount
+
+    return {
+        "subtotal_inclusive": subtotal_inclusive,
+        "base_price_total": base_price_total,
+        "discount_percent": discount_percent,
+        "discount_amount": discount_amount,
+        "discounted_base_price": discounted_base_price,
+        "gst_percent": gst_percent,
+        "gst_amount": gst_amount,
+        "grand_total": grand_total,
+    }
@@ -0,0 +1,342 @@
+"""
+Return & exchange business rules.
+
+Shared by the Flask views and the async API tier (backend/async_api.py),
+so the rules in database/return_exchange_notes.md live in one place.
+"""
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from backend import metrics, outbox, partitions, stalls, statements, stock_ledger
+from backend.db import get_connection
+
+ALLOWED_PAYMENT_MODES = {"Cash", "UPI", "Card"}
+
+
+class ReturnError(Exception):
+    """A rejected return/exchange; message is shown to the cashier."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def generate_ref(prefix: str) -> str:
+    """Generate a short reference for returns/exchanges."""
+    return f"{prefix}-{int(time.time())}-{uuid.uuid4().hex[:5].upper()}"
+
+
+def shape_returnable_items(rows):
+    """Key sold rows by (design_id, size) with how many units are still returnable."""
+    items = {}
+    for row in rows:
+        returnable = max(0, row["sold_qty"] - row["already_returned"])
+        items[(row["design_id"], row["size"])] = {
+            "design_id": row["design_id"],
+            "size": row["size"],
+            "sold_qty": row["sold_qty"],
+            "unit_price": float(row["unit_price"]),
+            "design_code": row["design_code"],
+            "product_name": row["product_name"],
+            "color": row["color"],
+            "already_returned": row["already_returned"],
+            "returnable": returnable
+        }
+    return items
+
+
+def load_returnable_items(cursor, invoice_no: str):
+    """Fetch sold items with how many units are still returnable."""
+    statements.execute(cursor, "returnable_items", (invoice_no, invoice_no))
+    return shape_returnable_items(cursor.fetchall())
+
+# =====================================================
+# PAYLOAD VALIDATION
+# =====================================================
+def parse_return_payload(payload):
+    invoice_no = (payload.get("invoice_no") or "").strip()
+    payment_mode = (payload.get("payment_mode") or "").strip()
+    items = payload.get("items") or []
+
+    if not invoice_no:
+        raise ReturnError("Invoice number is required")
+    if payment_mode not in ALLOWED_PAYMENT_MODES:
+        raise ReturnError("Invalid payment mode")
+    if not items:
+        raise ReturnError("No items selected")
+    return invoice_no, payment_mode, items
+
+
+def parse_exchange_payload(payload):
+    invoice_no = (payload.get("invoice_no") or "").strip()
+    payment_mode = (payload.get("payment_mode") or "").strip()
+    return_items = payload.get("return_items") or []
+    new_items = payload.get("new_items") or []
+    # Optional discount percent applied to new exchange items
+    try:
+        discount_percent = float(payload.get("discount_percent") or 0)
+        if discount_percent < 0:
+            discount_percent = 0.0
+    except Exception:
+        discount_percent = 0.0
+
+    if not invoice_no:
+        raise ReturnError("Invoice number is required")
+    if payment_mode not in ALLOWED_PAYMENT_MODES:
+        raise ReturnError("Invalid payment mode")
+    if not return_items:
+        raise ReturnError("At least one item must be returned")
+    return invoice_no, payment_mode, return_items, new_items, discount_percent
+
+# =====================================================
+# TRANSACTIONS (caller owns commit/rollback)
+# =====================================================
+def _load_sold_items(cursor, invoice_no):
+    statements.execute(cursor, "sale_exists", (invoice_no,))
+    if not cursor.fetchone():
+        month = partitions.archived_month(cursor, invoice_no)
+        if month:
+            raise ReturnError(f"Invoice is past the {partitions.RETURN_WINDOW_DAYS}-day return window (archived {month:%b %Y})")
+        raise ReturnError("Invoice not found", 404)
+
+    sold_items = load_returnable_items(cursor, invoice_no)
+    if not sold_items:
+        raise ReturnError("No items found for invoice")
+    return sold_items
+
+
+def _till_context(cursor, staff_id, stall_id):
+    """(staff_id, stall_location, business_date) stamped on returns and settlements, as checkout does for sales."""
+    stall = stalls.get(cursor, stall_id)
+    if stall is None:
+        raise ReturnError("Unknown stall - log in again")
+    return staff_id, stall["name"], date.today()
+
+
+def _restock_returned(cursor, ref, invoice_no, payment_mode, return_type, sold_items, design_id, size, qty,
+                      stall_id, till):
+    """Validate one returned line, put it back in stock and log it. Returns the refund value."""
+    key = (design_id, size)
+    if key not in sold_items:
+        raise ReturnError(f"Item {design_id}-{size} not in invoice")
+
+    allowed = sold_items[key]["returnable"]
+    if qty <= 0 or qty > allowed:
+        raise ReturnError(f"Invalid qty for {design_id}-{size}. Max {allowed}")
+
+    unit_price = Decimal(str(sold_items[key]["unit_price"]))
+    line_refund = unit_price * qty
+
+    reason = "RETURN" if return_type == "RETURN" else "EXCHANGE_IN"
+    # back into the pool of the stall taking the item, whichever stall sold it
+    if not stock_ledger.record(cursor, stall_id, design_id, size, qty, reason, ref, till[0]):
+        raise RuntimeError(f"Stock row missing for design {design_id} size {size}")
+
+    statements.execute(
+        cursor, "insert_return",
+        (ref, invoice_no, design_id, size, qty, line_refund, return_type, payment_mode, *till)
+    )
+    return line_refund
+
+
+def process_return(cursor, invoice_no, payment_mode, items, staff_id=None, stall_id=None):
+    sold_items = _load_sold_items(cursor, invoice_no)
+    stall_id = stall_id or stalls.DEFAULT_STALL_ID
+    till = _till_context(cursor, staff_id, stall_id)
+
+    ref = generate_ref("RET")
+    total_refund = Decimal("0.00")
+    processed = []
+
+    for item in items:
+        try:
+            design_id = int(item.get("design_id"))
+            size = (item.get("size") or "").strip()
+            qty = int(item.get("quantity"))
+        except Exception:
+            raise ReturnError("Invalid item payload")
+
+        line_refund = _restock_returned(
+            cursor, ref, invoice_no, payment_mode, "RETURN", sold_items, design_id, size, qty, stall_id, till
+        )
+        total_refund += line_refund
+
+        processed.append({
+            "design_id": design_id,
+            "size": size,
+            "quantity": qty,
+            "refund_amount": float(line_refund)
+        })
+
+    result = {
+        "return_ref": ref,
+        "total_refund": float(total_refund),
+        "items": processed
+    }
+    outbox.emit(cursor, "return.created", ref, {
+        **result,
+        "invoice_no": invoice_no,
+        "payment_mode": payment_mode,
+        "stall_id": stall_id,
+        "staff_id": till[0],
+        "business_date": till[2].isoformat(),
+    }, till[1])
+    return result
+
+
+def process_exchange(cursor, invoice_no, payment_mode, return_items, new_items, discount_percent, staff_id=None,
+                     stall_id=None):
+    sold_items = _load_sold_items(cursor, invoice_no)
+    stall_id = stall_id or stalls.DEFAULT_STALL_ID
+    till = _till_context(cursor, staff_id, stall_id)
+
+    # Map design price for new items
+    cursor.execute("SELECT design_id, price FROM designs")
+    design_price_map = {row["design_id"]: Decimal(str(row["price"])) for row in cursor.fetchall()}
+
+    exc_ref = generate_ref("EXC")
+    returned_total = Decimal("0.00")
+    new_total = Decimal("0.00")
+
+    # (design_id, size, units) for the outbox event: returned lines negative, new ones positive
+    moved = []
+
+    # Handle returned items first (stock + refund credit)
+    for item in return_items:
+        design_id = int(item.get("design_id"))
+        size = (item.get("size") or "").strip()
+        qty = int(item.get("quantity"))
+        moved.append((design_id, size, -qty))
+
+        returned_total += _restock_returned(
+            cursor, exc_ref, invoice_no, payment_mode, "EXCHANGE", sold_items, design_id, size, qty, stall_id, till
+        )
+
+    # Handle new items (stock - and record in exchange_details)
+    for item in new_items:
+        design_id = int(item.get("design_id"))
+        size = (item.get("size") or "").strip()
+        qty = int(item.get("quantity"))
+
+        if qty <= 0:
+            raise ReturnError("Quantity must be positive for new items")
+
+        if design_id not in design_price_map:
+            raise ReturnError(f"Design {design_id} not found")
+
+        unit_price = design_price_map[design_id]
+
+        stock_ledger.lock_item(cursor, stall_id, design_id, size)
+        available = stock_ledger.current_stock(cursor, stall_id, design_id, size)
+        if available is None:
+            raise ReturnError(f"No stock row for {design_id}-{size}")
+        if available < qty:
+            raise ReturnError(f"Insufficient stock for {design_id}-{size}")
+
+        stock_ledger.record(cursor, stall_id, design_id, size, -qty, "EXCHANGE_OUT", exc_ref, staff_id)
+
+        line_total = unit_price * qty
+        new_total += line_total
+
+        cursor.execute(
+            """
+            INSERT INTO exchange_details
+            (exchange_ref, invoice_no, design_id, size, quantity, unit_price, line_total)
+            VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """,
+            (exc_ref, invoice_no, design_id, size, qty, unit_price, line_total)
+        )
+        moved.append((design_id, size, qty))
+
+    # Apply discount on new items total for settlement purpose
+    discount_amount = (new_total * Decimal(str(discount_percent))) / Decimal("100")
+    new_total_after_discount = new_total - discount_amount
+
+    diff = returned_total - new_total_after_discount
+    if diff > 0:
+        settlement = {"type": "REFUND", "amount": float(diff)}
+    elif diff < 0:
+        settlement = {"type": "COLLECT", "amount": float(abs(diff))}
+    else:
+        settlement = {"type": "EVEN", "amount": 0.0}
+
+    # the money that changed hands, for the end-of-day till (backend/till.py)
+    cursor.execute(
+        """
+        INSERT INTO exchange_settlements
+        (exchange_ref, invoice_no, settlement_type, amount, returned_total, new_total,
+         discount_amount, payment_mode, staff_id, stall_location, business_date)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        """,
+        (exc_ref, invoice_no, settlement["type"], abs(diff), returned_total, new_total,
+         discount_amount, payment_mode, *till)
+    )
+
+    result = {
+        "exchange_ref": exc_ref,
+        "returned_total": float(returned_total),
+        "new_total": float(new_total),
+        "discount_percent": discount_percent,
+        "discount_amount": float(discount_amount),
+        "settlement": settlement,
+        "payment_mode": payment_mode
+    }
+    outbox.emit(cursor, "exchange.created", exc_ref, {
+        **result,
+        "discount_percent": float(discount_percent),
+        "invoice_no": invoice_no,
+        "returned_items": [{"design_id": d, "size": s, "quantity": -q} for d, s, q in moved if q < 0],
+        "new_items": [{"design_id": d, "size": s, "quantity": q} for d, s, q in moved if q > 0],
+        "stall_id": stall_id,
+        "staff_id": till[0],
+        "business_date": till[2].isoformat(),
+    }, till[1])
+    return result
+
+# =====================================================
+# ENTRY POINTS (payload in, (body, status) out)
+# =====================================================
+def _run(process, *args):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        result = process(cursor, *args)
+        conn.commit()
+        return result, 200
+    except ReturnError as exc:
+        conn.rollback()
+        return {"error": exc.message}, exc.status
+    except Exception as exc:
+        conn.rollback()
+        return {"error": str(exc)}, 500
+    finally:
+        cursor.close(); conn.close()
+
+
+def handle_return(payload, staff_id=None, stall_id=None):
+    try:
+        args = parse_return_payload(payload)
+    except ReturnError as exc:
+        return {"error": exc.message}, exc.status
+
+    body, status = _run(process_return, *args, staff_id, stall_id)
+    if status == 200:
+        metrics.REFUNDS.inc(type="RETURN")
+        metrics.REFUND_AMOUNT.inc(body["total_refund"], type="RETURN")
+    return body, status
+
+
+def handle_exchange(payload, staff_id=None, stall_id=None):
+    try:
+        args = parse_exchange_payload(payload)
+    except ReturnError as exc:
+        return {"error": exc.message}, exc.status
+
+    body, status = _run(process_exchange, *args, staff_id, stall_id)
+    if status == 200:
+        metrics.REFUNDS.inc(type="EXCHANGE")
+        metrics.REFUND_AMOUNT.inc(body["returned_total"], type="EXCHANGE")
+    return body, status
@@ -0,0 +1,242 @@
+"""
+SKU (barcode) index for the scan fast path.
+
+A SKU is "<design_code>-<size>", e.g. SD0042-M, printed on the tag:
+
+    python -m backend.sku labels > labels.csv     # sku, design, size, price
+
+Each process keeps sku -> design, size, price and live stock per stall
+in a dict.
+A background thread LISTENs on slaydrip_sku (database/migrations/
+0004_sku_notify.sql): whenever designs, design_stock or stock_movements
+change, the designs named in the notifications are reloaded, so a scan
+is a dict lookup with stock as of the last commit. A designs change also
+invalidates the catalog search index.
+
+create_app() starts the listener on each worker's first request (after
+the fork; the preloaded master never connects). Until it has loaded the
+index, or while it reconnects, lookups fall back to one query.
+"""
+import argparse
+import csv
+import logging
+import os
+import select
+import sys
+import threading
+import time
+
+from backend import catalog
+from backend.db import get_connection, get_listen_connection
+
+SKU_CHANNEL = "slaydrip_sku"
+LISTEN_TIMEOUT_SECONDS = 30
+RECONNECT_DELAY_SECONDS = 5
+# safety net for changes that bypass the triggers (e.g. a restored dump)
+FULL_RELOAD_SECONDS = float(os.environ.get("SKU_FULL_RELOAD_SECONDS", "900"))
+
+SKU_SQL = """
+    SELECT d.design_id, d.design_code, d.product_name, d.color, d.gender, d.price,
+           sl.size, sl.stall_id, sl.stock
+    FROM designs d
+    JOIN stock_levels sl ON sl.design_id = d.design_id
+"""
+
+log = logging.getLogger(__name__)
+
+
+def make_sku(design_code, size):
+    return f"{design_code}-{size}".upper()
+
+
+def normalize_sku(raw):
+    return (raw or "").strip().upper()
+
+
+def _entries(rows):
+    """sku -> entry, with one stock figure per stall ({stall_id: stock})."""
+    entries = {}
+    for row in rows:
+        sku = make_sku(row["design_code"], row["size"])
+        entry = entries.get(sku)
+        if entry is None:
+            entry = entries[sku] = {
+                "sku": sku,
+                "design_id": row["design_id"],
+                "design_code": row["design_code"],
+                "product_name": row["product_name"],
+                "color": row["color"],
+                "gender": row["gender"],
+                "size": row["size"],
+                "price": float(row["price"]),
+                "stock_by_stall": {},
+            }
+        entry["stock_by_stall"][row["stall_id"]] = row["stock"]
+    return entries
+
+
+def for_stall(entry, stall_id):
+    """The entry as one stall sees it: "stock" is that stall's pool (0 if it has no row)."""
+    out = {k: v for k, v in entry.items() if k != "stock_by_stall"}
+    out["stock"] = entry["stock_by_stall"].get(stall_id, 0)
+    return out
+
+# =====================================================
+# INDEX
+# =====================================================
+class SkuIndex:
+    def __init__(self):
+        self._items = {}       # sku -> entry
+        self._by_design = {}   # design_id -> {sku}
+        self.ready = False
+
+    def get(self, sku):
+        return self._items.get(sku)
+
+    def load_all(self, cursor):
+        cursor.execute(SKU_SQL)
+        items, by_design = _entries(cursor.fetchall()), {}
+        for entry in items.values():
+            by_design.setdefault(entry["design_id"], set()).add(entry["sku"])
+        # swap whole dicts: readers never see a half-built index
+        self._items, self._by_design = items, by_design
+        self.ready = True
+
+    def reload_designs(self, cursor, design_ids):
+        """Refresh a few designs in place (only the listener thread writes)."""
+        cursor.execute(SKU_SQL + " WHERE d.design_id = ANY(%s)", (list(design_ids),))
+        fresh = {}
+        for entry in _entries(cursor.fetchall()).values():
+            fresh.setdefault(entry["design_id"], {})[entry["sku"]] = entry
+        for design_id in design_ids:
+            entries = fresh.get(design_id, {})
+            for sku in self._by_design.get(design_id, set()) - entries.keys():
+                self._items.pop(sku, None)
+            self._items.update(entries)
+            if entries:
+                self._by_design[design_id] = set(entries)
+            else:
+                self._by_design.pop(design_id, None)
+
+
+INDEX = SkuIndex()
+
+# =====================================================
+# LISTENER
+# =====================================================
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _parse_payloads(notifies):
+    design_ids, designs_changed = set(), False
+    for notify in notifies:
+        table, _, design_id = notify.payload.partition(":")
+        if design_id.isdigit():
+            design_ids.add(int(design_id))
+        designs_changed = designs_changed or table == "designs"
+    return design_ids, designs_changed
+
+
+def _listen_forever():
+    while True:
+        conn = None
+        try:
+            conn = get_listen_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {SKU_CHANNEL}")
+            # LISTEN first, then load: nothing committed in between is missed
+            INDEX.load_all(cursor)
+            loaded_at = time.monotonic()
+            while True:
+                if time.monotonic() - loaded_at >= FULL_RELOAD_SECONDS:
+                    INDEX.load_all(cursor)
+                    loaded_at = time.monotonic()
+                if select.select([conn], [], [], LISTEN_TIMEOUT_SECONDS) == ([], [], []):
+                    cursor.execute("SELECT 1")  # keepalive; surfaces a dead connection
+                    continue
+                conn.poll()
+                design_ids, designs_changed = _parse_payloads(conn.notifies)
+                conn.notifies.clear()
+                if design_ids:
+                    INDEX.reload_designs(cursor, design_ids)
+                if designs_changed:
+                    catalog.invalidate()
+        except Exception:
+            INDEX.ready = False
+            log.exception("SKU listener lost its connection; retrying in %ss", RECONNECT_DELAY_SECONDS)
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+        time.sleep(RECONNECT_DELAY_SECONDS)
+
+
+def ensure_listener():
+    """Start this process's listener thread (after a fork the parent's thread is gone)."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        INDEX.ready = False
+        threading.Thread(target=_listen_forever, name="sku-listener", daemon=True).start()
+        _listener_pid = os.getpid()
+
+# =====================================================
+# LOOKUP
+# =====================================================
+def lookup(sku, stall_id):
+    """Entry for a SKU at a stall (None if unknown): the in-memory index, or one query until it is ready."""
+    sku = normalize_sku(sku)
+    ensure_listener()
+    if INDEX.ready:
+        entry = INDEX.get(sku)
+        return for_stall(entry, stall_id) if entry else None
+
+    design_code, _, size = sku.rpartition("-")
+    if not design_code:
+        return None
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            SKU_SQL + " WHERE UPPER(d.design_code) = %s AND UPPER(sl.size) = %s",
+            (design_code, size)
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    entries = _entries(rows)
+    return for_stall(next(iter(entries.values())), stall_id) if entries else None
+
+# =====================================================
+# CLI
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("labels", help="CSV of every SKU for the tag printer")
+    args = parser.parse_args()
+
+    if args.command == "labels":
+        conn = get_connection(readonly=True)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SKU_SQL + " ORDER BY d.design_code, sl.size")
+            writer = csv.writer(sys.stdout)
+            writer.writerow(["sku", "design_code", "product_name", "color", "size", "price"])
+            # one tag per SKU, however many stalls stock it
+            for entry in _entries(cursor.fetchall()).values():
+                writer.writerow([
+                    entry["sku"], entry["design_code"],
+                    entry["product_name"], entry["color"], entry["size"], entry["price"],
+                ])
+        finally:
+            cursor.close()
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+import psycopg2
+from psycopg2 import extensions
+
+# =====================================================
+# SETTINGS
+# =====================================================
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+EXPLAIN_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", os.path.join(BASE_DIR, "logs", "slow_queries.jsonl"))
+
+_logger = logging.getLogger("slaydrip.slow_queries")
+_logger.propagate = False
+_logger_lock = threading.Lock()
+_explained = set()
+
+# =====================================================
+# NORMALIZATION
+# =====================================================
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(query) -> str:
+    """Collapse a statement to its shape: literals and placeholders become '?'."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    sql = _COMMENT_RE.sub(" ", str(query))
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def param_shape(vars):
+    """Types (never values) of the bound parameters."""
+    if vars is None:
+        return None
+    if isinstance(vars, dict):
+        return {key: type(value).__name__ for key, value in vars.items()}
+    return [type(value).__name__ for value in vars]
+
+# =====================================================
+# CAPTURE
+# =====================================================
+def _get_logger():
+    if _logger.handlers:
+        return _logger
+    with _logger_lock:
+        if not _logger.handlers:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+            handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=10 * 1024 * 1024, backupCount=1)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+            _logger.setLevel(logging.INFO)
+    return _logger
+
+
+def _explain(cursor, query, vars, normalized):
+    """
+    Sample a plan for a slow statement on the same connection.
+
+    Only SELECTs get ANALYZE/BUFFERS - running EXPLAIN ANALYZE on a write
+    would apply it twice. Everything runs inside a savepoint (or a throwaway
+    transaction in autocommit mode) so a failing EXPLAIN never poisons the
+    caller's transaction.
+    """
+    if normalized in _explained and random.random() >= EXPLAIN_SAMPLE_RATE:
+        return None
+    _explained.add(normalized)
+
+    conn = cursor.connection
+    if conn.get_transaction_status() not in (
+        extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_INTRANS
+    ):
+        return None
+
+    if conn.autocommit:
+        begin, undo = "BEGIN", ("ROLLBACK",)
+    else:
+        begin = "SAVEPOINT slow_query_explain"
+        undo = ("ROLLBACK TO SAVEPOINT slow_query_explain", "RELEASE SAVEPOINT slow_query_explain")
+
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if normalized.upper().startswith("SELECT") else "FORMAT JSON"
+    raw = conn.cursor(cursor_factory=extensions.cursor)
+    try:
+        statement = cursor.mogrify(query, vars)
+        raw.execute(begin)
+        try:
+            raw.execute(b"EXPLAIN (" + options.encode() + b") " + statement)
+            return raw.fetchone()[0]
+        finally:
+            for sql in undo:
+                raw.execute(sql)
+    except psycopg2.Error as exc:
+        return {"error": str(exc).strip()}
+    finally:
+        raw.close()
+
+
+def record_if_slow(cursor, query, vars, duration):
+    """Called by TimedCursor after every statement."""
+    duration_ms = duration * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+    try:
+        normalized = normalize_sql(query)
+        entry = {
+            "ts": time.time(),
+            "duration_ms": round(duration_ms, 3),
+            "sql": normalized,
+            "params": param_shape(vars),
+            "plan": _explain(cursor, query, vars, normalized),
+        }
+        _get_logger().info(json.dumps(entry, default=str))
+    except Exception:
+        # capture is best effort; never fail the request because of it
+        logging.getLogger(__name__).exception("slow query capture failed")
+
+# =====================================================
+# REPORTING
+# =====================================================
+def _read_entries():
+    for path in (SLOW_QUERY_LOG + ".1", SLOW_QUERY_LOG):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def top_offenders(limit=20):
+    """Aggregate the log by normalized SQL, worst total time first."""
+    stats = {}
+    for entry in _read_entries():
+        row = stats.setdefault(entry["sql"], {
+            "sql": entry["sql"],
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "params": entry.get("params"),
+            "last_seen": 0,
+            "plan": None,
+        })
+        row["count"] += 1
+        row["total_ms"] += entry["duration_ms"]
+        row["max_ms"] = max(row["max_ms"], entry["duration_ms"])
+        row["last_seen"] = max(row["last_seen"], entry["ts"])
+        if entry.get("plan"):
+            row["plan"] = entry["plan"]
+
+    rows = sorted(stats.values(), key=lambda r: r["total_ms"], reverse=True)[:limit]
+    for row in rows:
+        row["mean_ms"] = row["total_ms"] / row["count"]
+        row["plan_text"] = json.dumps(row["plan"], indent=2) if row["plan"] else ""
+    return rows
@@ -0,0 +1,243 @@
+"""
+Stalls: per-stall settings, invoice sequences and stock pools.
+
+Each stall (database/migrations/0007_stalls.sql) has its own discount and
+GST settings, its own invoice counter row and its own design_stock /
+stock_movements rows, so tills at different stalls never wait on each
+other. Staff have a home stall; login binds it to the session, and the
+POS header switches it for that session only.
+
+Stock moves between stalls with a transfer: TRANSFER_OUT at the source,
+TRANSFER_IN at the destination, one ref, one transaction.
+
+    python -m backend.stalls list
+    python -m backend.stalls add "Phoenix Mall" --prefix PHX [--gst 5] [--discount 0]
+    python -m backend.stalls transfer --from "Main Store" --to "Phoenix Mall" 42:M:10 43:L:5
+
+POST /api/transfers does the same from the session's stall.
+"""
+import argparse
+import json
+import re
+import sys
+
+from backend import returns, statements, stock_ledger
+from backend.db import get_connection
+
+DEFAULT_STALL_ID = 1  # the store as it was before stalls; old sessions land here
+_PREFIX_RE = re.compile(r"^[A-Z]{2,6}$")
+
+STALL_COLUMNS = "stall_id, name, invoice_prefix, discount_percent, gst_percent, is_active"
+
+
+class TransferError(Exception):
+    """A rejected transfer; message is shown to the cashier."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+# =====================================================
+# LOOKUPS
+# =====================================================
+def get(cursor, stall_id):
+    cursor.execute(f"SELECT {STALL_COLUMNS} FROM stalls WHERE stall_id=%s", (stall_id,))
+    return cursor.fetchone()
+
+
+def by_name(cursor, name):
+    cursor.execute(f"SELECT {STALL_COLUMNS} FROM stalls WHERE name=%s", (name,))
+    return cursor.fetchone()
+
+
+def list_active(cursor):
+    cursor.execute(f"SELECT {STALL_COLUMNS} FROM stalls WHERE is_active ORDER BY name")
+    return cursor.fetchall()
+
+
+def next_invoice(cursor, stall_id):
+    """
+    Claim the stall's next invoice number. The counter row stays locked
+    until commit - but only this stall's checkouts queue behind it.
+    Returns (invoice_no, stall row with the settings checkout needs).
+    """
+    statements.execute(cursor, "next_invoice_number", (stall_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise RuntimeError(f"No invoice counter for stall {stall_id}")
+    return f"{row['invoice_prefix']}-{row['last_number']:05d}", row
+
+# =====================================================
+# ADMIN
+# =====================================================
+def add(cursor, name, prefix, gst_percent=5, discount_percent=0):
+    """
+    New stall with its counter and an empty stock row for every design/size
+    in the catalog. Returns the stall row.
+    """
+    name, prefix = name.strip(), prefix.strip().upper()
+    if not name:
+        raise ValueError("Stall name is required")
+    if not _PREFIX_RE.match(prefix):
+        raise ValueError("Invoice prefix must be 2-6 letters")
+    cursor.execute(f"""
+        INSERT INTO stalls (name, invoice_prefix, gst_percent, discount_percent)
+        VALUES (%s, %s, %s, %s)
+        RETURNING {STALL_COLUMNS}
+    """, (name, prefix, gst_percent, discount_percent))
+    stall = cursor.fetchone()
+    cursor.execute("INSERT INTO stall_invoice_counters (stall_id, last_number) VALUES (%s, 0)", (stall["stall_id"],))
+    cursor.execute("""
+        INSERT INTO design_stock (stall_id, design_id, size, stock)
+        SELECT DISTINCT %s, design_id, size, 0 FROM design_stock
+        ON CONFLICT (stall_id, design_id, size) DO NOTHING
+    """, (stall["stall_id"],))
+    return stall
+
+# =====================================================
+# TRANSFERS
+# =====================================================
+def _ensure_stock_row(cursor, stall_id, design_id, size):
+    """Stock row at the destination; only for design/sizes some stall already stocks."""
+    cursor.execute("""
+        INSERT INTO design_stock (stall_id, design_id, size, stock)
+        SELECT %s, %s, %s, 0
+        WHERE EXISTS (SELECT 1 FROM design_stock WHERE design_id=%s AND size=%s)
+        ON CONFLICT (stall_id, design_id, size) DO NOTHING
+    """, (stall_id, design_id, size, design_id, size))
+
+
+def parse_transfer_items(items):
+    """[{"design_id", "size", "quantity"}] -> sorted [(design_id, size, qty)], one line per design/size."""
+    if not isinstance(items, list) or not items:
+        raise TransferError("Nothing to transfer")
+    folded = {}
+    for item in items:
+        try:
+            key = (int(item.get("design_id")), (item.get("size") or "").strip())
+            qty = int(item.get("quantity"))
+        except Exception:
+            raise TransferError("Invalid item payload")
+        if qty <= 0 or not key[1]:
+            raise TransferError(f"Invalid qty for {key[0]}-{key[1]}")
+        folded[key] = folded.get(key, 0) + qty
+    # sorted: concurrent transfers take the per-item locks in the same order
+    return [(design_id, size, qty) for (design_id, size), qty in sorted(folded.items())]
+
+
+def transfer(cursor, from_stall_id, to_stall, lines, staff_id=None):
+    """Move [(design_id, size, qty)] from one stall's stock to another's (`to_stall` is a name)."""
+    source = get(cursor, from_stall_id)
+    target = by_name(cursor, (to_stall or "").strip())
+    if source is None:
+        raise TransferError("Unknown source stall")
+    if target is None or not target["is_active"]:
+        raise TransferError(f"Unknown stall {to_stall!r}")
+    if target["stall_id"] == source["stall_id"]:
+        raise TransferError("Source and destination are the same stall")
+
+    ref = returns.generate_ref("TRF")
+    moved = []
+    for design_id, size, qty in lines:
+        stock_ledger.lock_item(cursor, source["stall_id"], design_id, size)
+        available = stock_ledger.current_stock(cursor, source["stall_id"], design_id, size)
+        if available is None:
+            raise TransferError(f"No stock row for {design_id}-{size} at {source['name']}")
+        if available < qty:
+            raise TransferError(f"Only {available} of {design_id}-{size} at {source['name']}")
+        _ensure_stock_row(cursor, target["stall_id"], design_id, size)
+        stock_ledger.record(cursor, source["stall_id"], design_id, size, -qty, "TRANSFER_OUT", ref, staff_id)
+        stock_ledger.record(cursor, target["stall_id"], design_id, size, qty, "TRANSFER_IN", ref, staff_id)
+        moved.append({"design_id": design_id, "size": size, "quantity": qty})
+
+    return {
+        "transfer_ref": ref,
+        "from_stall": source["name"],
+        "to_stall": target["name"],
+        "items": moved,
+    }
+
+
+def handle_transfer(payload, from_stall_id, staff_id=None):
+    """Payload in ({"to_stall", "items"}), (body, status) out - same contract as the return handlers."""
+    try:
+        lines = parse_transfer_items(payload.get("items"))
+    except TransferError as exc:
+        return {"error": exc.message}, exc.status
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        body = transfer(cursor, from_stall_id, payload.get("to_stall"), lines, staff_id)
+        conn.commit()
+    except TransferError as exc:
+        conn.rollback()
+        return {"error": exc.message}, exc.status
+    except Exception as exc:
+        conn.rollback()
+        return {"error": str(exc)}, 500
+    finally:
+        cursor.close()
+        conn.close()
+    return body, 200
+
+# =====================================================
+# CLI
+# =====================================================
+def _line(value):
+    """'42:M:10' -> {"design_id": 42, "size": "M", "quantity": 10}"""
+    try:
+        design_id, size, qty = value.split(":")
+        return {"design_id": int(design_id), "size": size, "quantity": int(qty)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected DESIGN_ID:SIZE:QTY, got {value!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    new = sub.add_parser("add")
+    new.add_argument("name")
+    new.add_argument("--prefix", required=True, help="invoice number prefix, 2-6 letters (e.g. PHX -> PHX-00001)")
+    new.add_argument("--gst", type=float, default=5)
+    new.add_argument("--discount", type=float, default=0)
+    move = sub.add_parser("transfer")
+    move.add_argument("--from", dest="from_stall", required=True)
+    move.add_argument("--to", dest="to_stall", required=True)
+    move.add_argument("lines", nargs="+", type=_line, metavar="DESIGN_ID:SIZE:QTY")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if args.command == "list":
+            for stall in list_active(cursor):
+                print(f"{stall['stall_id']:>4} {stall['invoice_prefix']:<6} {stall['name']:<30} "
+                      f"GST {stall['gst_percent']}%  discount {stall['discount_percent']}%")
+
+        elif args.command == "add":
+            try:
+                stall = add(cursor, args.name, args.prefix, args.gst, args.discount)
+            except ValueError as exc:
+                sys.exit(str(exc))
+            conn.commit()
+            print(f"Added stall {stall['stall_id']} {stall['name']} ({stall['invoice_prefix']}-00001 onwards)")
+
+        elif args.command == "transfer":
+            source = by_name(cursor, args.from_stall)
+            conn.rollback()
+            if source is None:
+                sys.exit(f"Unknown stall {args.from_stall!r}")
+            body, status = handle_transfer({"to_stall": args.to_stall, "items": args.lines}, source["stall_id"])
+            print(json.dumps(body, indent=2))
+            if status != 200:
+                sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Registry of the hot SQL, executed as server-side prepared statements.
+
+Each statement is PREPAREd once per physical (pooled) connection and then
+run with EXECUTE, so Postgres skips parsing and - once it settles on a
+generic plan - planning. Enable with DB_PREPARED_STATEMENTS=1.
+
+Leave it off behind a transaction-mode pooler (Neon's "-pooler" host,
+PgBouncer): SQL-level PREPARE is tied to one server session, which such
+poolers don't guarantee. Point DATABASE_URL at the direct endpoint first.
+With it off, execute() runs the same SQL as a plain statement.
+"""
+import os
+import re
+import threading
+import time
+
+from backend import metrics
+
+PREPARED_STATEMENTS = os.environ.get("DB_PREPARED_STATEMENTS") == "1"
+
+# =====================================================
+# STATEMENTS (%s placeholders, positional)
+# =====================================================
+RETURNABLE_ITEMS_SQL = """
+    SELECT
+        si.design_id,
+        si.size,
+        si.quantity AS sold_qty,
+        si.price AS unit_price,
+        d.design_code,
+        d.product_name,
+        d.color,
+        COALESCE(r.total_returned, 0) AS already_returned
+    FROM sale_items si
+    JOIN designs d ON d.design_id = si.design_id
+    LEFT JOIN (
+        SELECT invoice_no, design_id, size, SUM(quantity) AS total_returned
+        FROM returns
+        WHERE invoice_no = %s
+        GROUP BY invoice_no, design_id, size
+    ) r
+    ON r.invoice_no = si.invoice_no AND r.design_id = si.design_id AND r.size = si.size
+    WHERE si.invoice_no = %s
+"""
+
+# row_version changes whenever the /api/invoice payload can: the sale row,
+# a new return against it, or an edit to one of its designs (backend/http_cache.py)
+INVOICE_SUMMARY_SQL = """
+    SELECT s.invoice_no, s.customer_name, s.phone, s.bill_date, s.payment_mode, s.total_amount,
+           CONCAT_WS(':',
+               s.xmin::text,
+               (SELECT COUNT(*) || '.' || COALESCE(MAX(r.id), 0) FROM returns r WHERE r.invoice_no = s.invoice_no),
+               (SELECT string_agg(DISTINCT d.xmin::text, '.' ORDER BY d.xmin::text)
+                FROM sale_items si JOIN designs d ON d.design_id = si.design_id
+                WHERE si.invoice_no = s.invoice_no)
+           ) AS row_version
+    FROM sales s
+    WHERE s.invoice_no=%s
+"""
+
+STATEMENTS = {
+    # stock changes are ledger inserts (backend/stock_ledger.py); the
+    # EXISTS keeps a typo'd design/size from inventing a stock row
+    "stock_movement": """
+        INSERT INTO stock_movements (stall_id, design_id, size, delta, reason, ref, staff_id)
+        SELECT %s::integer, %s::integer, %s::varchar, %s::integer, %s::varchar, %s::varchar, %s::integer
+        WHERE EXISTS (SELECT 1 FROM design_stock WHERE stall_id=%s AND design_id=%s AND size=%s)
+    """,
+    "stock_for_size": "SELECT stock FROM stock_levels WHERE stall_id=%s AND design_id=%s AND size=%s",
+    # per-stall counter: the row lock only queues checkouts of the same stall
+    "next_invoice_number": """
+        UPDATE stall_invoice_counters c
+        SET last_number = c.last_number + 1
+        FROM stalls s
+        WHERE c.stall_id = %s AND s.stall_id = c.stall_id
+        RETURNING c.last_number, s.stall_id, s.name, s.invoice_prefix, s.gst_percent
+    """,
+    "insert_sale_item": """
+        INSERT INTO sale_items
+        (invoice_no, design_id, size, quantity, price)
+        VALUES (%s, %s, %s, %s, %s)
+    """,
+    "insert_return": """
+        INSERT INTO returns
+        (return_ref, invoice_no, design_id, size, quantity, refund_amount, return_type, payment_mode,
+         staff_id, stall_location, business_date)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    """,
+    # txid / created_at default to the writing transaction (backend/outbox.py)
+    "outbox_event": """
+        INSERT INTO outbox_events (event_type, ref, stall_location, payload)
+        VALUES (%s, %s, %s, %s)
+    """,
+    "sale_exists": "SELECT 1 FROM sales WHERE invoice_no=%s",
+    "sale_by_invoice": INVOICE_SUMMARY_SQL,
+    "returnable_items": RETURNABLE_ITEMS_SQL,
+}
+
+# =====================================================
+# EXECUTION
+# =====================================================
+_PARAM_RE = re.compile(r"%\((\w+)\)s|%s")
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def to_server_sql(sql):
+    """%s / %(name)s placeholders -> $1..$n for PREPARE (a repeated name keeps its number). Returns (sql, param_count)."""
+    count = [0]
+    named = {}
+
+    def number(match):
+        name = match.group(1)
+        if name is not None and name in named:
+            return f"${named[name]}"
+        count[0] += 1
+        if name is not None:
+            named[name] = count[0]
+        return f"${count[0]}"
+
+    return _PARAM_RE.sub(number, sql), count[0]
+
+
+_SERVER_SQL = {name: to_server_sql(sql) for name, sql in STATEMENTS.items()}
+
+
+def _record(name, prepared, prepared_now, duration):
+    with _stats_lock:
+        row = _stats.setdefault(name, {"prepares": 0, "executions": 0, "total_ms": 0.0})
+        row["prepares"] += prepared_now
+        row["executions"] += 1
+        row["total_ms"] += duration * 1000
+    metrics.PREPARED_EXECUTIONS.inc(statement=name, mode="prepared" if prepared else "plain")
+    if prepared_now:
+        metrics.PREPARED_PREPARES.inc(statement=name)
+
+
+def execute(cursor, name, params=(), prepared=None):
+    """Run registry statement `name` on cursor, preparing it on first use per connection."""
+    prepared = PREPARED_STATEMENTS if prepared is None else prepared
+    start = time.perf_counter()
+    if not prepared:
+        cursor.execute(STATEMENTS[name], params)
+        _record(name, False, 0, time.perf_counter() - start)
+        return cursor
+
+    conn = cursor.connection
+    server_sql, param_count = _SERVER_SQL[name]
+    prepared_now = 0
+    if name not in conn.prepared:
+        cursor.execute(f"PREPARE {name} AS {server_sql}")
+        conn.prepared.add(name)
+        prepared_now = 1
+    if param_count:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * param_count)})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+    _record(name, True, prepared_now, time.perf_counter() - start)
+    return cursor
+
+
+def stats(cursor=None):
+    """
+    Per-statement counters for this process. With a cursor, also the
+    server's plan-cache view (generic vs custom plans, PG 14+) for that
+    cursor's connection.
+    """
+    with _stats_lock:
+        local = {name: dict(row) for name, row in _stats.items()}
+    for row in local.values():
+        row["mean_ms"] = row["total_ms"] / row["executions"] if row["executions"] else None
+
+    server = []
+    if cursor is not None and PREPARED_STATEMENTS:
+        cursor.execute("""
+            SELECT name, prepare_time, generic_plans, custom_plans
+            FROM pg_prepared_statements
+            ORDER BY name
+        """)
+        server = cursor.fetchall()
+    return {"enabled": PREPARED_STATEMENTS, "statements": local, "server": server}
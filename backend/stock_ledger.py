@@ -0,0 +1,220 @@
+"""
+Append-only stock ledger (database/migrations/0003_stock_ledger.sql).
+
+Sales, returns and exchanges never UPDATE design_stock. They insert a
+stock_movements row, so popular designs stop being row-lock hot spots and
+every unit has a reason and a reference (invoice / return / exchange).
+
+    python -m backend.stock_ledger compact          # every few minutes from cron
+    python -m backend.stock_ledger reconcile [--fix]
+    python -m backend.stock_ledger history <design_id> [size]
+
+design_stock.stock holds the balance up to stock_ledger_state.compacted_through;
+stock_levels (and current_stock) adds the movements after it. Every
+balance and movement belongs to one stall's pool (backend/stalls.py).
+"""
+import argparse
+import sys
+
+from backend import metrics, statements
+from backend.db import get_connection
+
+REASONS = ("SALE", "RETURN", "EXCHANGE_IN", "EXCHANGE_OUT", "TRANSFER_IN", "TRANSFER_OUT", "IMPORT", "ADJUSTMENT")
+
+# =====================================================
+# WRITES
+# =====================================================
+def record(cursor, stall_id, design_id, size, delta, reason, ref=None, staff_id=None):
+    """Append one movement to a stall's pool. Returns False when the stall has no stock row for design/size."""
+    if reason not in REASONS:
+        raise ValueError(f"Unknown stock movement reason {reason!r}")
+    statements.execute(
+        cursor, "stock_movement",
+        (stall_id, design_id, size, delta, reason, ref, staff_id, stall_id, design_id, size)
+    )
+    if cursor.rowcount == 0:
+        return False
+    metrics.STOCK_MOVEMENTS.inc(reason=reason)
+    return True
+
+
+def lock_item(cursor, stall_id, design_id, size):
+    """
+    Serialize check-then-take for one design/size of a stall until commit.
+    Inserts don't lock anything, so two exchanges could otherwise both see
+    the last unit.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (design_id, f"{stall_id}:{size}"))
+
+
+def current_stock(cursor, stall_id, design_id, size):
+    """Compacted balance + tail, or None when the stall has no stock row."""
+    statements.execute(cursor, "stock_for_size", (stall_id, design_id, size))
+    row = cursor.fetchone()
+    return row["stock"] if row else None
+
+# =====================================================
+# COMPACTION
+# =====================================================
+def compact(conn):
+    """
+    Fold movements past the watermark into design_stock and advance it.
+
+    SHARE mode waits for in-flight inserts to commit and holds new ones
+    off until we commit, so no movement can commit below the new
+    watermark unseen. The tail is small, so the pause is short.
+    Returns (watermark, movements folded, rows updated).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("LOCK TABLE stock_movements IN SHARE MODE")
+        cursor.execute("SELECT compacted_through FROM stock_ledger_state WHERE id=1 FOR UPDATE")
+        start = cursor.fetchone()["compacted_through"]
+        cursor.execute("SELECT COALESCE(MAX(id), %s) AS upto, COUNT(*) AS n FROM stock_movements WHERE id > %s", (start, start))
+        row = cursor.fetchone()
+        upto, folded = row["upto"], row["n"]
+        updated = 0
+        if folded:
+            cursor.execute("""
+                UPDATE design_stock ds
+                SET stock = ds.stock + t.delta
+                FROM (
+                    SELECT stall_id, design_id, size, SUM(delta) AS delta
+                    FROM stock_movements
+                    WHERE id > %s AND id <= %s
+                    GROUP BY stall_id, design_id, size
+                ) t
+                WHERE ds.stall_id = t.stall_id AND ds.design_id = t.design_id AND ds.size = t.size
+                  AND t.delta <> 0
+            """, (start, upto))
+            updated = cursor.rowcount
+        cursor.execute(
+            "UPDATE stock_ledger_state SET compacted_through=%s, compacted_at=NOW() WHERE id=1",
+            (upto,)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return upto, folded, updated
+
+# =====================================================
+# RECONCILIATION
+# =====================================================
+RECONCILE_SQL = """
+    SELECT
+        ds.stall_id,
+        ds.design_id,
+        ds.size,
+        ds.stock AS compacted,
+        COALESCE(m.total, 0) AS ledger
+    FROM design_stock ds
+    LEFT JOIN (
+        SELECT stall_id, design_id, size, SUM(delta) AS total
+        FROM stock_movements
+        WHERE id <= %s
+        GROUP BY stall_id, design_id, size
+    ) m ON m.stall_id = ds.stall_id AND m.design_id = ds.design_id AND m.size = ds.size
+    WHERE ds.stock <> COALESCE(m.total, 0)
+    ORDER BY ds.stall_id, ds.design_id, ds.size
+"""
+
+
+def reconcile(conn, fix=False):
+    """
+    Compare every compacted balance with the full ledger up to the
+    watermark. The ledger is the source of truth: with fix=True the
+    balances are rewritten to match it. Returns (mismatches, negative
+    live levels).
+    """
+    cursor = conn.cursor()
+    try:
+        # same lock as compact(): the watermark can't move underneath us
+        cursor.execute("LOCK TABLE stock_movements IN SHARE MODE")
+        cursor.execute("SELECT compacted_through FROM stock_ledger_state WHERE id=1")
+        watermark = cursor.fetchone()["compacted_through"]
+        cursor.execute(RECONCILE_SQL, (watermark,))
+        mismatches = cursor.fetchall()
+        if fix:
+            for row in mismatches:
+                cursor.execute(
+                    "UPDATE design_stock SET stock=%s WHERE stall_id=%s AND design_id=%s AND size=%s",
+                    (row["ledger"], row["stall_id"], row["design_id"], row["size"])
+                )
+        cursor.execute(
+            "SELECT stall_id, design_id, size, stock FROM stock_levels WHERE stock < 0 ORDER BY stall_id, design_id, size"
+        )
+        negative = cursor.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return mismatches, negative
+
+
+def history(cursor, design_id, size=None, limit=50):
+    query = """
+        SELECT id, stall_id, size, delta, reason, ref, staff_id, created_at
+        FROM stock_movements
+        WHERE design_id=%s
+    """
+    params = [design_id]
+    if size:
+        query += " AND size=%s"
+        params.append(size)
+    query += " ORDER BY id DESC LIMIT %s"
+    params.append(limit)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+# =====================================================
+# CLI
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compact")
+    rec = sub.add_parser("reconcile")
+    rec.add_argument("--fix", action="store_true", help="rewrite compacted balances from the ledger")
+    hist = sub.add_parser("history")
+    hist.add_argument("design_id", type=int)
+    hist.add_argument("size", nargs="?")
+    hist.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        if args.command == "compact":
+            upto, folded, updated = compact(conn)
+            print(f"Folded {folded} movements into {updated} balances; watermark {upto}")
+
+        elif args.command == "reconcile":
+            mismatches, negative = reconcile(conn, fix=args.fix)
+            for row in mismatches:
+                print(f"MISMATCH stall {row['stall_id']} design {row['design_id']} {row['size']}: "
+                      f"balance {row['compacted']}, ledger {row['ledger']}")
+            for row in negative:
+                print(f"NEGATIVE stall {row['stall_id']} design {row['design_id']} {row['size']}: {row['stock']}")
+            if args.fix and mismatches:
+                print(f"Rewrote {len(mismatches)} balances from the ledger")
+            print(f"{len(mismatches)} mismatches, {len(negative)} negative levels")
+            if (mismatches and not args.fix) or negative:
+                sys.exit(1)
+
+        elif args.command == "history":
+            cursor = conn.cursor()
+            for row in history(cursor, args.design_id, args.size, args.limit):
+                print(f"{row['id']:>10} {row['created_at']:%Y-%m-%d %H:%M} stall {row['stall_id']:<3} "
+                      f"{row['size']:<4} {row['delta']:>+5} "
+                      f"{row['reason']:<12} {row['ref'] or ''}")
+            cursor.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+End-of-day till reconciliation.
+
+For one business day, the money that moved at every till, per stall,
+staff member and payment mode:
+
+    sales             + sales.total_amount
+    refunds           - returns.refund_amount          (return_type RETURN)
+    exchanges         + COLLECT / - REFUND settlements (exchange_settlements)
+    net               what the drawer / UPI / card terminal should show
+
+One query computes every row plus the per-stall and per-mode subtotals
+and the day total (GROUPING SETS). Closing a day freezes that report in
+till_closures (database/migrations/0005_till_reconciliation.sql); from
+then on the report is a primary-key lookup and never changes.
+
+    python -m backend.till report [--date YYYY-MM-DD]
+    python -m backend.till close --date YYYY-MM-DD   # a finished day; today only with --early
+
+Admins get the same at /admin/till.
+"""
+import argparse
+import json
+import sys
+from datetime import date
+
+from psycopg2.extras import Json
+
+from backend.db import get_connection
+
+RECONCILIATION_SQL = """
+    WITH movements AS (
+        SELECT s.stall_location, s.staff_id, s.payment_mode, 'sale' AS kind,
+               s.invoice_no AS ref, s.total_amount AS amount
+        FROM sales s
+        WHERE s.bill_date = %(day)s
+        UNION ALL
+        SELECT r.stall_location, r.staff_id, r.payment_mode, 'refund',
+               r.return_ref, -r.refund_amount
+        FROM returns r
+        WHERE r.business_date = %(day)s AND r.return_type = 'RETURN'
+        UNION ALL
+        SELECT e.stall_location, e.staff_id, e.payment_mode, 'exchange',
+               e.exchange_ref, CASE e.settlement_type WHEN 'COLLECT' THEN e.amount ELSE -e.amount END
+        FROM exchange_settlements e
+        WHERE e.business_date = %(day)s
+    )
+    SELECT
+        COALESCE(m.stall_location, 'Unknown') AS stall_location,
+        m.staff_id,
+        COALESCE(st.full_name, 'Unknown') AS staff_name,
+        m.payment_mode,
+        COUNT(*) FILTER (WHERE m.kind = 'sale') AS sales_count,
+        COALESCE(SUM(m.amount) FILTER (WHERE m.kind = 'sale'), 0) AS sales,
+        COUNT(DISTINCT m.ref) FILTER (WHERE m.kind = 'refund') AS refunds_count,
+        COALESCE(-SUM(m.amount) FILTER (WHERE m.kind = 'refund'), 0) AS refunds,
+        COUNT(*) FILTER (WHERE m.kind = 'exchange') AS exchanges_count,
+        COALESCE(SUM(m.amount) FILTER (WHERE m.kind = 'exchange'), 0) AS exchange_net,
+        COALESCE(SUM(m.amount), 0) AS net,
+        GROUPING(COALESCE(m.stall_location, 'Unknown'), m.staff_id, st.full_name, m.payment_mode) AS level
+    FROM movements m
+    LEFT JOIN staff st ON st.staff_id = m.staff_id
+    GROUP BY GROUPING SETS (
+        (COALESCE(m.stall_location, 'Unknown'), m.staff_id, st.full_name, m.payment_mode),
+        (COALESCE(m.stall_location, 'Unknown'), m.payment_mode),
+        (m.payment_mode),
+        ()
+    )
+    ORDER BY level, stall_location, staff_name, payment_mode
+"""
+
+# GROUPING() bitmask (stall, staff_id, staff_name, mode; 1 = rolled up) -> report section
+_LEVELS = {0b0000: "rows", 0b0110: "by_stall", 0b1110: "by_mode", 0b1111: "total"}
+_AMOUNTS = ("sales", "refunds", "exchange_net", "net")
+_COUNTS = ("sales_count", "refunds_count", "exchanges_count")
+
+
+def _shape(row, section):
+    out = {key: round(float(row[key]), 2) for key in _AMOUNTS}
+    out.update({key: row[key] for key in _COUNTS})
+    if section in ("rows", "by_stall"):
+        out["stall_location"] = row["stall_location"]
+    if section == "rows":
+        out["staff_id"] = row["staff_id"]
+        out["staff_name"] = row["staff_name"]
+    if section != "total":
+        out["payment_mode"] = row["payment_mode"]
+    return out
+
+
+def reconcile(cursor, day):
+    """The live report for `day`: {business_date, rows, by_stall, by_mode, total}."""
+    cursor.execute(RECONCILIATION_SQL, {"day": day})
+    report = {"business_date": day.isoformat(), "rows": [], "by_stall": [], "by_mode": [], "total": None}
+    for row in cursor.fetchall():
+        section = _LEVELS[row["level"]]
+        if section == "total":
+            report["total"] = _shape(row, section)
+        else:
+            report[section].append(_shape(row, section))
+    if report["total"] is None:  # nothing happened that day
+        report["total"] = {key: 0.0 for key in _AMOUNTS} | {key: 0 for key in _COUNTS}
+    return report
+
+# =====================================================
+# REPORT / CLOSE
+# =====================================================
+def get_report(day, readonly=True):
+    """
+    Frozen snapshot when the day is closed (one PK lookup), else the live
+    totals. readonly=False reads the primary, e.g. right after a close.
+    """
+    conn = get_connection(readonly=readonly)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT report, closed_by, closed_at FROM till_closures WHERE business_date=%s", (day,))
+        closure = cursor.fetchone()
+        if closure:
+            report = dict(closure["report"], closed=True, closed_by=closure["closed_by"],
+                          closed_at=closure["closed_at"].isoformat())
+        else:
+            report = dict(reconcile(cursor, day), closed=False)
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return report
+
+
+def close_day(day, staff_id=None, early=False):
+    """
+    Freeze `day`'s report. Closing twice is harmless: the first snapshot
+    wins and is returned. Today is still taking sales, so it only closes
+    with early=True. Returns (report, newly_closed).
+    """
+    if day > date.today():
+        raise ValueError("Cannot close a business day that has not started")
+    if day == date.today() and not early:
+        raise ValueError("Today is still trading; close it early only on purpose (sales after this are left out)")
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # one closer at a time; a second one waits, then finds the row
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('till_close'), %s)", (day.toordinal(),))
+        report = reconcile(cursor, day)
+        cursor.execute("""
+            INSERT INTO till_closures (business_date, report, closed_by)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (business_date) DO NOTHING
+            RETURNING business_date
+        """, (day, Json(report), staff_id))
+        newly_closed = cursor.fetchone() is not None
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return get_report(day, readonly=False), newly_closed
+
+# =====================================================
+# CLI
+# =====================================================
+def print_report(report, out=sys.stdout):
+    state = f"CLOSED {report['closed_at']}" if report["closed"] else "open"
+    print(f"Till {report['business_date']} ({state})", file=out)
+    header = f"{'stall':<18} {'staff':<16} {'mode':<5} {'sales':>11} {'refunds':>10} {'exchange':>10} {'net':>11}"
+    print(header, file=out)
+    for row in report["rows"]:
+        print(f"{row['stall_location'][:18]:<18} {row['staff_name'][:16]:<16} {row['payment_mode'] or '-':<5} "
+              f"{row['sales']:>11.2f} {row['refunds']:>10.2f} {row['exchange_net']:>10.2f} {row['net']:>11.2f}", file=out)
+    print("-" * len(header), file=out)
+    for row in report["by_mode"]:
+        print(f"{'':<18} {'all':<16} {row['payment_mode'] or '-':<5} "
+              f"{row['sales']:>11.2f} {row['refunds']:>10.2f} {row['exchange_net']:>10.2f} {row['net']:>11.2f}", file=out)
+    total = report["total"]
+    print(f"{'TOTAL':<18} {'':<16} {'':<5} {total['sales']:>11.2f} {total['refunds']:>10.2f} "
+          f"{total['exchange_net']:>10.2f} {total['net']:>11.2f}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("report", "close"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--date", type=date.fromisoformat, default=date.today(), help="business day (default today)")
+        cmd.add_argument("--json", action="store_true", help="print the report as JSON")
+        if name == "close":
+            cmd.add_argument("--early", action="store_true", help="allow closing today while sales may still come in")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report = get_report(args.date)
+    else:
+        try:
+            report, newly_closed = close_day(args.date, early=args.early)
+        except ValueError as exc:
+            sys.exit(str(exc))
+        if not newly_closed:
+            print(f"{args.date} was already closed; showing the frozen report", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
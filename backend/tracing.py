@@ -0,0 +1,328 @@
+"""
+Per-request tracing and on-demand cProfile capture.
+
+Every request collects spans - admission wait, pool acquire / connect,
+each SQL statement, pricing, PDF build, file write, template render -
+with their offsets from the request start. When the request finishes the
+trace is written as one JSON line to TRACE_LOG (rotating) if it was
+sampled (TRACE_SAMPLE_RATE) or took longer than TRACE_SLOW_MS, so the
+slow checkouts are always there to look at afterwards:
+
+    python -m backend.tracing slowest [--route /checkout] [--limit 10]
+    python -m backend.tracing show <trace_id>
+
+Profiling: an admin arms "the next N requests on <route>" (/admin/profiles
+or `python -m backend.tracing profile /checkout 5`). The arm file lives
+in PROFILE_DIR so every gunicorn worker sees it; each matching request
+runs under cProfile and is saved as a .prof file for snakeviz, flameprof
+or gprof2dot. Profiling covers the Flask tier only - cProfile can't tell
+interleaved coroutines apart.
+
+TRACING=0 turns span collection off.
+"""
+import argparse
+import contextvars
+import cProfile
+import fcntl
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from backend import metrics
+
+# =====================================================
+# SETTINGS
+# =====================================================
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TRACING = os.environ.get("TRACING", "1") != "0"
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "1000"))
+TRACE_LOG = os.environ.get("TRACE_LOG", os.path.join(BASE_DIR, "logs", "traces.jsonl"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, "logs", "profiles"))
+MAX_SPANS = 500  # a runaway loop shouldn't turn one trace line into megabytes
+
+_current = contextvars.ContextVar("slaydrip_trace", default=None)
+_logger = logging.getLogger("slaydrip.traces")
+_logger.propagate = False
+_logger_lock = threading.Lock()
+
+# =====================================================
+# SPANS
+# =====================================================
+class Trace:
+    def __init__(self, method, route):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.route = route
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, name, start, duration, attrs):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        span = {
+            "name": name,
+            "offset_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if attrs:
+            span.update(attrs)
+        self.spans.append(span)
+
+
+def start_trace(method, route):
+    """Begin collecting spans for the current request (thread or task)."""
+    if not TRACING:
+        return None
+    trace = Trace(method, route)
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def record_span(name, start, duration, **attrs):
+    """Attach a finished span (perf_counter start, seconds) to the current trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, start, duration, attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, start, time.perf_counter() - start, **attrs)
+
+
+def _stage_listener(stage, start, duration):
+    record_span(stage, start, duration)
+
+
+metrics.STAGE_LISTENERS.append(_stage_listener)
+
+
+def _get_logger():
+    if _logger.handlers:
+        return _logger
+    with _logger_lock:
+        if not _logger.handlers:
+            os.makedirs(os.path.dirname(TRACE_LOG), exist_ok=True)
+            handler = RotatingFileHandler(TRACE_LOG, maxBytes=20 * 1024 * 1024, backupCount=2)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+            _logger.setLevel(logging.INFO)
+    return _logger
+
+
+def finish_trace(status, profile=None):
+    """End the current trace; write it if sampled or slow. Returns the trace (or None)."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    _current.set(None)
+    duration_ms = (time.perf_counter() - trace.start) * 1000
+    slow = duration_ms >= TRACE_SLOW_MS
+    if not (trace.sampled or slow or profile):
+        return trace
+    try:
+        entry = {
+            "trace_id": trace.trace_id,
+            "ts": datetime.fromtimestamp(trace.started_at, timezone.utc).isoformat(timespec="milliseconds"),
+            "pid": os.getpid(),
+            "method": trace.method,
+            "route": trace.route,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "kept": "slow" if slow else ("profiled" if profile else "sampled"),
+            "spans": trace.spans,
+        }
+        if trace.dropped:
+            entry["dropped_spans"] = trace.dropped
+        if profile:
+            entry["profile"] = profile
+        _get_logger().info(json.dumps(entry, default=str))
+    except Exception:
+        # tracing is best effort; never fail the request because of it
+        logging.getLogger(__name__).exception("trace write failed")
+    return trace
+
+# =====================================================
+# PROFILE CAPTURE
+# =====================================================
+_ARM_FILE = os.path.join(PROFILE_DIR, "armed.json")
+_LOCK_FILE = os.path.join(PROFILE_DIR, "armed.lock")
+_arm_cache = {"mtime": None, "state": None}
+_SAFE_ROUTE_RE = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _read_arm():
+    try:
+        with open(_ARM_FILE, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_arm(state):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp = f"{_ARM_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, _ARM_FILE)
+
+
+@contextmanager
+def _arm_lock():
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_LOCK_FILE, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def arm_profile(route, count):
+    """Profile the next `count` requests on `route` (a URL rule such as /checkout)."""
+    with _arm_lock():
+        _write_arm({"route": route, "remaining": int(count), "armed_at": time.time()})
+
+
+def disarm_profile():
+    with _arm_lock():
+        try:
+            os.remove(_ARM_FILE)
+        except FileNotFoundError:
+            pass
+
+
+def armed():
+    state = _read_arm()
+    return state if state and state.get("remaining", 0) > 0 else None
+
+
+def claim_profile(route):
+    """
+    True if this request should be profiled (and takes one of the armed slots).
+
+    The common case is a stat() of the arm file; the lock is only taken
+    when the armed route matches.
+    """
+    try:
+        mtime = os.stat(_ARM_FILE).st_mtime_ns
+    except OSError:
+        return False
+    if mtime != _arm_cache["mtime"]:
+        _arm_cache["mtime"], _arm_cache["state"] = mtime, _read_arm()
+    state = _arm_cache["state"]
+    if not state or state.get("route") != route or state.get("remaining", 0) <= 0:
+        return False
+    with _arm_lock():
+        state = _read_arm()
+        if not state or state.get("route") != route or state.get("remaining", 0) <= 0:
+            return False
+        state["remaining"] -= 1
+        _write_arm(state)
+    return True
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def save_profile(profiler, route, trace=None):
+    """Stop the profiler and dump pstats data; returns the file name."""
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    name = _SAFE_ROUTE_RE.sub("_", route).strip("_") or "root"
+    filename = f"{name}-{stamp}-{trace.trace_id if trace else uuid.uuid4().hex[:16]}.prof"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+    return filename
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    rows = []
+    for filename in os.listdir(PROFILE_DIR):
+        if filename.endswith(".prof"):
+            stat = os.stat(os.path.join(PROFILE_DIR, filename))
+            rows.append({"filename": filename, "size": stat.st_size, "mtime": stat.st_mtime})
+    return sorted(rows, key=lambda r: r["mtime"], reverse=True)
+
+# =====================================================
+# REPORTING
+# =====================================================
+def read_traces():
+    for path in (TRACE_LOG + ".2", TRACE_LOG + ".1", TRACE_LOG):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _print_trace(entry):
+    print(f"{entry['trace_id']}  {entry['ts']}  {entry['method']} {entry['route']}  "
+          f"{entry['status']}  {entry['duration_ms']:.1f} ms  ({entry['kept']})")
+    for s in entry["spans"]:
+        extra = " ".join(f"{k}={v}" for k, v in s.items() if k not in ("name", "offset_ms", "duration_ms"))
+        print(f"    +{s['offset_ms']:>9.1f}  {s['duration_ms']:>9.1f} ms  {s['name']}  {extra}".rstrip())
+    if entry.get("profile"):
+        print(f"    profile: {os.path.join(PROFILE_DIR, entry['profile'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    slowest = sub.add_parser("slowest")
+    slowest.add_argument("--route")
+    slowest.add_argument("--limit", type=int, default=10)
+    show = sub.add_parser("show")
+    show.add_argument("trace_id")
+    prof = sub.add_parser("profile", help="arm cProfile for the next N requests on a route")
+    prof.add_argument("route")
+    prof.add_argument("count", type=int, nargs="?", default=5)
+    sub.add_parser("disarm")
+    args = parser.parse_args()
+
+    if args.command == "slowest":
+        entries = [e for e in read_traces() if not args.route or e["route"] == args.route]
+        for entry in sorted(entries, key=lambda e: e["duration_ms"], reverse=True)[:args.limit]:
+            _print_trace(entry)
+    elif args.command == "show":
+        for entry in read_traces():
+            if entry["trace_id"] == args.trace_id:
+                _print_trace(entry)
+    elif args.command == "profile":
+        arm_profile(args.route, args.count)
+        print(f"Profiling the next {args.count} requests on {args.route} -> {PROFILE_DIR}")
+    elif args.command == "disarm":
+        disarm_profile()
+
+
+if __name__ == "__main__":
+    main()
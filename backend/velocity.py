@@ -0,0 +1,460 @@
+"""
+Sales velocity and low-stock reorder ranking.
+
+Velocity is an exponentially decayed count of units sold per stall and
+design/size (sales_velocity, keyed by stall_id -
+database/migrations/0010_velocity_by_stall.sql):
+
+    decayed_units(today) = decayed_units(as_of) * DECAY ** (today - as_of) + units sold today
+    units_per_day        = decayed_units * (1 - DECAY)     # steady state of a constant daily rate
+
+with DECAY = 0.5 ** (1 / VELOCITY_HALF_LIFE_DAYS). Nothing here runs
+inside a checkout: `fold` consumes the sales outbox feed
+(backend/outbox.py) from where it stopped, so a till never waits on a
+velocity row. Returns subtract (never below 0) from the stall that made
+the sale, whichever stall took the item back.
+
+The ranking (reorder_ranking) orders every selling design/size by days
+of cover - stock / units_per_day - per stall against that stall's stock
+pool, and for all stalls together ("*") against their combined stock,
+with a suggested order quantity covering REORDER_LEAD_DAYS +
+REORDER_TARGET_DAYS. It is one set-based statement, rebuilt by the jobs
+below only; /api/reorder just reads it.
+
+    python -m backend.velocity fold           # cron, every few minutes: new feed events, then rank
+    python -m backend.velocity recompute      # nightly: refold the last weeks from stock_movements, then rank
+    python -m backend.velocity rank           # rebuild the ranking only
+    python -m backend.velocity show [--stall NAME] [--limit 20]
+
+recompute is the same fold done in bulk by Postgres over the whole
+catalog; it also corrects drift from the clamp at zero and drops items
+that stopped selling. It records the snapshot it read with, and fold
+skips events of transactions that snapshot already saw - nothing is
+counted twice. fold falls back to recompute on its first run and when
+it fell behind outbox retention.
+"""
+import argparse
+import math
+import os
+import sys
+from contextlib import contextmanager
+from datetime import date
+
+from backend import outbox
+from backend.db import get_connection
+
+HALF_LIFE_DAYS = float(os.environ.get("VELOCITY_HALF_LIFE_DAYS", "7"))
+DECAY = 0.5 ** (1 / HALF_LIFE_DAYS)
+# older sales weigh < 0.4% - not worth reading back in a recompute
+RECOMPUTE_WINDOW_DAYS = math.ceil(HALF_LIFE_DAYS * 8)
+LEAD_DAYS = float(os.environ.get("REORDER_LEAD_DAYS", "3"))
+TARGET_DAYS = float(os.environ.get("REORDER_TARGET_DAYS", "7"))
+FOLD_BATCH = 500
+MIN_UNITS_PER_DAY = 0.01
+ALL_STALLS = "*"
+
+# payload list -> sign of its quantities, per outbox event type
+EVENT_LINES = {
+    "sale.created": (("items", 1),),
+    "return.created": (("items", -1),),
+    "exchange.created": (("returned_items", -1), ("new_items", 1)),
+}
+
+# a line dated before the row's as_of is decayed to it instead
+RECORD_SQL = """
+    INSERT INTO sales_velocity AS v (stall_id, design_id, size, decayed_units, as_of)
+    SELECT u.stall_id, u.design_id, u.size, u.units, u.day
+    FROM unnest(%(stall_ids)s::integer[], %(design_ids)s::integer[], %(sizes)s::varchar[],
+                %(units)s::float8[], %(days)s::date[]) AS u(stall_id, design_id, size, units, day)
+    ON CONFLICT (stall_id, design_id, size) DO UPDATE
+    SET decayed_units = v.decayed_units * power(%(decay)s, GREATEST(0, EXCLUDED.as_of - v.as_of))
+                        + EXCLUDED.decayed_units * power(%(decay)s, GREATEST(0, v.as_of - EXCLUDED.as_of)),
+        as_of = GREATEST(v.as_of, EXCLUDED.as_of),
+        updated_at = NOW()
+"""
+
+# returns: only items the stall has sold have anything to take back
+UNRECORD_SQL = """
+    UPDATE sales_velocity v
+    SET decayed_units = GREATEST(0, v.decayed_units * power(%(decay)s, GREATEST(0, u.day - v.as_of))
+                                    + u.units * power(%(decay)s, GREATEST(0, v.as_of - u.day))),
+        as_of = GREATEST(v.as_of, u.day),
+        updated_at = NOW()
+    FROM unnest(%(stall_ids)s::integer[], %(design_ids)s::integer[], %(sizes)s::varchar[],
+                %(units)s::float8[], %(days)s::date[]) AS u(stall_id, design_id, size, units, day)
+    WHERE v.stall_id = u.stall_id AND v.design_id = u.design_id AND v.size = u.size
+"""
+
+# the stall an invoice was sold at: its SALE movements (ref = invoice_no)
+SALE_STALLS_SQL = """
+    SELECT DISTINCT ON (ref) ref AS invoice_no, stall_id
+    FROM stock_movements
+    WHERE ref = ANY(%s) AND reason = 'SALE'
+    ORDER BY ref, id
+"""
+
+# units sold = -delta of SALE / EXCHANGE_OUT. Returned units come from the
+# returns rows, off the stall of the invoice's SALE movement: the RETURN /
+# EXCHANGE_IN movements are at the stall that took the item back
+RECOMPUTE_SQL = """
+    WITH lines AS (
+        SELECT stall_id, design_id, size, -delta AS units, created_at::date AS day
+        FROM stock_movements
+        WHERE reason IN ('SALE', 'EXCHANGE_OUT')
+          AND created_at > %(today)s - %(window)s
+        UNION ALL
+        SELECT COALESCE(sold.stall_id, st.stall_id), r.design_id, r.size, -r.quantity, r.business_date
+        FROM returns r
+        LEFT JOIN LATERAL (
+            SELECT m.stall_id FROM stock_movements m
+            WHERE m.ref = r.invoice_no AND m.reason = 'SALE'
+            ORDER BY m.id LIMIT 1
+        ) sold ON TRUE
+        LEFT JOIN stalls st ON st.name = r.stall_location
+        WHERE r.business_date > %(today)s - %(window)s
+    )
+    INSERT INTO sales_velocity (stall_id, design_id, size, decayed_units, as_of)
+    SELECT stall_id, design_id, size,
+           GREATEST(0, SUM(units * power(%(decay)s, %(today)s - day))), %(today)s
+    FROM lines
+    WHERE stall_id IS NOT NULL
+    GROUP BY stall_id, design_id, size
+"""
+
+# hand the feed over at this snapshot: every event of an older transaction
+# is in the recompute (cursor text as outbox.format_cursor)
+HANDOFF_SQL = """
+    UPDATE velocity_state
+    SET feed_cursor = COALESCE(
+            (SELECT txid::text || '-' || id FROM outbox_events
+             WHERE txid < pg_snapshot_xmin(pg_current_snapshot())
+             ORDER BY txid DESC, id DESC LIMIT 1),
+            (SELECT compacted_txid::text || '-' || compacted_id FROM outbox_state WHERE id=1)),
+        recompute_snapshot = pg_current_snapshot(),
+        recomputed_at = NOW()
+    WHERE id=1
+"""
+
+RANK_SQL = """
+    WITH v AS (
+        SELECT stall_id, design_id, size,
+               decayed_units * power(%(decay)s, GREATEST(0, %(today)s - as_of)) * (1 - %(decay)s) AS units_per_day
+        FROM sales_velocity
+    ),
+    per_stall AS (
+        SELECT s.name AS stall_location, v.design_id, v.size, v.units_per_day
+        FROM v JOIN stalls s ON s.stall_id = v.stall_id
+        UNION ALL
+        SELECT %(all_stalls)s, design_id, size, SUM(units_per_day) FROM v GROUP BY design_id, size
+    ),
+    levels AS (
+        SELECT s.name AS stall_location, sl.design_id, sl.size, GREATEST(sl.stock, 0) AS stock
+        FROM stock_levels sl
+        JOIN stalls s ON s.stall_id = sl.stall_id
+    ),
+    stock AS (
+        SELECT stall_location, design_id, size, stock FROM levels
+        UNION ALL
+        SELECT %(all_stalls)s, design_id, size, SUM(stock) FROM levels GROUP BY design_id, size
+    ),
+    covered AS (
+        SELECT p.stall_location, p.design_id, p.size, p.units_per_day, k.stock,
+               k.stock / p.units_per_day AS days_of_cover
+        FROM per_stall p
+        JOIN stock k ON k.stall_location = p.stall_location AND k.design_id = p.design_id AND k.size = p.size
+        WHERE p.units_per_day >= %(min_rate)s
+    )
+    INSERT INTO reorder_ranking
+        (stall_location, rank, design_id, size, units_per_day, stock, days_of_cover, suggested_qty)
+    SELECT stall_location,
+           ROW_NUMBER() OVER (PARTITION BY stall_location ORDER BY days_of_cover, units_per_day DESC, design_id, size),
+           design_id, size, units_per_day, stock, days_of_cover,
+           GREATEST(0, CEIL(units_per_day * %(horizon)s) - stock)::integer
+    FROM covered
+"""
+
+RANKING_SQL = """
+    SELECT r.rank, r.design_id, d.design_code, d.product_name, d.color, r.size,
+           r.units_per_day, r.stock, r.days_of_cover, r.suggested_qty, r.computed_at
+    FROM reorder_ranking r
+    JOIN designs d ON d.design_id = r.design_id
+    WHERE r.stall_location = %s
+    ORDER BY r.rank
+    LIMIT %s
+"""
+
+# =====================================================
+# JOBS (one at a time, never inside a checkout)
+# =====================================================
+@contextmanager
+def _exclusive(conn):
+    """Session-level lock, so it spans the transactions a job commits in between."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(hashtext('sales_velocity'))")
+    conn.commit()
+    try:
+        yield
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(hashtext('sales_velocity'))")
+        conn.commit()
+        cursor.close()
+
+
+@contextmanager
+def _job_connection():
+    conn = get_connection()
+    try:
+        with _exclusive(conn):
+            yield conn
+    finally:
+        conn.close()
+
+
+def _visible_in(snapshot):
+    """pg_visible_in_snapshot() for 'xmin:xmax:xip,...' text, as txid -> bool (no snapshot: nothing)."""
+    if not snapshot:
+        return lambda txid: False
+    xmin, xmax, xip = snapshot.split(":")
+    running = {int(x) for x in xip.split(",") if x}
+    return lambda txid: txid < int(xmin) or (txid < int(xmax) and txid not in running)
+
+
+def _event_lines(event, sold_at=None):
+    """
+    Outbox event -> [(stall_id, design_id, size, units, day)]; units < 0 for
+    returned items, counted against the stall that sold them (sold_at:
+    invoice_no -> stall_id), else the stall that took them back.
+    """
+    payload = event["payload"]
+    day = date.fromisoformat(payload.get("bill_date") or payload["business_date"])
+    seller = (sold_at or {}).get(payload.get("invoice_no"), payload["stall_id"])
+    return [
+        (seller if sign < 0 else payload["stall_id"], int(item["design_id"]), item["size"],
+         sign * item["quantity"], day)
+        for key, sign in EVENT_LINES.get(event["type"], ())
+        for item in payload.get(key) or ()
+    ]
+
+
+def _sale_stalls(cursor, events):
+    """invoice_no -> stall_id it was sold at, for the events that return items."""
+    invoices = sorted({
+        event["payload"]["invoice_no"] for event in events
+        if any(sign < 0 for _, sign in EVENT_LINES.get(event["type"], ()))
+    })
+    if not invoices:
+        return {}
+    cursor.execute(SALE_STALLS_SQL, (invoices,))
+    return {row["invoice_no"]: row["stall_id"] for row in cursor.fetchall()}
+
+
+def _apply(cursor, lines):
+    """Fold lines into sales_velocity: one net amount per key, decayed to its latest day."""
+    folded = {}
+    for stall_id, design_id, size, units, day in lines:
+        folded.setdefault((stall_id, design_id, size), []).append((day, units))
+    rows = []
+    for key in sorted(folded):
+        as_of = max(day for day, _ in folded[key])
+        rows.append((key, sum(u * DECAY ** (as_of - day).days for day, u in folded[key]), as_of))
+
+    for sql, keep in ((RECORD_SQL, lambda units: units > 0), (UNRECORD_SQL, lambda units: units < 0)):
+        picked = [row for row in rows if keep(row[1])]
+        if picked:
+            cursor.execute(sql, {
+                "decay": DECAY,
+                "stall_ids": [key[0] for key, _, _ in picked],
+                "design_ids": [key[1] for key, _, _ in picked],
+                "sizes": [key[2] for key, _, _ in picked],
+                "units": [float(units) for _, units, _ in picked],
+                "days": [day for _, _, day in picked],
+            })
+
+
+def _fold(conn, batch):
+    """Events after velocity_state.feed_cursor, one transaction per batch. Returns events read."""
+    total = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute(
+                "SELECT feed_cursor, recompute_snapshot::text AS snapshot FROM velocity_state WHERE id=1 FOR UPDATE"
+            )
+            state = cursor.fetchone()
+            page = outbox.read(cursor, state["feed_cursor"], batch)
+            counted = _visible_in(state["snapshot"])
+            events = [e for e in page["events"] if not counted(outbox.parse_cursor(e["cursor"])[0])]
+            sold_at = _sale_stalls(cursor, events)
+            _apply(cursor, [line for event in events for line in _event_lines(event, sold_at)])
+            cursor.execute(
+                "UPDATE velocity_state SET feed_cursor=%s, folded_at=NOW() WHERE id=1", (page["next_cursor"],)
+            )
+            conn.commit()
+            total += len(page["events"])
+            if not page["has_more"]:
+                return total
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _recompute(conn, today):
+    """Rebuild from stock_movements and hand the feed over at the same snapshot. Returns keys folded."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("DELETE FROM sales_velocity")
+        cursor.execute(RECOMPUTE_SQL, {"today": today, "window": RECOMPUTE_WINDOW_DAYS, "decay": DECAY})
+        keys = cursor.rowcount
+        cursor.execute(HANDOFF_SQL)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return keys
+
+
+def _rank(conn, today):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM reorder_ranking")
+        cursor.execute(RANK_SQL, {
+            "decay": DECAY,
+            "today": today,
+            "all_stalls": ALL_STALLS,
+            "min_rate": MIN_UNITS_PER_DAY,
+            "horizon": LEAD_DAYS + TARGET_DAYS,
+        })
+        ranked = cursor.rowcount
+        cursor.execute("UPDATE velocity_state SET ranked_at=NOW() WHERE id=1")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return ranked
+
+
+def fold(batch=FOLD_BATCH, today=None):
+    """
+    New feed events into sales_velocity, then the ranking. Returns
+    (events read, keys recomputed or None, ranked).
+    """
+    today = today or date.today()
+    with _job_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT recomputed_at FROM velocity_state WHERE id=1")
+        recomputed = cursor.fetchone()["recomputed_at"] is not None
+        conn.rollback()
+        cursor.close()
+        keys = None
+        if not recomputed:
+            keys = _recompute(conn, today)
+        try:
+            events = _fold(conn, batch)
+        except outbox.FeedGap:
+            # behind retention: the missing events are still in stock_movements
+            keys = _recompute(conn, today)
+            events = _fold(conn, batch)
+        return events, keys, _rank(conn, today)
+
+
+def recompute(today=None):
+    """Rebuild sales_velocity from the last RECOMPUTE_WINDOW_DAYS, then the ranking. Returns (keys, ranked)."""
+    today = today or date.today()
+    with _job_connection() as conn:
+        return _recompute(conn, today), _rank(conn, today)
+
+
+def refresh_ranking(today=None):
+    """Rebuild reorder_ranking from the current velocities. Returns rows ranked."""
+    with _job_connection() as conn:
+        return _rank(conn, today or date.today())
+
+
+def _read(sql, params=()):
+    conn = get_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return rows
+
+
+def ranking(stall_location=ALL_STALLS, limit=50):
+    """
+    Top of the precomputed ranking for a stall ("*" = all stalls), lowest
+    cover first. Read-only: the fold / recompute jobs rebuild it.
+    """
+    rows = _read(RANKING_SQL, (stall_location, limit))
+
+    return {
+        "stall_location": stall_location,
+        "computed_at": rows[0]["computed_at"].isoformat() if rows else None,
+        "lead_days": LEAD_DAYS,
+        "target_days": TARGET_DAYS,
+        "items": [
+            {
+                "rank": r["rank"],
+                "design_id": r["design_id"],
+                "design_code": r["design_code"],
+                "product_name": r["product_name"],
+                "color": r["color"],
+                "size": r["size"],
+                "units_per_day": round(r["units_per_day"], 2),
+                "stock": r["stock"],
+                "days_of_cover": round(r["days_of_cover"], 1),
+                "suggested_qty": r["suggested_qty"],
+            }
+            for r in rows
+        ],
+    }
+
+# =====================================================
+# CLI
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    fold_cmd = sub.add_parser("fold", help="fold new sales feed events, then rank (cron)")
+    fold_cmd.add_argument("--batch", type=int, default=FOLD_BATCH)
+    sub.add_parser("recompute", help="nightly full rebuild from stock_movements")
+    sub.add_parser("rank", help="rebuild the reorder ranking only")
+    show = sub.add_parser("show", help="print the ranking")
+    show.add_argument("--stall", default=ALL_STALLS)
+    show.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "fold":
+        events, keys, ranked = fold(max(1, min(args.batch, outbox.MAX_BATCH)))
+        rebuilt = f" (recomputed {keys} velocities first)" if keys is not None else ""
+        print(f"Folded {events} feed events{rebuilt}; ranked {ranked}")
+    elif args.command == "recompute":
+        keys, ranked = recompute()
+        print(f"Folded {keys} stall/design/size velocities from the last {RECOMPUTE_WINDOW_DAYS} days; "
+              f"ranked {ranked}")
+    elif args.command == "rank":
+        print(f"Ranked {refresh_ranking()}")
+    else:
+        result = ranking(args.stall, args.limit)
+        print(f"Reorder ranking for {result['stall_location']} (computed {result['computed_at']})")
+        print(f"{'#':>4} {'design':<10} {'size':<5} {'per day':>8} {'stock':>6} {'cover d':>8} {'order':>6}")
+        for item in result["items"]:
+            print(f"{item['rank']:>4} {item['design_code']:<10} {item['size']:<5} {item['units_per_day']:>8.2f} "
+                  f"{item['stock']:>6} {item['days_of_cover']:>8.1f} {item['suggested_qty']:>6}")
+        if not result["items"]:
+            print("Nothing selling yet - is `python -m backend.velocity fold` in cron?", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Sync gunicorn workers vs the async tier for the JSON lookups.
+
+    export DATABASE_URL=... DATABASE_SSLMODE=disable
+    python -m benchmarks.seed && python -m benchmarks.loadtest --duration 10   # creates invoices
+    python -m benchmarks.async_vs_sync --concurrency 10,50,200 --requests 2000
+
+Starts `gunicorn backend.app:app` (sync workers) and
+`hypercorn backend.asgi:app` (one process), logs in once - the session
+cookie is valid on both - and fires GET /api/invoice/<no> and
+/get-sizes/<id> at each concurrency level. The gap grows with database
+round-trip time, so the interesting numbers come from a remote database
+(e.g. a Neon branch), not a local socket.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+
+from backend.db import get_connection
+from benchmarks import common
+from benchmarks.seed import STAFF_PASSWORD, staff_username
+
+
+def login_cookie(base_url):
+    parsed = urllib.parse.urlparse(base_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    body = urllib.parse.urlencode({"username": staff_username(1), "password": STAFF_PASSWORD})
+    conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse()
+    resp.read()
+    cookie = resp.getheader("Set-Cookie")
+    conn.close()
+    if resp.status != 302 or not cookie:
+        raise SystemExit(f"login failed: HTTP {resp.status}")
+    return cookie.split(";", 1)[0]
+
+
+def lookup_targets(limit=200):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT invoice_no FROM sales ORDER BY id DESC LIMIT %s", (limit,))
+    invoices = [r["invoice_no"] for r in cursor.fetchall()]
+    cursor.execute("SELECT design_id FROM designs LIMIT %s", (limit,))
+    designs = [r["design_id"] for r in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    if not invoices or not designs:
+        raise SystemExit("Need seeded designs and some sales - run benchmarks.seed and benchmarks.loadtest first")
+    return [f"/api/invoice/{i}" for i in invoices] + [f"/get-sizes/{d}" for d in designs]
+
+
+def drive(base_url, cookie, paths, concurrency, total):
+    parsed = urllib.parse.urlparse(base_url)
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+        local = []
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                conn.request("GET", rng.choice(paths), headers={"Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+            except Exception:
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+                ok = False
+            local.append(time.perf_counter() - start)
+            if not ok:
+                with lock:
+                    failures[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {
+        **common.summarize(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "failures": failures[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="10,50,200", help="comma separated levels")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per level per server")
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+    paths = lookup_targets()
+
+    sync_port, async_port = common.free_port(), common.free_port()
+    servers = {
+        "sync": (
+            f"http://127.0.0.1:{sync_port}",
+            common.gunicorn_cmd(sync_port, workers=args.sync_workers, threads=1),
+        ),
+        "async": (
+            f"http://127.0.0.1:{async_port}",
+            [sys.executable, "-m", "hypercorn", "backend.asgi:app", "--bind", f"127.0.0.1:{async_port}"],
+        ),
+    }
+
+    results = {"config": {"levels": levels, "requests": args.requests, "sync_workers": args.sync_workers}}
+    procs = {name: common.start_server(cmd) for name, (_, cmd) in servers.items()}
+    try:
+        for name, (base_url, _) in servers.items():
+            common.wait_for_health(base_url)
+        cookie = login_cookie(servers["sync"][0])
+        for name, (base_url, _) in servers.items():
+            drive(base_url, cookie, paths, 4, 100)  # warm pools / imports
+            results[name] = {
+                str(level): drive(base_url, cookie, paths, level, args.requests)
+                for level in levels
+            }
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+            proc.wait()
+
+    path = common.write_results("async_vs_sync", results, args.output)
+    summary = {
+        name: {level: (r["throughput_rps"], r["p99_ms"]) for level, r in results[name].items()}
+        for name in servers
+    }
+    print("rps, p99_ms by concurrency:")
+    print(json.dumps(summary, indent=2))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
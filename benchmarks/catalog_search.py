@@ -0,0 +1,78 @@
+"""
+Catalog search latency on a synthetic catalog (backend/catalog.py).
+
+    python -m benchmarks.catalog_search --designs 5000 --iterations 2000
+
+Builds the in-memory index from generated rows (same vocabulary as
+benchmarks.seed) and times search() for a mix of code prefixes, words,
+typos, multi-word queries and facet filters. No database is needed.
+"""
+import argparse
+import json
+import random
+import time
+
+from backend.catalog import CatalogIndex
+from benchmarks import common
+from benchmarks.seed import COLORS, GENDERS, PRODUCTS
+
+QUERIES = (
+    ("code_prefix", "SD01", None),
+    ("code_exact", "SD0042", None),
+    ("word", "hoodie", None),
+    ("typo", "hodie", None),
+    ("two_words", "black cargo", None),
+    ("browse", "", None),
+    ("facet", "tee", "Women"),
+)
+
+
+def synthetic_rows(designs, rng):
+    return [
+        {
+            "design_id": n,
+            "design_code": f"SD{n:04d}",
+            "product_name": rng.choice(PRODUCTS),
+            "gender": rng.choice(GENDERS),
+            "color": rng.choice(COLORS),
+            "price": rng.choice((499, 799, 999, 1299, 1599, 1999)),
+        }
+        for n in range(1, designs + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--designs", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.designs, random.Random(args.seed))
+    start = time.perf_counter()
+    index = CatalogIndex(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    latencies = {}
+    for name, query, gender in QUERIES:
+        samples = []
+        for _ in range(args.iterations):
+            t = time.perf_counter()
+            index.search(query, gender=gender, limit=20)
+            samples.append(time.perf_counter() - t)
+        latencies[name] = common.summarize(samples)
+
+    results = {
+        "designs": args.designs,
+        "iterations": args.iterations,
+        "build_ms": round(build_ms, 3),
+        "search": latencies,
+    }
+    path = common.write_results("catalog_search", results, args.output)
+    print(json.dumps({"build_ms": results["build_ms"], **{n: s["p99_ms"] for n, s in latencies.items()}}, indent=2))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
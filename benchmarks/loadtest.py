@@ -0,0 +1,410 @@
+"""
+Mixed-workload load test for checkout, returns and exchanges.
+
+    export DATABASE_URL=postgresql://localhost/slaydrip_bench DATABASE_SSLMODE=disable
+    python -m benchmarks.seed
+    python -m benchmarks.loadtest --concurrency 16 --duration 60
+
+Starts gunicorn against DATABASE_URL (or targets --base-url), drives
+browse / get-sizes / checkout / return / exchange traffic from one logged
+in client per worker, then checks invariants directly in the database.
+While it runs, pg_stat_activity is sampled for backends waiting on locks
+(row locks show up as transactionid / tuple waits). Results are written
+as JSON to bench_results/ (or --output).
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict, deque
+
+from backend.db import get_connection
+from benchmarks import common
+from benchmarks.seed import STAFF_PASSWORD, staff_username
+
+DEFAULT_MIX = {"browse": 15, "sizes": 40, "checkout": 25, "return": 10, "exchange": 10}
+SHED_RETRIES = 4
+INVOICE_RE = re.compile(r"Invoice No:</strong>\s*([\w-]+)")
+
+INVARIANT_QUERIES = {
+    "negative_stock": """
+        SELECT stall_id, design_id, size, stock FROM stock_levels WHERE stock < 0
+    """,
+    "duplicate_invoice_numbers": """
+        SELECT invoice_no, COUNT(*) AS copies FROM sales
+        GROUP BY invoice_no HAVING COUNT(*) > 1
+    """,
+    "over_returns": """
+        SELECT s.invoice_no, s.design_id, s.size, s.sold, r.returned
+        FROM (
+            SELECT invoice_no, design_id, size, SUM(quantity) AS sold
+            FROM sale_items GROUP BY invoice_no, design_id, size
+        ) s
+        JOIN (
+            SELECT invoice_no, design_id, size, SUM(quantity) AS returned
+            FROM returns GROUP BY invoice_no, design_id, size
+        ) r USING (invoice_no, design_id, size)
+        WHERE r.returned > s.sold
+    """,
+}
+
+
+class Client:
+    """One logged-in POS terminal with its own cookie jar."""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, name, path, data=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        for attempt in range(SHED_RETRIES + 1):
+            req = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+            start = time.perf_counter()
+            retry_after_ms = None
+            try:
+                with self.opener.open(req, timeout=60) as resp:
+                    payload = resp.read()
+                    status = resp.status
+            except urllib.error.HTTPError as exc:
+                payload = exc.read()
+                status = exc.code
+                if status == 503:
+                    try:
+                        retry_after_ms = json.loads(payload).get("retry_after_ms", 500)
+                    except ValueError:
+                        retry_after_ms = 500
+            except Exception as exc:
+                payload = str(exc).encode()
+                status = 0
+            self.recorder.record(name, time.perf_counter() - start, status)
+            # shed by admission control: back off as told, like the POS page does
+            if retry_after_ms is None or attempt == SHED_RETRIES:
+                return status, payload
+            time.sleep(retry_after_ms / 1000)
+
+    def login(self, username):
+        status, _ = self.request("POST /login", "/login", data={"username": username, "password": STAFF_PASSWORD})
+        if status != 200:
+            raise RuntimeError(f"login failed for {username}: HTTP {status}")
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.ops = defaultdict(int)
+
+    def record(self, name, seconds, status):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][str(status)] += 1
+
+    def op(self, name):
+        with self.lock:
+            self.ops[name] += 1
+
+
+class Workload:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.invoices = deque(maxlen=500)
+        self.invoices_lock = threading.Lock()
+
+    def remember_invoice(self, invoice_no):
+        with self.invoices_lock:
+            self.invoices.append(invoice_no)
+
+    def recent_invoice(self, rng):
+        with self.invoices_lock:
+            if not self.invoices:
+                return None
+            return rng.choice(self.invoices)
+
+    def random_line(self, rng):
+        design = rng.choice(self.catalog)
+        return {
+            "design_id": design["design_id"],
+            "design_text": f"{design['design_code']} | {design['product_name']} | {design['color']} | {design['gender']}",
+            "size": rng.choice(design["sizes"]),
+            "quantity": rng.randint(1, 2),
+            "price": float(design["price"]),
+        }
+
+    # -------- operations --------
+    def browse(self, client, rng):
+        client.request("GET /", "/")
+
+    def sizes(self, client, rng):
+        design = rng.choice(self.catalog)
+        client.request("GET /get-sizes", f"/get-sizes/{design['design_id']}")
+
+    def checkout(self, client, rng):
+        cart = [self.random_line(rng) for _ in range(rng.randint(1, 4))]
+        client.request("POST /save-cart", "/save-cart", json_body={"cart": cart})
+        status, body = client.request("POST /checkout", "/checkout", data={
+            "customer_name": "Load Test",
+            "phone": f"9{rng.randint(100000000, 999999999)}",
+            "payment_mode": rng.choice(("Cash", "UPI", "Card")),
+            "discount_percent": rng.choice((0, 0, 5, 10)),
+        })
+        match = INVOICE_RE.search(body.decode("utf-8", "replace")) if status == 200 else None
+        if match:
+            self.remember_invoice(match.group(1))
+
+    def _returnable_line(self, client, rng):
+        invoice_no = self.recent_invoice(rng)
+        if not invoice_no:
+            return None, None
+        status, body = client.request("GET /api/invoice", f"/api/invoice/{invoice_no}")
+        if status != 200:
+            return None, None
+        items = [i for i in json.loads(body)["items"] if i["returnable"] > 0]
+        if not items:
+            return None, None
+        item = rng.choice(items)
+        return invoice_no, {"design_id": item["design_id"], "size": item["size"], "quantity": 1}
+
+    def return_(self, client, rng):
+        invoice_no, line = self._returnable_line(client, rng)
+        if line:
+            client.request("POST /api/returns", "/api/returns", json_body={
+                "invoice_no": invoice_no,
+                "payment_mode": "Cash",
+                "items": [line],
+            })
+
+    def exchange(self, client, rng):
+        invoice_no, line = self._returnable_line(client, rng)
+        if line:
+            new_line = self.random_line(rng)
+            client.request("POST /api/exchanges", "/api/exchanges", json_body={
+                "invoice_no": invoice_no,
+                "payment_mode": "UPI",
+                "return_items": [line],
+                "new_items": [{"design_id": new_line["design_id"], "size": new_line["size"], "quantity": 1}],
+            })
+
+
+def load_catalog():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT d.design_id, d.design_code, d.product_name, d.color, d.gender, d.price,
+               ARRAY_AGG(DISTINCT ds.size ORDER BY ds.size) AS sizes
+        FROM designs d
+        JOIN design_stock ds ON ds.design_id = d.design_id
+        GROUP BY d.design_id
+    """)
+    catalog = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    if not catalog:
+        raise SystemExit("No designs found - run `python -m benchmarks.seed` first")
+    return catalog
+
+
+class LockWaitSampler:
+    """Counts backends waiting on a lock, every `interval` seconds, until stopped."""
+
+    SQL = """
+        SELECT wait_event, COUNT(*) AS waiting
+        FROM pg_stat_activity
+        WHERE datname = current_database() AND wait_event_type = 'Lock' AND pid <> pg_backend_pid()
+        GROUP BY wait_event
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.samples = 0
+        self.peak = 0
+        self.by_event = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lock-sampler", daemon=True)
+
+    def _run(self):
+        conn = get_connection()
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            while not self._stop.wait(self.interval):
+                cursor.execute(self.SQL)
+                rows = cursor.fetchall()
+                self.samples += 1
+                self.peak = max(self.peak, sum(r["waiting"] for r in rows))
+                for row in rows:
+                    self.by_event[row["wait_event"]] += row["waiting"]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        waited = sum(self.by_event.values())
+        return {
+            "samples": self.samples,
+            "mean_waiting": round(waited / self.samples, 3) if self.samples else 0,
+            "peak_waiting": self.peak,
+            "by_event": dict(self.by_event),
+        }
+
+
+def count_stalls():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(DISTINCT stall_id) AS n FROM staff WHERE is_active")
+    n = cursor.fetchone()["n"]
+    cursor.close()
+    conn.close()
+    return n
+
+
+def check_invariants():
+    conn = get_connection()
+    cursor = conn.cursor()
+    violations = {}
+    for name, query in INVARIANT_QUERIES.items():
+        cursor.execute(query)
+        violations[name] = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return violations
+
+
+def run(base_url, concurrency, duration, mix, rng_seed, staff_count):
+    recorder = Recorder()
+    workload = Workload(load_catalog())
+    operations = {
+        "browse": workload.browse,
+        "sizes": workload.sizes,
+        "checkout": workload.checkout,
+        "return": workload.return_,
+        "exchange": workload.exchange,
+    }
+    names = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in names]
+    stop_at = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(rng_seed + index)
+        client = Client(base_url, recorder)
+        client.login(staff_username(index % staff_count + 1))
+        while time.monotonic() < stop_at:
+            name = rng.choices(names, weights)[0]
+            operations[name](client, rng)
+            recorder.op(name)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    sampler = LockWaitSampler()
+    sampler.start()
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    lock_waits = sampler.stop()
+
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    errors = {
+        name: {status: n for status, n in statuses.items() if int(status) == 0 or (int(status) >= 500 and int(status) != 503)}
+        for name, statuses in recorder.statuses.items()
+    }
+    # 503 = shed by admission control and retried, reported apart from errors
+    shed = {name: statuses["503"] for name, statuses in recorder.statuses.items() if statuses.get("503")}
+    violations = check_invariants()
+    return {
+        "config": {
+            "base_url": base_url,
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "mix": mix,
+            "seed": rng_seed,
+            "stalls": count_stalls(),
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "operations": dict(recorder.ops),
+        "endpoints": {
+            name: {**common.summarize(lat), "statuses": dict(recorder.statuses[name])}
+            for name, lat in sorted(recorder.latencies.items())
+        },
+        "errors": {name: e for name, e in errors.items() if e},
+        "shed": shed,
+        "lock_waits": lock_waits,
+        "invariants": {name: len(rows) for name, rows in violations.items()},
+        "invariant_samples": {name: rows[:10] for name, rows in violations.items() if rows},
+    }
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, value.split(",")):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}")
+        mix[name] = int(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="target an already running server instead of starting gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers when starting a server")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="e.g. checkout=50,sizes=30 (others keep their defaults)")
+    parser.add_argument("--staff", type=int, default=16, help="seeded staff accounts to spread logins over")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        port = common.free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = common.start_server(common.gunicorn_cmd(port, args.workers, args.threads))
+    try:
+        common.wait_for_health(base_url)
+        results = run(base_url, args.concurrency, args.duration, args.mix, args.seed, args.staff)
+        if server:
+            results["config"]["server"] = {"workers": args.workers, "threads": args.threads}
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    path = common.write_results("loadtest", results, args.output)
+    print(json.dumps({k: results[k] for k in ("throughput_rps", "operations", "lock_waits", "invariants")}, indent=2))
+    print(f"Results written to {path}")
+    if any(results["invariants"].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
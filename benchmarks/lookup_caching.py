@@ -0,0 +1,140 @@
+"""
+Bytes and latency of the return/exchange lookups, with and without
+validators and compression (backend/http_cache.py).
+
+    export DATABASE_URL=... DATABASE_SSLMODE=disable
+    python -m benchmarks.seed && python -m benchmarks.loadtest --duration 10   # creates invoices
+    python -m benchmarks.lookup_caching --flows 200 [--server async]
+
+Replays the lookups pos.js makes for one return-then-exchange on an
+invoice (FLOW) against a freshly started server, as two clients:
+
+- plain: no Accept-Encoding, no If-None-Match (what the page did before)
+- conditional: gzip plus If-None-Match with the last ETag per URL, as the
+  browser does once the short max-age has run out or after a write
+
+Bytes are status line + headers + body as received. No writes are made,
+so every repeat in the conditional run is a 304.
+"""
+import argparse
+import http.client
+import json
+import sys
+import time
+import urllib.parse
+
+from backend.db import get_connection
+from benchmarks import common
+from benchmarks.async_vs_sync import login_cookie
+
+# return lookup, switch to exchange, sizes for the new item, pick another, re-check
+FLOW = ("invoice", "invoice", "sizes", "sizes", "invoice")
+
+
+def flow_targets(count):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT s.invoice_no, MIN(si.design_id) AS design_id
+        FROM sales s JOIN sale_items si ON si.invoice_no = s.invoice_no
+        GROUP BY s.invoice_no, s.id
+        ORDER BY s.id DESC
+        LIMIT %s
+    """, (count,))
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    if not rows:
+        raise SystemExit("Need some sales - run benchmarks.seed and benchmarks.loadtest first")
+    return [
+        {"invoice": f"/api/invoice/{r['invoice_no']}", "sizes": f"/get-sizes/{r['design_id']}"}
+        for r in rows
+    ]
+
+
+def wire_bytes(resp, body):
+    head = f"HTTP/1.1 {resp.status} {resp.reason}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in resp.getheaders()) + "\r\n"
+    return len(head.encode()) + len(body)
+
+
+def run(base_url, cookie, targets, conditional):
+    parsed = urllib.parse.urlparse(base_url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    etags = {}
+    request_latencies, flow_latencies = [], []
+    total_bytes, statuses = 0, {}
+
+    for target in targets:
+        flow_start = time.perf_counter()
+        for step in FLOW:
+            path = target[step]
+            headers = {"Cookie": cookie}
+            if conditional:
+                headers["Accept-Encoding"] = "gzip"
+                if path in etags:
+                    headers["If-None-Match"] = etags[path]
+            start = time.perf_counter()
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+            request_latencies.append(time.perf_counter() - start)
+            total_bytes += wire_bytes(resp, body)
+            statuses[resp.status] = statuses.get(resp.status, 0) + 1
+            if resp.getheader("ETag"):
+                etags[path] = resp.getheader("ETag")
+        flow_latencies.append(time.perf_counter() - flow_start)
+    conn.close()
+
+    return {
+        "request": common.summarize(request_latencies),
+        "flow": common.summarize(flow_latencies),
+        "bytes_total": total_bytes,
+        "bytes_per_flow": round(total_bytes / len(targets), 1),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flows", type=int, default=200, help="distinct invoices to replay")
+    parser.add_argument("--server", choices=("sync", "async"), default="sync")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    targets = flow_targets(args.flows)
+
+    port = common.free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    if args.server == "sync":
+        cmd = common.gunicorn_cmd(port, workers=2, threads=1)
+    else:
+        cmd = [sys.executable, "-m", "hypercorn", "backend.asgi:app", "--bind", f"127.0.0.1:{port}"]
+
+    proc = common.start_server(cmd)
+    try:
+        common.wait_for_health(base_url)
+        cookie = login_cookie(base_url)
+        run(base_url, cookie, targets[:10], conditional=False)  # warm pools / imports
+        results = {
+            "config": {"flows": len(targets), "server": args.server, "flow": list(FLOW)},
+            "plain": run(base_url, cookie, targets, conditional=False),
+            "conditional": run(base_url, cookie, targets, conditional=True),
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    plain, cond = results["plain"], results["conditional"]
+    results["bytes_saved_pct"] = round(100 - 100 * cond["bytes_total"] / plain["bytes_total"], 1)
+    path = common.write_results("lookup_caching", results, args.output)
+    print(json.dumps({
+        name: {"bytes_per_flow": r["bytes_per_flow"], "flow_p50_ms": r["flow"]["p50_ms"],
+               "flow_p99_ms": r["flow"]["p99_ms"], "statuses": r["statuses"]}
+        for name, r in (("plain", plain), ("conditional", cond))
+    }, indent=2))
+    print(f"Bytes saved: {results['bytes_saved_pct']}%")
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+One stall vs several: checkout contention on the per-stall hot rows.
+
+    export DATABASE_URL=postgresql://localhost/slaydrip_bench DATABASE_SSLMODE=disable
+    python -m benchmarks.multi_stall --stalls 1,4 --concurrency 16 --duration 60
+
+For each stall count: reseeds the database (benchmarks.seed --stalls N,
+staff spread round-robin), starts gunicorn and runs the checkout-heavy
+load test with the same clients. With one stall every checkout bumps the
+same invoice counter row and holds it until commit; with N stalls each
+counter only sees its own stall's tills. Compare checkout latency,
+throughput and the sampled lock waits (transactionid / tuple).
+"""
+import argparse
+import json
+
+from benchmarks import common, loadtest, seed
+
+DEFAULT_MIX = "checkout=60,sizes=25,browse=5,return=5,exchange=5"
+
+
+def run_one(stalls, args):
+    seed.seed(args.designs, args.stock, args.staff, stalls=stalls)
+    port = common.free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = common.start_server(common.gunicorn_cmd(port, args.workers, args.threads))
+    try:
+        common.wait_for_health(base_url)
+        results = loadtest.run(base_url, args.concurrency, args.duration, args.mix, args.seed, args.staff)
+    finally:
+        server.terminate()
+        server.wait()
+    checkout = results["endpoints"].get("POST /checkout", {})
+    return {
+        "throughput_rps": results["throughput_rps"],
+        "checkouts": results["operations"].get("checkout", 0),
+        "checkout": {k: checkout.get(k) for k in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms")},
+        "lock_waits": results["lock_waits"],
+        "errors": results["errors"],
+        "invariants": results["invariants"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stalls", default="1,4", help="comma separated stall counts to compare")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", type=loadtest.parse_mix, default=loadtest.parse_mix(DEFAULT_MIX))
+    parser.add_argument("--designs", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--staff", type=int, default=16, help="seeded staff, spread round-robin over the stalls")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    seed.ensure_local_database()
+    levels = [int(n) for n in args.stalls.split(",")]
+
+    results = {
+        "config": {
+            "stalls": levels,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "server": {"workers": args.workers, "threads": args.threads},
+        },
+        "runs": {str(n): run_one(n, args) for n in levels},
+    }
+
+    path = common.write_results("multi_stall", results, args.output)
+    for n, run in results["runs"].items():
+        print(f"{n:>3} stall(s): {run['checkouts']:>6} checkouts, p95 {run['checkout']['p95_ms']} ms, "
+              f"{run['throughput_rps']} req/s, lock waits/sample {run['lock_waits']['mean_waiting']}")
+    print(json.dumps({n: run["lock_waits"]["by_event"] for n, run in results["runs"].items()}, indent=2))
+    print(f"Results written to {path}")
+    if any(any(run["invariants"].values()) for run in results["runs"].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-statement latency of the hot SQL, plain vs server-side prepared.
+
+    export DATABASE_URL=... DATABASE_SSLMODE=disable
+    python -m benchmarks.seed && python -m benchmarks.loadtest --duration 10   # creates invoices
+    python -m benchmarks.prepared_statements --iterations 2000
+
+Runs every statement in backend/statements.py on one connection, first as
+plain SQL and then via PREPARE/EXECUTE, inside a transaction that is
+rolled back - the seeded data is left untouched.
+"""
+import argparse
+import json
+import time
+from datetime import date
+
+from backend import statements
+from backend.db import get_connection
+from benchmarks import common
+
+
+def sample_params(cursor):
+    cursor.execute("SELECT stall_id, design_id, size FROM design_stock ORDER BY id LIMIT 1")
+    stock = cursor.fetchone()
+    cursor.execute("""
+        SELECT s.invoice_no FROM sales s
+        JOIN sale_items si ON si.invoice_no = s.invoice_no
+        ORDER BY s.id DESC LIMIT 1
+    """)
+    sale = cursor.fetchone()
+    if not stock or not sale:
+        raise SystemExit("Need seeded stock and at least one sale - run benchmarks.seed and benchmarks.loadtest first")
+    stall_id, design_id, size, invoice_no = stock["stall_id"], stock["design_id"], stock["size"], sale["invoice_no"]
+    return {
+        "stock_movement": (stall_id, design_id, size, -1, "ADJUSTMENT", "BENCH", None, stall_id, design_id, size),
+        "stock_for_size": (stall_id, design_id, size),
+        "next_invoice_number": (stall_id,),
+        "insert_sale_item": ("BENCH-INV", design_id, size, 1, 100),
+        "insert_return": ("BENCH-REF", invoice_no, design_id, size, 1, 100, "RETURN", "Cash", None, "Main Store", date.today()),
+        "sale_exists": (invoice_no,),
+        "sale_by_invoice": (invoice_no,),
+        "returnable_items": (invoice_no, invoice_no),
+    }
+
+
+def measure(prepared, params, iterations):
+    conn = get_connection()
+    cursor = conn.cursor()
+    results = {}
+    try:
+        for name in statements.STATEMENTS:
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                statements.execute(cursor, name, params[name], prepared=prepared)
+                if cursor.description:
+                    cursor.fetchall()
+                latencies.append(time.perf_counter() - start)
+            # the first call carries the PREPARE; report it separately
+            results[name] = {"first_ms": round(latencies[0] * 1000, 3), **common.summarize(latencies[1:])}
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    params = sample_params(cursor)
+    cursor.close()
+    conn.close()
+
+    results = {
+        "config": {"iterations": args.iterations},
+        "plain": measure(False, params, args.iterations),
+        "prepared": measure(True, params, args.iterations),
+    }
+    path = common.write_results("prepared_statements", results, args.output)
+    print(json.dumps({
+        name: {
+            "plain_p50_ms": results["plain"][name]["p50_ms"],
+            "prepared_p50_ms": results["prepared"][name]["p50_ms"],
+        }
+        for name in statements.STATEMENTS
+    }, indent=2))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
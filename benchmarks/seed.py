@@ -0,0 +1,149 @@
+"""
+Seed a local Postgres for benchmarks and load tests.
+
+    DATABASE_URL=postgresql://localhost/slaydrip_bench DATABASE_SSLMODE=disable \
+        python -m benchmarks.seed --designs 200 --stock 500 --staff 16 [--stalls 4]
+
+With --stalls N every stall gets its own stock pool of --stock units per
+design/size, and staff are spread over the stalls round-robin.
+
+Wipes every SLAYDRIP table in the target database. Never point it at Neon.
+"""
+import argparse
+import os
+import random
+
+from backend import migrations, partitions, stalls as stall_registry, stock_ledger
+from backend.db import get_connection
+from benchmarks.common import BASE_DIR
+
+SIZES = ("XS", "S", "M", "L", "XL", "XXL")
+GENDERS = ("Men", "Women", "Unisex")
+COLORS = ("Black", "White", "Olive", "Navy", "Beige", "Maroon", "Grey")
+PRODUCTS = ("Oversized Tee", "Cargo Pants", "Hoodie", "Co-ord Set", "Shirt", "Joggers")
+
+SCHEMA_FILES = (
+    os.path.join(BASE_DIR, "database", "schema.sql"),
+    os.path.join(BASE_DIR, "database", "returns_schema.sql"),
+)
+PARTITIONING_FILE = os.path.join(BASE_DIR, "database", "partitioning.sql")
+TABLES = (
+    "designs", "design_stock", "staff", "sales", "sale_items",
+    "returns", "exchange_details", "exchange_settlements", "stock_movements",
+    "sales_velocity", "reorder_ranking", "outbox_events",
+)
+
+STAFF_PASSWORD = "loadtest"
+
+
+def staff_username(n):
+    return f"loadtest{n:02d}"
+
+
+def stall_name(n):
+    return "Main Store" if n == 1 else f"Load Test Stall {n}"
+
+
+def ensure_local_database():
+    url = os.environ.get("DATABASE_URL", "")
+    if not any(host in url for host in ("localhost", "127.0.0.1", "/tmp", "@db")):
+        raise SystemExit("Refusing to seed a non-local DATABASE_URL (pass --force to override)")
+
+
+def seed(designs=200, stock=500, staff=16, rng_seed=42, partitioned=False, stalls=1):
+    rng = random.Random(rng_seed)
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    for path in SCHEMA_FILES:
+        with open(path, encoding="utf-8") as fh:
+            cursor.execute(fh.read())
+    if partitioned and not partitions.is_partitioned(cursor):
+        with open(PARTITIONING_FILE, encoding="utf-8") as fh:
+            cursor.execute(fh.read())
+    conn.commit()
+    # the app needs the ledger tables; migrations also bring the indexes
+    migrations.apply_pending(conn, log=lambda line: None)
+
+    cursor.execute("SELECT to_regclass('invoice_numbers') IS NOT NULL AS present")
+    tables = TABLES + (("invoice_numbers",) if cursor.fetchone()["present"] else ())
+    cursor.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+    cursor.execute("UPDATE stock_ledger_state SET compacted_through=0 WHERE id=1")
+    cursor.execute("UPDATE outbox_state SET compacted_txid='0', compacted_id=0, compacted_at=NULL WHERE id=1")
+    cursor.execute(
+        "UPDATE velocity_state SET feed_cursor='0-0', recompute_snapshot=NULL, recomputed_at=NULL, folded_at=NULL, "
+        "ranked_at=NULL WHERE id=1"
+    )
+    # stall 1 survives (migrated from store_settings); the rest are rebuilt
+    cursor.execute("DELETE FROM stall_invoice_counters")
+    cursor.execute("DELETE FROM stalls WHERE stall_id <> %s", (stall_registry.DEFAULT_STALL_ID,))
+    cursor.execute(
+        "UPDATE stalls SET name=%s, invoice_prefix='INV', discount_percent=0, gst_percent=5, is_active=TRUE WHERE stall_id=%s",
+        (stall_name(1), stall_registry.DEFAULT_STALL_ID)
+    )
+    cursor.execute("INSERT INTO stall_invoice_counters (stall_id, last_number) VALUES (%s, 0)",
+                   (stall_registry.DEFAULT_STALL_ID,))
+    stall_ids = [stall_registry.DEFAULT_STALL_ID] + [
+        stall_registry.add(cursor, stall_name(n), "L" + chr(ord("A") + n - 2))["stall_id"]
+        for n in range(2, stalls + 1)
+    ]
+
+    for n in range(1, designs + 1):
+        cursor.execute(
+            """
+            INSERT INTO designs (design_code, product_name, gender, color, price)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING design_id
+            """,
+            (
+                f"SD{n:04d}",
+                rng.choice(PRODUCTS),
+                rng.choice(GENDERS),
+                rng.choice(COLORS),
+                rng.choice((499, 799, 999, 1299, 1599, 1999)),
+            )
+        )
+        design_id = cursor.fetchone()["design_id"]
+        for size in SIZES:
+            for stall_id in stall_ids:
+                cursor.execute(
+                    "INSERT INTO design_stock (stall_id, design_id, size, stock) VALUES (%s, %s, %s, 0)",
+                    (stall_id, design_id, size)
+                )
+                if stock:
+                    stock_ledger.record(cursor, stall_id, design_id, size, stock, "IMPORT", "SEED")
+
+    for n in range(1, staff + 1):
+        cursor.execute(
+            "INSERT INTO staff (username, password, full_name, is_active, stall_id) VALUES (%s, %s, %s, TRUE, %s)",
+            (staff_username(n), STAFF_PASSWORD, f"Load Test {n:02d}", stall_ids[(n - 1) % len(stall_ids)])
+        )
+
+    conn.commit()
+    stock_ledger.compact(conn)
+    cursor.execute("ANALYZE")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--designs", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=500, help="starting units per design/size")
+    parser.add_argument("--staff", type=int, default=16)
+    parser.add_argument("--stalls", type=int, default=1, help="stalls, each with its own stock pool (max 27)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--partitioned", action="store_true", help="apply database/partitioning.sql first")
+    parser.add_argument("--force", action="store_true", help="allow a non-local DATABASE_URL")
+    args = parser.parse_args()
+    if not 1 <= args.stalls <= 27:
+        parser.error("--stalls must be 1-27")
+    if not args.force:
+        ensure_local_database()
+    seed(args.designs, args.stock, args.staff, args.seed, args.partitioned, args.stalls)
+    print(f"Seeded {args.designs} designs x {len(SIZES)} sizes, {args.staff} staff, {args.stalls} stalls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Cold-start benchmark: import time and time-to-first-request.
+
+    python -m benchmarks.startup --runs 10
+
+Every measurement runs in a fresh interpreter so nothing is cached in
+sys.modules. Reported:
+
+  import_app           `import backend.app` (what a cold worker pays)
+  import_invoice_pdf   ReportLab + invoice module, now paid by the first checkout
+  first_request        interpreter start -> first /health response (test client)
+  first_pdf            first invoice render in a fresh process (import included)
+  gunicorn_ready       spawn gunicorn -> /health answers (skip with --no-gunicorn)
+
+No database is needed.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks import common
+
+SNIPPETS = {
+    "import_app": """
+import time
+t = time.perf_counter()
+import backend.app
+print(time.perf_counter() - t)
+""",
+    "import_invoice_pdf": """
+import time
+t = time.perf_counter()
+import backend.invoice_pdf
+print(time.perf_counter() - t)
+""",
+    "first_request": """
+import time
+t = time.perf_counter()
+from backend.app import create_app
+resp = create_app().test_client().get("/health")
+assert resp.status_code == 200
+print(time.perf_counter() - t)
+""",
+    "first_pdf": """
+import datetime, os, tempfile, time
+t = time.perf_counter()
+from backend.invoice_pdf import build_invoice_pdf
+build_invoice_pdf(
+    os.path.join(tempfile.mkdtemp(), "bench.pdf"),
+    invoice_no="INV-00001", bill_no="BILL-0", bill_date=datetime.date.today(),
+    staff_name="Bench", stall_location="Bench", payment_mode="Cash",
+    customer_name="Bench", phone="0000000000",
+    cart=[{"design_text": "SD0001 | Tee | Black | Unisex", "size": "M", "quantity": 2, "price": 999.0}],
+    subtotal_inclusive=1998.0, base_price_total=1902.86, discount_percent=0.0, discount_amount=0.0,
+    discounted_base_price=1902.86, gst_percent=12, gst_amount=228.34, grand_total=2131.2,
+)
+print(time.perf_counter() - t)
+""",
+}
+
+
+def run_snippet(code):
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=common.BASE_DIR)
+    return float(out.decode().strip().splitlines()[-1])
+
+
+def gunicorn_ready(workers):
+    port = common.free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = common.start_server(common.gunicorn_cmd(port, workers=workers, threads=1))
+    try:
+        common.wait_for_health(base_url)
+        return time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for gunicorn_ready")
+    parser.add_argument("--no-gunicorn", action="store_true")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    samples = {name: [run_snippet(code) for _ in range(args.runs)] for name, code in SNIPPETS.items()}
+    if not args.no_gunicorn:
+        samples["gunicorn_ready"] = [gunicorn_ready(args.workers) for _ in range(args.runs)]
+
+    results = {
+        "config": {"runs": args.runs, "workers": args.workers},
+        "startup": {name: common.summarize(values) for name, values in samples.items()},
+    }
+    path = common.write_results("startup", results, args.output)
+    print(json.dumps({name: s["p50_ms"] for name, s in results["startup"].items()}, indent=2))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
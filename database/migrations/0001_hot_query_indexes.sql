@@ -0,0 +1,18 @@
+-- no-transaction
+-- Indexes behind the hot lookups (see `python -m backend.migrations verify`).
+-- CONCURRENTLY keeps checkout running while they build; on partitioned
+-- tables the runner builds them partition by partition.
+
+-- design_stock is read and updated by (design_id, size) on every sale,
+-- return and exchange; one row per design/size is also the business rule.
+-- Fails if duplicates exist - find them with:
+--   SELECT design_id, size, COUNT(*) FROM design_stock GROUP BY 1, 2 HAVING COUNT(*) > 1;
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_design_stock_design_size ON design_stock (design_id, size);
+
+-- sales per design/size (reports, reorder)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sale_items_design_size ON sale_items (design_id, size);
+
+-- invoice lookup by number, day-wise reports, customer lookup by phone
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sales_invoice ON sales (invoice_no);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sales_bill_date ON sales (bill_date);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sales_phone ON sales (phone);
@@ -0,0 +1,30 @@
+-- One row per invoice number ever issued; sales can't get a duplicate.
+--
+-- A UNIQUE index on sales(invoice_no) isn't possible once sales is
+-- partitioned (unique indexes must include created_at), and it would
+-- forget archived months. This table covers both; the trigger makes every
+-- INSERT INTO sales claim its number or fail.
+--
+-- Numbers already duplicated before this migration are left alone
+-- (first one wins the backfill).
+
+CREATE TABLE IF NOT EXISTS invoice_numbers (
+    invoice_no VARCHAR(50) PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO invoice_numbers (invoice_no, created_at)
+SELECT invoice_no, MIN(created_at) FROM sales GROUP BY invoice_no
+ON CONFLICT (invoice_no) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION slaydrip_claim_invoice_no() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO invoice_numbers (invoice_no, created_at) VALUES (NEW.invoice_no, NEW.created_at);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sales_claim_invoice_no ON sales;
+CREATE TRIGGER sales_claim_invoice_no
+    AFTER INSERT ON sales
+    FOR EACH ROW EXECUTE FUNCTION slaydrip_claim_invoice_no();
@@ -0,0 +1,55 @@
+-- Append-only stock ledger (see backend/stock_ledger.py).
+--
+-- Every stock change is a stock_movements row. design_stock.stock becomes
+-- the compacted balance: the sum of every movement up to
+-- stock_ledger_state.compacted_through. The live level is that balance
+-- plus the movements after it (the stock_levels view).
+
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id BIGSERIAL PRIMARY KEY,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    delta INTEGER NOT NULL CHECK (delta <> 0),
+    reason VARCHAR(20) NOT NULL CHECK (
+        reason IN ('SALE', 'RETURN', 'EXCHANGE_IN', 'EXCHANGE_OUT', 'IMPORT', 'ADJUSTMENT')
+    ),
+    ref VARCHAR(50),
+    staff_id INTEGER,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- tail lookups: movements for one design/size after the watermark
+CREATE INDEX IF NOT EXISTS idx_stock_movements_item ON stock_movements (design_id, size, id);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_ref ON stock_movements (ref);
+
+CREATE TABLE IF NOT EXISTS stock_ledger_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    compacted_through BIGINT NOT NULL DEFAULT 0,
+    compacted_at TIMESTAMPTZ
+);
+
+-- Opening balances: today's design_stock, recorded as one IMPORT per row
+INSERT INTO stock_movements (design_id, size, delta, reason, ref)
+SELECT design_id, size, stock, 'IMPORT', 'OPENING'
+FROM design_stock
+WHERE stock <> 0;
+
+INSERT INTO stock_ledger_state (id, compacted_through, compacted_at)
+SELECT 1, COALESCE(MAX(id), 0), NOW() FROM stock_movements
+ON CONFLICT (id) DO NOTHING;
+
+-- LATERAL: one index probe on idx_stock_movements_item per design/size
+CREATE OR REPLACE VIEW stock_levels AS
+SELECT
+    ds.design_id,
+    ds.size,
+    ds.stock + COALESCE(tail.delta, 0) AS stock
+FROM design_stock ds
+CROSS JOIN stock_ledger_state st
+CROSS JOIN LATERAL (
+    SELECT SUM(m.delta) AS delta
+    FROM stock_movements m
+    WHERE m.design_id = ds.design_id
+      AND m.size = ds.size
+      AND m.id > st.compacted_through
+) tail;
@@ -0,0 +1,32 @@
+-- Change notifications for the in-process SKU index (backend/sku.py).
+--
+-- Every change to designs, design_stock or stock_movements sends
+-- NOTIFY slaydrip_sku '<table>:<design_id>' at commit. Identical payloads
+-- in one transaction are folded by Postgres, so a checkout sends one per
+-- design sold, not one per unit.
+
+CREATE OR REPLACE FUNCTION slaydrip_notify_sku() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('slaydrip_sku', TG_TABLE_NAME || ':' || OLD.design_id);
+    ELSE
+        PERFORM pg_notify('slaydrip_sku', TG_TABLE_NAME || ':' || NEW.design_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS designs_notify_sku ON designs;
+CREATE TRIGGER designs_notify_sku
+    AFTER INSERT OR UPDATE OR DELETE ON designs
+    FOR EACH ROW EXECUTE FUNCTION slaydrip_notify_sku();
+
+DROP TRIGGER IF EXISTS design_stock_notify_sku ON design_stock;
+CREATE TRIGGER design_stock_notify_sku
+    AFTER INSERT OR UPDATE OR DELETE ON design_stock
+    FOR EACH ROW EXECUTE FUNCTION slaydrip_notify_sku();
+
+DROP TRIGGER IF EXISTS stock_movements_notify_sku ON stock_movements;
+CREATE TRIGGER stock_movements_notify_sku
+    AFTER INSERT ON stock_movements
+    FOR EACH ROW EXECUTE FUNCTION slaydrip_notify_sku();
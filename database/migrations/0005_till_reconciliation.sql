@@ -0,0 +1,51 @@
+-- End-of-day till reconciliation (see backend/till.py).
+--
+-- Returns and exchange settlements record who took the money, at which
+-- stall and on which business day, like sales already do. Exchanges
+-- used to return their COLLECT/REFUND settlement to the page without
+-- storing it; exchange_settlements keeps one row per exchange_ref.
+-- till_closures freezes a closed day's totals; rows can't be changed.
+
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS staff_id INTEGER;
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS stall_location VARCHAR(100);
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS business_date DATE;
+
+-- past returns: their calendar day; the app sets it from now on
+UPDATE returns SET business_date = created_at::date WHERE business_date IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_returns_business_date ON returns (business_date);
+
+CREATE TABLE IF NOT EXISTS exchange_settlements (
+    exchange_ref VARCHAR(50) PRIMARY KEY,
+    invoice_no VARCHAR(50) NOT NULL,
+    settlement_type VARCHAR(10) NOT NULL CHECK (settlement_type IN ('REFUND', 'COLLECT', 'EVEN')),
+    amount NUMERIC(12,2) NOT NULL CHECK (amount >= 0),
+    returned_total NUMERIC(12,2) NOT NULL,
+    new_total NUMERIC(12,2) NOT NULL,
+    discount_amount NUMERIC(12,2) NOT NULL DEFAULT 0,
+    payment_mode VARCHAR(10) NOT NULL CHECK (payment_mode IN ('Cash', 'UPI', 'Card')),
+    staff_id INTEGER,
+    stall_location VARCHAR(100),
+    business_date DATE NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_exchange_settlements_business_date ON exchange_settlements (business_date);
+
+CREATE TABLE IF NOT EXISTS till_closures (
+    business_date DATE PRIMARY KEY,
+    report JSONB NOT NULL,
+    closed_by INTEGER,
+    closed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION slaydrip_till_closure_immutable() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'till closure for % is frozen', OLD.business_date;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS till_closures_immutable ON till_closures;
+CREATE TRIGGER till_closures_immutable
+    BEFORE UPDATE OR DELETE ON till_closures
+    FOR EACH ROW EXECUTE FUNCTION slaydrip_till_closure_immutable();
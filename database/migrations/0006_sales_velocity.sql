@@ -0,0 +1,33 @@
+-- Sales velocity and reorder ranking (see backend/velocity.py).
+--
+-- sales_velocity holds, per stall and design/size, an exponentially
+-- decayed count of units sold (returns subtract), anchored at as_of.
+-- Checkout, returns and exchanges update it in their own transaction, so
+-- nothing re-scans sale_items to know what is selling.
+--
+-- reorder_ranking is the precomputed answer to "what runs out first":
+-- rebuilt from sales_velocity + stock by `python -m backend.velocity rank`
+-- (and by /api/reorder when it is older than REORDER_REFRESH_MINUTES).
+
+CREATE TABLE IF NOT EXISTS sales_velocity (
+    stall_location VARCHAR(100) NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    decayed_units DOUBLE PRECISION NOT NULL DEFAULT 0,
+    as_of DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (stall_location, design_id, size)
+);
+
+CREATE TABLE IF NOT EXISTS reorder_ranking (
+    stall_location VARCHAR(100) NOT NULL,
+    rank INTEGER NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    units_per_day DOUBLE PRECISION NOT NULL,
+    stock INTEGER NOT NULL,
+    days_of_cover DOUBLE PRECISION NOT NULL,
+    suggested_qty INTEGER NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (stall_location, rank)
+);
@@ -0,0 +1,77 @@
+-- First-class stalls (see backend/stalls.py).
+--
+-- store_settings id=1, invoice_counter id=1 and design_stock were global:
+-- every till bumped the same counter row (locked until its checkout
+-- commits), shared one stock pool, and changing the stall location at one
+-- till moved every other till with it. Now each stall has its own settings
+-- row, invoice counter row and stock rows, and staff have a home stall
+-- that login binds to their session.
+--
+-- The current store becomes stall 1: its name, settings and the INV-
+-- sequence where invoice_counter left off, and all existing stock.
+-- store_settings and invoice_counter are no longer read; the stall_id
+-- defaults keep the previous release working against stall 1 mid-deploy.
+
+CREATE TABLE IF NOT EXISTS stalls (
+    stall_id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE,
+    invoice_prefix VARCHAR(6) NOT NULL UNIQUE CHECK (invoice_prefix ~ '^[A-Z]{2,6}$'),
+    discount_percent NUMERIC(5,2) NOT NULL DEFAULT 0,
+    gst_percent NUMERIC(5,2) NOT NULL DEFAULT 5,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS stall_invoice_counters (
+    stall_id INTEGER PRIMARY KEY REFERENCES stalls (stall_id),
+    last_number INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO stalls (stall_id, name, invoice_prefix, discount_percent, gst_percent)
+SELECT 1, COALESCE(NULLIF(TRIM(current_stall_location), ''), 'Main Store'), 'INV', discount_percent, gst_percent
+FROM store_settings
+WHERE id = 1
+ON CONFLICT DO NOTHING;
+
+INSERT INTO stalls (stall_id, name, invoice_prefix) VALUES (1, 'Main Store', 'INV')
+ON CONFLICT DO NOTHING;
+
+SELECT setval(pg_get_serial_sequence('stalls', 'stall_id'), (SELECT MAX(stall_id) FROM stalls));
+
+INSERT INTO stall_invoice_counters (stall_id, last_number)
+SELECT 1, COALESCE((SELECT last_number FROM invoice_counter WHERE id = 1), 0)
+ON CONFLICT (stall_id) DO NOTHING;
+
+ALTER TABLE staff ADD COLUMN IF NOT EXISTS stall_id INTEGER NOT NULL DEFAULT 1 REFERENCES stalls (stall_id);
+
+-- one stock pool per stall
+ALTER TABLE design_stock ADD COLUMN IF NOT EXISTS stall_id INTEGER NOT NULL DEFAULT 1 REFERENCES stalls (stall_id);
+DROP INDEX IF EXISTS idx_design_stock_design_size;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_design_stock_stall_item ON design_stock (stall_id, design_id, size);
+
+-- no foreign key: the ledger insert already checks design_stock (statements.py)
+ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS stall_id INTEGER NOT NULL DEFAULT 1;
+
+-- existing rows satisfy the narrower check they were written under
+ALTER TABLE stock_movements DROP CONSTRAINT IF EXISTS stock_movements_reason_check;
+ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_reason_check CHECK (
+    reason IN ('SALE', 'RETURN', 'EXCHANGE_IN', 'EXCHANGE_OUT', 'TRANSFER_IN', 'TRANSFER_OUT', 'IMPORT', 'ADJUSTMENT')
+) NOT VALID;
+
+-- same view, per stall (new column last: CREATE OR REPLACE can only append)
+CREATE OR REPLACE VIEW stock_levels AS
+SELECT
+    ds.design_id,
+    ds.size,
+    ds.stock + COALESCE(tail.delta, 0) AS stock,
+    ds.stall_id
+FROM design_stock ds
+CROSS JOIN stock_ledger_state st
+CROSS JOIN LATERAL (
+    SELECT SUM(m.delta) AS delta
+    FROM stock_movements m
+    WHERE m.stall_id = ds.stall_id
+      AND m.design_id = ds.design_id
+      AND m.size = ds.size
+      AND m.id > st.compacted_through
+) tail;
@@ -0,0 +1,5 @@
+-- no-transaction
+-- stock_levels tail lookups now probe by stall as well
+-- (0007_stalls.sql); the old (design_id, size, id) index stops being used.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_stock_movements_stall_item ON stock_movements (stall_id, design_id, size, id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_stock_movements_item;
@@ -0,0 +1,29 @@
+-- Transactional outbox for sales events (see backend/outbox.py).
+--
+-- Checkout, returns and exchanges insert one outbox_events row in their
+-- own transaction, so an event exists exactly when the sale does.
+-- Consumers read it as a change feed ordered by (txid, id): txid is the
+-- writing transaction, and only rows whose transaction is older than every
+-- running one are served, so a slow commit can't slip in behind a cursor.
+-- outbox_state remembers how far retention compaction has deleted.
+
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id BIGSERIAL PRIMARY KEY,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    event_type VARCHAR(40) NOT NULL,
+    ref VARCHAR(50) NOT NULL,
+    stall_location VARCHAR(100),
+    payload JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_events_feed ON outbox_events (txid, id);
+
+CREATE TABLE IF NOT EXISTS outbox_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    compacted_txid XID8 NOT NULL DEFAULT '0',
+    compacted_id BIGINT NOT NULL DEFAULT 0,
+    compacted_at TIMESTAMPTZ
+);
+
+INSERT INTO outbox_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
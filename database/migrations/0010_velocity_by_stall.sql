@@ -0,0 +1,37 @@
+-- Sales velocity off the checkout path, keyed by stall_id (see backend/velocity.py).
+--
+-- Checkout, returns and exchanges no longer upsert sales_velocity in their
+-- own transaction (that row lock was held through the PDF build, so
+-- popular items queued behind each other). `python -m backend.velocity
+-- fold` consumes the outbox feed (0009) from cron instead;
+-- velocity_state is its cursor. Keyed by stall_id: stall names can be
+-- renamed.
+--
+-- sales_velocity is derived data and starts empty; the first fold runs a
+-- recompute from stock_movements.
+
+DROP TABLE IF EXISTS sales_velocity;
+
+CREATE TABLE sales_velocity (
+    stall_id INTEGER NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    decayed_units DOUBLE PRECISION NOT NULL DEFAULT 0,
+    as_of DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (stall_id, design_id, size)
+);
+
+-- feed_cursor: last outbox event folded. recompute_snapshot: the snapshot
+-- the last recompute read stock_movements with; events of transactions
+-- visible in it are already counted and are skipped by the fold.
+CREATE TABLE IF NOT EXISTS velocity_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    feed_cursor VARCHAR(48) NOT NULL DEFAULT '0-0',
+    recompute_snapshot PG_SNAPSHOT,
+    recomputed_at TIMESTAMPTZ,
+    folded_at TIMESTAMPTZ,
+    ranked_at TIMESTAMPTZ
+);
+
+INSERT INTO velocity_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,232 @@
+-- Monthly range partitions for sales, sale_items, returns and exchange_details
+--
+-- One-off migration; run it in a quiet window, it copies the four tables:
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f database/partitioning.sql
+--     python -m backend.partitions maintain        # then daily from cron
+--
+-- Every table is partitioned on created_at (UTC months, e.g. sales_p202610).
+-- Primary keys become (id, created_at) because Postgres requires the
+-- partition key in them; ids keep coming from the existing sequences.
+-- See database/partitioning_notes.md.
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'sales'::regclass) = 'p' THEN
+        RAISE EXCEPTION 'sales is already partitioned - nothing to do';
+    END IF;
+END $$;
+
+-- Creates <parent>_pYYYYMM for the UTC month containing `month`.
+-- Also called by backend/partitions.py for future months.
+CREATE OR REPLACE FUNCTION slaydrip_create_month_partition(parent regclass, month date)
+RETURNS text AS $$
+DECLARE
+    first_day date := date_trunc('month', month)::date;
+    child text := parent::text || '_p' || to_char(first_day, 'YYYYMM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+        child, parent,
+        first_day::text || ' 00:00:00+00',
+        (first_day + interval '1 month')::date::text || ' 00:00:00+00'
+    );
+    RETURN child;
+END
+$$ LANGUAGE plpgsql;
+
+-- Columns later migrations added (0005 till reconciliation). No-ops on a
+-- migrated database; otherwise the copy below has them either way, and
+-- 0005 fills business_date when it runs.
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS staff_id INTEGER;
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS stall_location VARCHAR(100);
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS business_date DATE;
+
+-- =====================================================
+-- MOVE THE OLD TABLES ASIDE
+-- =====================================================
+ALTER TABLE sales RENAME TO sales_unpartitioned;
+ALTER TABLE sales_unpartitioned RENAME CONSTRAINT sales_pkey TO sales_unpartitioned_pkey;
+ALTER TABLE sale_items RENAME TO sale_items_unpartitioned;
+ALTER TABLE sale_items_unpartitioned RENAME CONSTRAINT sale_items_pkey TO sale_items_unpartitioned_pkey;
+ALTER TABLE returns RENAME TO returns_unpartitioned;
+ALTER TABLE returns_unpartitioned RENAME CONSTRAINT returns_pkey TO returns_unpartitioned_pkey;
+ALTER TABLE exchange_details RENAME TO exchange_details_unpartitioned;
+ALTER TABLE exchange_details_unpartitioned RENAME CONSTRAINT exchange_details_pkey TO exchange_details_unpartitioned_pkey;
+
+-- =====================================================
+-- PARTITIONED PARENTS
+-- =====================================================
+CREATE TABLE sales (
+    id BIGINT NOT NULL DEFAULT nextval('sales_id_seq'),
+    customer_name VARCHAR(100),
+    phone VARCHAR(20),
+    invoice_no VARCHAR(50) NOT NULL,
+    bill_no VARCHAR(50),
+    bill_date DATE NOT NULL,
+    payment_mode VARCHAR(10),
+    subtotal NUMERIC(12,2),
+    discount_percent NUMERIC(5,2),
+    discount_amount NUMERIC(12,2),
+    gst_amount NUMERIC(12,2),
+    total_amount NUMERIC(12,2),
+    pdf_file VARCHAR(100),
+    staff_id INTEGER,
+    stall_location VARCHAR(100),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE sale_items (
+    id BIGINT NOT NULL DEFAULT nextval('sale_items_id_seq'),
+    invoice_no VARCHAR(50) NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    quantity INTEGER NOT NULL,
+    price NUMERIC(12,2) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE returns (
+    id BIGINT NOT NULL DEFAULT nextval('returns_id_seq'),
+    return_ref VARCHAR(50) NOT NULL,
+    invoice_no VARCHAR(50) NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    refund_amount NUMERIC(12,2) NOT NULL,
+    return_type VARCHAR(10) NOT NULL CHECK (return_type IN ('RETURN','EXCHANGE')),
+    payment_mode VARCHAR(10) NOT NULL CHECK (payment_mode IN ('Cash','UPI','Card')),
+    staff_id INTEGER,
+    stall_location VARCHAR(100),
+    business_date DATE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE exchange_details (
+    id BIGINT NOT NULL DEFAULT nextval('exchange_details_id_seq'),
+    exchange_ref VARCHAR(50) NOT NULL,
+    invoice_no VARCHAR(50) NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    unit_price NUMERIC(12,2) NOT NULL,
+    line_total NUMERIC(12,2) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE sales_id_seq OWNED BY sales.id;
+ALTER SEQUENCE sale_items_id_seq OWNED BY sale_items.id;
+ALTER SEQUENCE returns_id_seq OWNED BY returns.id;
+ALTER SEQUENCE exchange_details_id_seq OWNED BY exchange_details.id;
+
+-- One partition per month from the oldest row up to three months ahead
+DO $$
+DECLARE
+    oldest date;
+    month date;
+BEGIN
+    SELECT date_trunc('month', LEAST(
+        (SELECT MIN(created_at) FROM sales_unpartitioned),
+        (SELECT MIN(created_at) FROM sale_items_unpartitioned),
+        (SELECT MIN(created_at) FROM returns_unpartitioned),
+        (SELECT MIN(created_at) FROM exchange_details_unpartitioned),
+        NOW()
+    ) AT TIME ZONE 'UTC')::date INTO oldest;
+
+    month := oldest;
+    WHILE month <= (date_trunc('month', NOW() AT TIME ZONE 'UTC') + interval '3 months')::date LOOP
+        PERFORM slaydrip_create_month_partition('sales', month);
+        PERFORM slaydrip_create_month_partition('sale_items', month);
+        PERFORM slaydrip_create_month_partition('returns', month);
+        PERFORM slaydrip_create_month_partition('exchange_details', month);
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+-- =====================================================
+-- COPY
+-- =====================================================
+INSERT INTO sales
+    (id, customer_name, phone, invoice_no, bill_no, bill_date, payment_mode,
+     subtotal, discount_percent, discount_amount, gst_amount, total_amount,
+     pdf_file, staff_id, stall_location, created_at)
+SELECT
+    id, customer_name, phone, invoice_no, bill_no, bill_date, payment_mode,
+    subtotal, discount_percent, discount_amount, gst_amount, total_amount,
+    pdf_file, staff_id, stall_location, created_at
+FROM sales_unpartitioned;
+
+-- old sale_items rows may have a NULL created_at; file them under their sale
+INSERT INTO sale_items (id, invoice_no, design_id, size, quantity, price, created_at)
+SELECT
+    si.id, si.invoice_no, si.design_id, si.size, si.quantity, si.price,
+    COALESCE(
+        si.created_at,
+        (SELECT MIN(s.created_at) FROM sales_unpartitioned s WHERE s.invoice_no = si.invoice_no),
+        NOW()
+    )
+FROM sale_items_unpartitioned si;
+
+INSERT INTO returns
+    (id, return_ref, invoice_no, design_id, size, quantity, refund_amount,
+     return_type, payment_mode, staff_id, stall_location, business_date, created_at)
+SELECT
+    id, return_ref, invoice_no, design_id, size, quantity, refund_amount,
+    return_type, payment_mode, staff_id, stall_location, business_date, created_at
+FROM returns_unpartitioned;
+
+INSERT INTO exchange_details
+    (id, exchange_ref, invoice_no, design_id, size, quantity, unit_price,
+     line_total, created_at)
+SELECT
+    id, exchange_ref, invoice_no, design_id, size, quantity, unit_price,
+    line_total, created_at
+FROM exchange_details_unpartitioned;
+
+DROP TABLE sales_unpartitioned, sale_items_unpartitioned, returns_unpartitioned, exchange_details_unpartitioned;
+
+-- =====================================================
+-- INDEXES (created on every partition, current and future)
+-- =====================================================
+CREATE INDEX idx_sales_invoice ON sales (invoice_no);
+CREATE INDEX idx_sales_bill_date ON sales (bill_date);
+CREATE INDEX idx_sales_phone ON sales (phone);
+CREATE INDEX idx_sale_items_invoice ON sale_items (invoice_no);
+CREATE INDEX idx_sale_items_design_size ON sale_items (design_id, size);
+CREATE INDEX idx_returns_invoice ON returns (invoice_no);
+CREATE INDEX idx_returns_design_size ON returns (design_id, size);
+CREATE INDEX idx_returns_ref ON returns (return_ref);
+CREATE INDEX idx_returns_business_date ON returns (business_date);
+CREATE INDEX idx_exchange_ref ON exchange_details (exchange_ref);
+CREATE INDEX idx_exchange_invoice ON exchange_details (invoice_no);
+
+-- invoice_no uniqueness (database/migrations/0002) if it was already applied
+DO $$
+BEGIN
+    IF to_regproc('slaydrip_claim_invoice_no') IS NOT NULL THEN
+        CREATE TRIGGER sales_claim_invoice_no
+            AFTER INSERT ON sales
+            FOR EACH ROW EXECUTE FUNCTION slaydrip_claim_invoice_no();
+    END IF;
+END $$;
+
+-- =====================================================
+-- ARCHIVE INDEX (which month file holds an archived invoice)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS archived_invoices (
+    invoice_no VARCHAR(50) PRIMARY KEY,
+    partition_month DATE NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMIT;
+
+ANALYZE sales;
+ANALYZE sale_items;
+ANALYZE returns;
+ANALYZE exchange_details;
@@ -0,0 +1,76 @@
+-- Core SLAYDRIP tables (run once on a fresh database, then returns_schema.sql
+-- and, for monthly partitions, partitioning.sql)
+--
+-- Reconstructed from what backend/app.py reads and writes so local and
+-- load-test databases match production. Deliberately no extra indexes:
+-- this is the baseline the production schema grew from.
+
+CREATE TABLE IF NOT EXISTS designs (
+    design_id SERIAL PRIMARY KEY,
+    design_code VARCHAR(50) NOT NULL,
+    product_name VARCHAR(200) NOT NULL,
+    gender VARCHAR(20),
+    color VARCHAR(50),
+    price NUMERIC(12,2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS design_stock (
+    id SERIAL PRIMARY KEY,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    stock INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS staff (
+    staff_id SERIAL PRIMARY KEY,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password VARCHAR(200) NOT NULL,
+    full_name VARCHAR(100) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS store_settings (
+    id INTEGER PRIMARY KEY,
+    discount_percent NUMERIC(5,2) NOT NULL DEFAULT 0,
+    gst_percent NUMERIC(5,2) NOT NULL DEFAULT 5,
+    current_stall_location VARCHAR(100) DEFAULT 'Main Store'
+);
+
+CREATE TABLE IF NOT EXISTS invoice_counter (
+    id INTEGER PRIMARY KEY,
+    last_number INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS sales (
+    id BIGSERIAL PRIMARY KEY,
+    customer_name VARCHAR(100),
+    phone VARCHAR(20),
+    invoice_no VARCHAR(50) NOT NULL,
+    bill_no VARCHAR(50),
+    bill_date DATE NOT NULL,
+    payment_mode VARCHAR(10),
+    subtotal NUMERIC(12,2),
+    discount_percent NUMERIC(5,2),
+    discount_amount NUMERIC(12,2),
+    gst_amount NUMERIC(12,2),
+    total_amount NUMERIC(12,2),
+    pdf_file VARCHAR(100),
+    staff_id INTEGER,
+    stall_location VARCHAR(100),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS sale_items (
+    id BIGSERIAL PRIMARY KEY,
+    invoice_no VARCHAR(50) NOT NULL,
+    design_id INTEGER NOT NULL,
+    size VARCHAR(10) NOT NULL,
+    quantity INTEGER NOT NULL,
+    price NUMERIC(12,2) NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sale_items_invoice ON sale_items(invoice_no);
+
+INSERT INTO store_settings (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+INSERT INTO invoice_counter (id, last_number) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
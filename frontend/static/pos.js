@@ -13,6 +13,122 @@ function formatDate(dateString) {
     return `${day}.${month}.${year}`;
 }
 
+// =====================================================
+// LOOKUPS (/api/invoice, /get-sizes)
+// =====================================================
+// The server lets the browser reuse a lookup for a few seconds
+// (Cache-Control: private, max-age); after this page writes, revalidate.
+const LOOKUP_MAX_AGE_MS = 10000;
+let lastWriteAt = 0;
+
+function fetchLookup(url) {
+    const recentWrite = Date.now() - lastWriteAt < LOOKUP_MAX_AGE_MS;
+    return fetch(url, { cache: recentWrite ? "no-cache" : "default" });
+}
+
+// =====================================================
+// DESIGN PICKER (paged search over /api/catalog/search)
+// =====================================================
+const PICKER_PAGE_SIZE = 20;
+
+function designLabel(design) {
+    return `${design.design_code} | ${design.product_name} | ${design.color} | ${design.gender}`;
+}
+
+// Search box + result list; the chosen design lands in the hidden input
+// (value = design_id, data-price, data-text). Scrolling the list loads the next page.
+function setupDesignPicker({ input, gender, hidden, list, onPick }) {
+    let query = "";
+    let nextOffset = 0;
+    let loading = false;
+    let controller = null;
+    let debounce = null;
+
+    function updateFacets(counts) {
+        if (!gender) return;
+        Object.keys(counts).sort().forEach(value => {
+            let opt = Array.from(gender.options).find(o => o.value === value);
+            if (!opt) {
+                opt = document.createElement("option");
+                opt.value = value;
+                gender.appendChild(opt);
+            }
+            opt.textContent = `${value} (${counts[value]})`;
+        });
+    }
+
+    function pick(design) {
+        hidden.value = design.design_id;
+        hidden.dataset.price = design.price;
+        hidden.dataset.text = designLabel(design);
+        input.value = designLabel(design);
+        list.classList.add("hidden");
+        onPick(design);
+    }
+
+    function load(reset) {
+        if (reset) {
+            if (controller) controller.abort();
+            nextOffset = 0;
+            loading = false;
+        }
+        if (loading || nextOffset === null) return;
+        loading = true;
+        controller = new AbortController();
+        const params = new URLSearchParams({ q: query, offset: nextOffset, limit: PICKER_PAGE_SIZE });
+        if (gender && gender.value) params.set("gender", gender.value);
+
+        fetch(`/api/catalog/search?${params}`, { signal: controller.signal })
+            .then(res => res.json())
+            .then(data => {
+                if (reset) list.innerHTML = "";
+                data.results.forEach(design => {
+                    const li = document.createElement("li");
+                    li.textContent = designLabel(design);
+                    li.addEventListener("click", () => pick(design));
+                    list.appendChild(li);
+                });
+                if (!list.children.length) {
+                    const li = document.createElement("li");
+                    li.className = "picker-empty";
+                    li.textContent = "No designs found";
+                    list.appendChild(li);
+                }
+                updateFacets(data.facets.gender);
+                nextOffset = data.next_offset;
+                loading = false;
+                list.classList.remove("hidden");
+            })
+            .catch(err => {
+                if (err.name === "AbortError") return;
+                loading = false;
+                console.error("Catalog search error:", err);
+            });
+    }
+
+    input.addEventListener("input", () => {
+        if (hidden.value) {
+            hidden.value = "";
+            onPick(null);
+        }
+        query = input.value.trim();
+        clearTimeout(debounce);
+        debounce = setTimeout(() => load(true), 150);
+    });
+    input.addEventListener("focus", () => {
+        input.select();
+        load(true);
+    });
+    input.addEventListener("blur", () => list.classList.add("hidden"));
+    // keep focus in the search box while clicking or scrolling the list
+    list.addEventListener("mousedown", e => e.preventDefault());
+    list.addEventListener("scroll", () => {
+        if (list.scrollTop + list.clientHeight >= list.scrollHeight - 40) load(false);
+    });
+    // refocusing the box reloads the list with the new filter
+    if (gender) gender.addEventListener("change", () => input.focus());
+}
+
 // =====================================================
 // MODE MANAGEMENT
 // =====================================================
@@ -61,14 +177,13 @@ function switchMode(mode) {
 let cart = [];
 
 function addToCart() {
-    const designSelect = document.getElementById("design");
+    const designInput = document.getElementById("design");
     const sizeSelect = document.getElementById("size");
     const quantityInput = document.getElementById("quantity");
 
-    const selectedOption = designSelect.options[designSelect.selectedIndex];
-    const designId = designSelect.value;
-    const designText = selectedOption.text;
-    const price = parseFloat(selectedOption.dataset.price);
+    const designId = designInput.value;
+    const designText = designInput.dataset.text;
+    const price = parseFloat(designInput.dataset.price);
     const size = sizeSelect.value;
     const quantity = parseInt(quantityInput.value);
 
@@ -138,14 +253,13 @@ function removeItem(index) {
 }
 
 // Load sizes for sales mode
-document.getElementById("design").addEventListener("change", function () {
-    const designId = this.value;
+function loadSalesSizes(designId) {
     const sizeSelect = document.getElementById("size");
 
     sizeSelect.innerHTML = '<option value="">Select size</option>';
     if (!designId) return;
 
-    fetch(`/get-sizes/${designId}`)
+    fetchLookup(`/get-sizes/${designId}`)
         .then(res => res.json())
         .then(data => {
             const sizeOrder = ['xxs', 'xs', 's', 'm', 'l', 'xl', 'xxl', 'xxxl'];
@@ -167,8 +281,51 @@ document.getElementById("design").addEventListener("change", function () {
             });
         })
         .catch(err => console.error("Size fetch error:", err));
+}
+
+setupDesignPicker({
+    input: document.getElementById("design-search"),
+    gender: document.getElementById("design-gender"),
+    hidden: document.getElementById("design"),
+    list: document.getElementById("design-results"),
+    onPick: design => loadSalesSizes(design ? design.design_id : null)
 });
 
+// Scanned tags: the scanner types the SKU and presses Enter. One call
+// resolves the tag, checks stock and adds it to the server-side cart.
+document.getElementById("sku-scan").addEventListener("keydown", function (e) {
+    if (e.key !== "Enter") return;
+    e.preventDefault();
+    const sku = this.value.trim();
+    this.value = "";
+    if (sku) scanSku(sku);
+});
+
+function scanSku(sku) {
+    const message = document.getElementById("scan-message");
+    fetch(`/api/scan/${encodeURIComponent(sku)}`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ cart, quantity: 1 })
+    })
+        .then(res => res.json().then(data => ({ ok: res.ok, data })))
+        .then(({ ok, data }) => {
+            message.classList.toggle("error", !ok);
+            if (!ok) {
+                message.textContent = data.error || "Scan failed";
+                return;
+            }
+            cart = data.cart;
+            renderCart();
+            message.textContent = `${data.design.design_code} ${data.size} added (${data.stock} in stock)`;
+        })
+        .catch(err => {
+            message.classList.add("error");
+            message.textContent = "Scan failed";
+            console.error("Scan error:", err);
+        });
+}
+
 function proceedToCheckout() {
     if (cart.length === 0) {
         alert("Cart is empty");
@@ -197,10 +354,7 @@ function proceedToCheckout() {
         formData.append("payment_mode", paymentMode);
         formData.append("discount_percent", discount);
 
-        return fetch("/checkout", {
-            method: "POST",
-            body: formData
-        });
+        return postCheckout(formData, 5);
     })
     .then(res => res.text())
     .then(html => {
@@ -210,6 +364,23 @@ function proceedToCheckout() {
     });
 }
 
+// Server sheds checkouts with 503 + retry_after_ms when the stall is
+// busy; nothing was billed yet, so wait the hinted time and resend.
+function postCheckout(formData, attemptsLeft) {
+    return fetch("/checkout", { method: "POST", body: formData })
+        .then(res => {
+            if (res.status !== 503 || attemptsLeft <= 1) {
+                return res;
+            }
+            return res.json()
+                .catch(() => ({}))
+                .then(data => new Promise(resolve => {
+                    setTimeout(resolve, data.retry_after_ms || 500);
+                }))
+                .then(() => postCheckout(formData, attemptsLeft - 1));
+        });
+}
+
 // =====================================================
 // RETURN MODE
 // =====================================================
@@ -226,7 +397,7 @@ function fetchInvoiceForReturn() {
         return;
     }
 
-    fetch(`/api/invoice/${encodeURIComponent(inv)}`)
+    fetchLookup(`/api/invoice/${encodeURIComponent(inv)}`)
         .then(r => r.json().then(data => ({ ok: r.ok, data })))
         .then(({ ok, data }) => {
             if (!ok) {
@@ -366,6 +537,7 @@ function submitReturn() {
     .then(r => r.json().then(data => ({ ok: r.ok, data })))
     .then(({ ok, data }) => {
         if (!ok) throw new Error(data.error || "Return failed");
+        lastWriteAt = Date.now();
         showReturnMessage(`✅ RETURN SUCCESSFUL!\n\nReference: ${data.return_ref}\nRefund Amount: ₹${data.total_refund.toFixed(2)}\nPayment Mode: ${payment}`);
         
         // Clear inputs after 3 seconds
@@ -503,7 +675,7 @@ function fetchInvoiceForExchange() {
         return;
     }
 
-    fetch(`/api/invoice/${encodeURIComponent(inv)}`)
+    fetchLookup(`/api/invoice/${encodeURIComponent(inv)}`)
         .then(r => r.json().then(data => ({ ok: r.ok, data })))
         .then(({ ok, data }) => {
             if (!ok) {
@@ -624,7 +796,7 @@ function addExchangeNewItem() {
 
     exchangeNewItems.push({
         design_id: designId,
-        design_text: designSel.options[designSel.selectedIndex].text,
+        design_text: designSel.dataset.text,
         size,
         quantity: qty,
         price
@@ -658,14 +830,12 @@ function removeExchangeNewItem(idx) {
 }
 
 // Load sizes for exchange new item dropdown
-document.getElementById("exchange-new-design").addEventListener("change", function() {
-    const designId = this.value;
-    const price = this.options[this.selectedIndex]?.dataset.price || "";
-    document.getElementById("exchange-new-price").value = price;
+function loadExchangeSizes(design) {
+    document.getElementById("exchange-new-price").value = design ? design.price : "";
     const sizeSel = document.getElementById("exchange-new-size");
     sizeSel.innerHTML = '<option value="">Select size</option>';
-    if (!designId) return;
-    fetch(`/get-sizes/${designId}`)
+    if (!design) return;
+    fetchLookup(`/get-sizes/${design.design_id}`)
         .then(r => r.json())
         .then(data => {
             data.forEach(row => {
@@ -675,6 +845,13 @@ document.getElementById("exchange-new-design").addEventListener("change", functi
                 sizeSel.appendChild(opt);
             });
         });
+}
+
+setupDesignPicker({
+    input: document.getElementById("exchange-new-design-search"),
+    hidden: document.getElementById("exchange-new-design"),
+    list: document.getElementById("exchange-new-design-results"),
+    onPick: loadExchangeSizes
 });
 
 function submitExchange() {
@@ -732,6 +909,7 @@ function submitExchange() {
     .then(r => r.json().then(data => ({ ok: r.ok, data })))
     .then(({ ok, data }) => {
         if (!ok) throw new Error(data.error || "Exchange failed");
+        lastWriteAt = Date.now();
         const settle = data.settlement;
         let settleText = "No payment adjustment needed";
         if (settle.type === "REFUND") settleText = `Refund to Customer: ₹${settle.amount.toFixed(2)}`;
@@ -9,6 +9,19 @@ function formatDate(dateString) {
     return `${day}.${month}.${year}`;
 }
 
+// =====================================================
+// LOOKUPS (/api/invoice, /get-sizes)
+// =====================================================
+// The server lets the browser reuse a lookup for a few seconds
+// (Cache-Control: private, max-age); after this page writes, revalidate.
+const LOOKUP_MAX_AGE_MS = 10000;
+let lastWriteAt = 0;
+
+function fetchLookup(url) {
+    const recentWrite = Date.now() - lastWriteAt < LOOKUP_MAX_AGE_MS;
+    return fetch(url, { cache: recentWrite ? "no-cache" : "default" });
+}
+
 let currentInvoice = null;
 let soldItems = [];
 let newItems = [];
@@ -22,7 +35,7 @@ function fetchInvoice() {
         return;
     }
 
-    fetch(`/api/invoice/${encodeURIComponent(inv)}`)
+    fetchLookup(`/api/invoice/${encodeURIComponent(inv)}`)
         .then(r => r.json().then(data => ({ ok: r.ok, data })))
         .then(({ ok, data }) => {
             if (!ok) {
@@ -38,6 +51,12 @@ function fetchInvoice() {
             soldItems = data.items || [];
             renderInvoiceSummary();
             renderSoldItems();
+            if (data.archived) {
+                // past the return window: shown for reference only
+                showMessage(`Invoice archived (${data.archived_month}) - past the return window`, true);
+                document.getElementById("exchange-block").classList.add("hidden");
+                return;
+            }
             document.getElementById("exchange-block").classList.remove("hidden");
         })
         .catch(() => showMessage("Error fetching invoice", true));
@@ -128,6 +147,7 @@ function submitReturn() {
     .then(r => r.json().then(data => ({ ok: r.ok, data })))
     .then(({ ok, data }) => {
         if (!ok) throw new Error(data.error || "Return failed");
+        lastWriteAt = Date.now();
         showMessage(`Return created. Ref ${data.return_ref}. Refund ₹${data.total_refund.toFixed(2)}`);
         fetchInvoice();
     })
@@ -231,6 +251,7 @@ function submitExchange() {
     .then(r => r.json().then(data => ({ ok: r.ok, data })))
     .then(({ ok, data }) => {
         if (!ok) throw new Error(data.error || "Exchange failed");
+        lastWriteAt = Date.now();
         const settle = data.settlement;
         let settleText = "No payment needed";
         if (settle.type === "REFUND") settleText = `Refund ₹${settle.amount.toFixed(2)}`;
@@ -263,7 +284,7 @@ designSelect.addEventListener("change", () => {
     const sizeSel = document.getElementById("new-size");
     sizeSel.innerHTML = '<option value="">Select size</option>';
     if (!designId) return;
-    fetch(`/get-sizes/${designId}`)
+    fetchLookup(`/get-sizes/${designId}`)
         .then(r => r.json())
         .then(data => {
             data.forEach(row => {
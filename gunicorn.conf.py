@@ -0,0 +1,29 @@
+# =====================================================
+# GUNICORN CONFIG (picked up automatically from the repo root)
+# =====================================================
+# Bind address and worker count keep gunicorn's defaults ($PORT,
+# $WEB_CONCURRENCY), so `gunicorn backend.app:app` works unchanged.
+import gc
+import os
+
+# Import the app once in the master and fork workers from it. Workers
+# share the interpreter and Flask/Jinja pages copy-on-write instead of
+# each importing everything again on a cold start.
+preload_app = True
+
+# Threaded workers: backend/admission.py admits ADMISSION_MAX_ACTIVE
+# requests at a time (default DB_POOL_SIZE); the spare threads are where
+# the rest queue by priority instead of in the socket backlog.
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+
+def when_ready(server):
+    # Optionally pay the ReportLab import in the master too, so no worker
+    # pays it on its first checkout (costs the master's memory instead).
+    if os.environ.get("PRELOAD_REPORTLAB") == "1":
+        import backend.invoice_pdf  # noqa: F401
+
+    # Move everything imported so far out of the collector's generations.
+    # Otherwise the first GC pass in each worker touches every object's
+    # header and un-shares the pages we just inherited.
+    gc.freeze()
@@ -0,0 +1,37 @@
+"""
+Shared fixtures. No database here: these cover the pure pieces and the
+routes that answer before touching Postgres (python -m pytest -q from the
+repo root).
+"""
+import os
+
+import pytest
+
+from backend import sku
+from backend.app import create_app
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # the SKU listener would try to connect on the first request
+    monkeypatch.setattr(sku, "_listener_pid", os.getpid())
+    for name in ("METRICS_PUBLIC", "METRICS_TOKEN", "EVENT_FEED_TOKEN", "ADMIN_USERS"):
+        monkeypatch.delenv(name, raising=False)
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """login(username) puts a staff session on the client (ADMIN_USERS defaults to "admin")."""
+    def log_in(username="cashier", staff_id=1):
+        with client.session_transaction() as sess:
+            sess["staff_id"] = staff_id
+            sess["username"] = username
+    return log_in
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from backend.admission import AdmissionController, Shed
+
+
+def controller(max_active=1, **classes):
+    return AdmissionController(classes=classes, max_active=max_active)
+
+
+def wait_for_queue(ctl, name, waiting=1):
+    deadline = time.monotonic() + 2
+    while ctl.classes[name].waiting < waiting:
+        assert time.monotonic() < deadline, "request never queued"
+        time.sleep(0.001)
+
+
+def test_admits_up_to_the_class_limit():
+    ctl = controller(max_active=4, read=(0, 2, 0, 1000))
+    tokens = [ctl.acquire("read"), ctl.acquire("read")]
+    with pytest.raises(Shed) as shed:
+        ctl.acquire("read")
+    assert shed.value.reason == "queue_full"
+    assert shed.value.retry_after_ms >= 100
+    for token in tokens:
+        ctl.release(token)
+    assert ctl.active == 0
+    ctl.release(ctl.acquire("read"))
+
+
+def test_queued_request_gets_the_released_slot():
+    ctl = controller(read=(0, 1, 4, 2000))
+    token = ctl.acquire("read")
+    got = []
+    worker = threading.Thread(target=lambda: got.append(ctl.acquire("read")))
+    worker.start()
+    wait_for_queue(ctl, "read")
+    ctl.release(token)
+    worker.join(2)
+    assert got and ctl.active == 1
+    ctl.release(got[0])
+
+
+def test_higher_priority_is_served_first():
+    ctl = controller(read=(0, 1, 4, 2000), write=(1, 1, 4, 2000))
+    token = ctl.acquire("write")
+
+    def take(name):
+        ctl.release(ctl.acquire(name))
+
+    writer = threading.Thread(target=take, args=("write",))
+    writer.start()
+    wait_for_queue(ctl, "write")
+    reader = threading.Thread(target=take, args=("read",))
+    reader.start()
+    wait_for_queue(ctl, "read")
+
+    served = []
+    real_take = ctl._take
+    ctl._take = lambda cls: (served.append(cls.name), real_take(cls))
+    ctl.release(token)
+    writer.join(2)
+    reader.join(2)
+    assert served == ["read", "write"]
+
+
+def test_queued_request_times_out():
+    ctl = controller(read=(0, 1, 4, 50))
+    token = ctl.acquire("read")
+    with pytest.raises(Shed) as shed:
+        ctl.acquire("read")
+    assert shed.value.reason == "timeout"
+    assert ctl.classes["read"].waiting == 0
+    ctl.release(token)
+    assert ctl.active == 0
+
+
+def test_sheds_when_the_expected_wait_passes_the_deadline():
+    ctl = controller(read=(0, 1, 4, 10))
+    ctl.classes["read"].service_time = 1.0
+    token = ctl.acquire("read")
+    with pytest.raises(Shed) as shed:
+        ctl.acquire("read")
+    assert shed.value.reason == "deadline"
+    ctl.release(token)
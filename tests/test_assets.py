@@ -0,0 +1,66 @@
+import gzip
+import json
+
+import pytest
+
+from backend import assets
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    static, dist = tmp_path / "static", tmp_path / "static" / "dist"
+    static.mkdir()
+    (static / "app.js").write_text("console.log('v1');")
+    (static / "style.css").write_text("body { color: black; }")
+    (static / "notes.txt").write_text("not an asset")
+    monkeypatch.setattr(assets, "DIST_DIR", str(dist))
+    monkeypatch.setattr(assets, "_manifest", None)  # build() caches the manifest it wrote to DIST_DIR
+    return static, dist
+
+
+def build(static, dist):
+    assets.build(str(static), str(dist), log=lambda message: None)
+    return json.loads((dist / "manifest.json").read_text())
+
+
+def test_build_hashes_and_precompresses(dirs):
+    static, dist = dirs
+    manifest = build(static, dist)
+    assert sorted(manifest) == ["app.js", "style.css"]
+    hashed = manifest["app.js"]
+    assert assets._HASHED_RE.match(hashed)
+    assert (dist / hashed).read_bytes() == (static / "app.js").read_bytes()
+    assert gzip.decompress((dist / f"{hashed}.gz").read_bytes()) == (static / "app.js").read_bytes()
+
+
+def test_same_content_same_name(dirs):
+    static, dist = dirs
+    assert build(static, dist) == build(static, dist)
+
+
+def test_keeps_the_previous_build_only(dirs):
+    static, dist = dirs
+    first = build(static, dist)["app.js"]
+    (static / "app.js").write_text("console.log('v2');")
+    second = build(static, dist)["app.js"]
+    assert second != first
+    assert (dist / first).exists() and (dist / second).exists()
+
+    (static / "app.js").write_text("console.log('v3');")
+    build(static, dist)
+    assert not (dist / first).exists() and not (dist / f"{first}.gz").exists()
+    assert (dist / second).exists()
+
+
+def test_serves_hashed_assets_from_the_previous_build(client, dirs):
+    static, dist = dirs
+    first = build(static, dist)["app.js"]
+    (static / "app.js").write_text("console.log('v2');")
+    build(static, dist)
+
+    response = client.get(f"/assets/{first}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert client.get("/assets/app.js").status_code == 404
+    assert client.get("/assets/manifest.json").status_code == 404
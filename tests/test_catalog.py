@@ -0,0 +1,70 @@
+import pytest
+
+from backend import catalog
+from backend.catalog import CatalogIndex
+
+
+def design(design_id, code, name, color, gender="Men", price=999):
+    return {"design_id": design_id, "design_code": code, "product_name": name,
+            "color": color, "gender": gender, "price": price}
+
+
+@pytest.fixture
+def index():
+    return CatalogIndex([
+        design(1, "SD0100", "Oversized Hoodie", "Black"),
+        design(2, "SD0101", "Hoodie Dress", "Red", gender="Women"),
+        design(3, "SD0200", "Cargo Pants", "Olive"),
+        design(4, "SD0300", "Tote Bag", "Beige", gender=None),
+    ])
+
+
+def codes(result):
+    return [r["design_code"] for r in result["results"]]
+
+
+def test_exact_code_ranks_first(index):
+    assert codes(index.search("sd0101"))[0] == "SD0101"
+
+
+def test_code_prefix(index):
+    assert codes(index.search("SD01")) == ["SD0100", "SD0101"]
+
+
+def test_every_word_must_match(index):
+    assert codes(index.search("hoodie black")) == ["SD0100"]
+    assert index.search("hoodie olive")["total"] == 0
+
+
+def test_typo_still_finds_it(index):
+    assert set(codes(index.search("hodie"))) == {"SD0100", "SD0101"}
+
+
+def test_gender_filter_and_facets(index):
+    result = index.search("hoodie", gender="Women")
+    assert codes(result) == ["SD0101"]
+    # facets count the full match, before the filter
+    assert result["facets"]["gender"] == {"Men": 1, "Women": 1, catalog.UNKNOWN_GENDER: 0}
+
+
+def test_missing_gender_is_unknown(index):
+    assert index.search("", gender=catalog.UNKNOWN_GENDER)["total"] == 1
+    assert index.search("")["facets"]["gender"][catalog.UNKNOWN_GENDER] == 1
+
+
+def test_paging(index):
+    first = index.search("", limit=3)
+    assert first["total"] == 4 and first["next_offset"] == 3
+    second = index.search("", offset=first["next_offset"], limit=3)
+    assert codes(second) == ["SD0300"] and second["next_offset"] is None
+
+
+def test_search_route(client, login, index, monkeypatch):
+    monkeypatch.setattr(catalog, "get_index", lambda: index)
+    assert client.get("/api/catalog/search?q=tote").status_code == 302  # login first
+    login()
+    response = client.get("/api/catalog/search?q=tote&gender=Unknown")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r["design_code"] for r in body["results"]] == ["SD0300"]
+    assert body["facets"]["gender"][catalog.UNKNOWN_GENDER] == 1
@@ -0,0 +1,33 @@
+import gzip
+
+from backend import http_cache
+
+
+def test_is_fresh_matches_the_version_etag():
+    etag = http_cache.make_etag("v1")
+    assert http_cache.is_fresh({"If-None-Match": etag}, "v1")
+    assert not http_cache.is_fresh({"If-None-Match": etag}, "v2")
+    assert not http_cache.is_fresh({}, "v1")
+
+
+def test_is_fresh_weak_comparison_and_lists():
+    opaque = http_cache.make_etag(b"v1").removeprefix("W/")
+    assert http_cache.is_fresh({"If-None-Match": opaque}, b"v1")
+    assert http_cache.is_fresh({"If-None-Match": f'"other", {opaque}'}, b"v1")
+    assert http_cache.is_fresh({"If-None-Match": "*"}, b"anything")
+
+
+def test_finalize_304_when_fresh():
+    body = b'{"sizes": []}'
+    status, _, headers = http_cache.finalize(body, {}, accepts_gzip=False)
+    assert status == 200
+    status, out, _ = http_cache.finalize(body, {"If-None-Match": headers["ETag"]}, accepts_gzip=False)
+    assert (status, out) == (304, b"")
+
+
+def test_finalize_gzips_large_bodies_only():
+    large = b"[" + b'{"size": "M"},' * 100 + b"{}]"
+    _, out, headers = http_cache.finalize(large, {}, accepts_gzip=True)
+    assert headers["Content-Encoding"] == "gzip" and gzip.decompress(out) == large
+    _, out, headers = http_cache.finalize(b"{}", {}, accepts_gzip=True)
+    assert out == b"{}" and "Content-Encoding" not in headers
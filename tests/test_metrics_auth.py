@@ -0,0 +1,33 @@
+from backend import metrics
+
+
+def test_metrics_needs_token_or_admin(client, login):
+    assert client.get("/metrics").status_code == 401
+    login("cashier")
+    assert client.get("/metrics").status_code == 401
+    login("admin")
+    assert client.get("/metrics").status_code == 200
+
+
+def test_metrics_bearer_token(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics").status_code == 401
+
+
+def test_metrics_non_ascii_header_is_refused(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    response = client.get("/metrics", headers={"Authorization": "Bearer sécret"})
+    assert response.status_code == 401
+
+
+def test_metrics_unset_token_never_matches(client):
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+
+def test_metrics_public(client, monkeypatch):
+    monkeypatch.setenv("METRICS_PUBLIC", "1")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == metrics.CONTENT_TYPE.split(";")[0]
@@ -0,0 +1,59 @@
+import pytest
+
+from backend import outbox
+
+
+def test_cursor_round_trip():
+    assert outbox.parse_cursor(outbox.format_cursor(812, 41)) == (812, 41)
+    assert outbox.parse_cursor(outbox.START) == (0, 0)
+
+
+def test_cursors_order_like_the_feed():
+    assert outbox.parse_cursor("9-100") < outbox.parse_cursor("10-2") < outbox.parse_cursor("10-3")
+
+
+@pytest.mark.parametrize("value", [None, "", "12", "12-", "-3", "a-1", "1-b", "1--2", "1.5-2", "-1-2"])
+def test_malformed_cursors(value):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        outbox.parse_cursor(value)
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    calls = []
+
+    def fake_feed(after, limit):
+        calls.append((after, limit))
+        outbox.parse_cursor(after)
+        if after == "1-1":
+            raise outbox.FeedGap("5-9")
+        return {"events": [], "next_cursor": after, "has_more": False}
+
+    monkeypatch.setattr(outbox, "feed", fake_feed)
+    return calls
+
+
+def test_events_need_token_or_admin(client, login, feed):
+    assert client.get("/api/events").status_code == 401
+    login("cashier")
+    assert client.get("/api/events").status_code == 401
+    login("admin")
+    assert client.get("/api/events").status_code == 200
+    assert feed == [(outbox.START, 500)]
+
+
+def test_events_bearer_token(client, monkeypatch, feed):
+    monkeypatch.setenv("EVENT_FEED_TOKEN", "feed-token")
+    assert client.get("/api/events", headers={"Authorization": "Bearer feed-token"}).status_code == 200
+    assert client.get("/api/events", headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert client.get("/api/events", headers={"Authorization": "Bearer fééd"}).status_code == 401
+    assert len(feed) == 1
+
+
+def test_events_bad_cursor_and_gap(client, login, feed):
+    login("admin")
+    assert client.get("/api/events?after=oops").status_code == 400
+    response = client.get("/api/events?after=1-1&limit=100000")
+    assert response.status_code == 410
+    assert response.get_json()["resume_from"] == "5-9"
+    assert feed[-1] == ("1-1", outbox.MAX_BATCH)
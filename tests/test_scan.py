@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from backend import sku
+from backend.app import parse_cart
+
+ENTRY = {"sku": "SD0007-M", "design_id": 7, "design_code": "SD0007", "product_name": "Tee",
+         "color": "Black", "gender": "Men", "size": "M", "price": 499.5, "stock": 3}
+
+
+def line(**overrides):
+    return dict({"design_id": "7", "size": " M ", "quantity": "2", "price": "499.5", "name": "Tee"}, **overrides)
+
+
+def test_clean_lines_keep_extra_fields():
+    assert parse_cart([line()]) == [{"design_id": 7, "size": "M", "quantity": 2, "price": 499.5, "name": "Tee"}]
+
+
+def test_empty_cart():
+    assert parse_cart([]) == []
+
+
+@pytest.mark.parametrize("items", [None, {"design_id": 1}, "SD0001-M"])
+def test_cart_must_be_a_list(items):
+    with pytest.raises(ValueError, match="Cart must be a list"):
+        parse_cart(items)
+
+
+@pytest.mark.parametrize("bad", [
+    "not a dict",
+    {"size": "M", "quantity": 1, "price": 1},
+    line(design_id="x"),
+    line(size="  "),
+    line(quantity=0),
+    line(quantity="1.5"),
+    line(price=-1),
+    line(price=None),
+])
+def test_names_the_first_bad_line(bad):
+    with pytest.raises(ValueError, match="Invalid cart line 2"):
+        parse_cart([line(), bad, bad])
+
+
+@pytest.fixture
+def scan(client, login, monkeypatch):
+    monkeypatch.setattr(sku, "lookup", lambda code, stall_id: dict(ENTRY) if code == "SD0007-M" else None)
+    login()
+    return lambda code="SD0007-M", **body: client.post(f"/api/scan/{code}", json=body)
+
+
+def test_scan_adds_to_the_page_cart(scan):
+    response = scan(cart=[line(design_id=9)], quantity=2)
+    assert response.status_code == 200
+    assert [(i["design_id"], i["quantity"]) for i in response.get_json()["cart"]] == [(9, 2), (7, 2)]
+
+
+def test_scan_rejects_a_bad_cart(scan):
+    response = scan(cart=[line(), {"design_id": 7}])
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid cart line 2"
+
+
+def test_scan_stock_and_unknown_sku(scan):
+    assert scan(cart=[line(design_id=7, quantity=3)]).status_code == 409
+    assert scan("NOPE-M").status_code == 404
+
+
+def test_listener_starts_on_the_first_request(app, monkeypatch):
+    started = []
+
+    class Thread:
+        def __init__(self, name, **kwargs):
+            self.name = name
+
+        def start(self):
+            started.append(self.name)
+
+    monkeypatch.setattr(sku, "_listener_pid", None)
+    monkeypatch.setattr(sku.threading, "Thread", Thread)
+    client = app.test_client()
+    client.get("/health")
+    client.get("/health")
+    assert started == ["sku-listener"] and sku._listener_pid == os.getpid()
@@ -0,0 +1,22 @@
+from backend import statements
+
+
+def test_positional_placeholders_are_numbered():
+    assert statements.to_server_sql("SELECT %s, %s") == ("SELECT $1, $2", 2)
+
+
+def test_named_placeholders_keep_their_number():
+    sql, count = statements.to_server_sql("WHERE a = %(day)s AND b > %(day)s - %(window)s")
+    assert sql == "WHERE a = $1 AND b > $1 - $2"
+    assert count == 2
+
+
+def test_no_placeholders():
+    assert statements.to_server_sql("SELECT 1") == ("SELECT 1", 0)
+
+
+def test_every_registered_statement_converts():
+    for name, sql in statements.STATEMENTS.items():
+        server_sql, count = statements.to_server_sql(sql)
+        assert "%s" not in server_sql and "%(" not in server_sql, name
+        assert (count == 0) == ("$1" not in server_sql), name